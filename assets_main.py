@@ -0,0 +1,81 @@
+import sys
+import argparse
+
+from scraper.asset_fetcher import (AssetCache, AssetFetcher, collect_image_urls, ASSET_DIR, CONCURRENCY,
+                                   RATE_PER_SECOND, REVALIDATE_AFTER)
+from utilities.storage import get_db_manager
+from utilities.metrics import metrics
+from utilities.log_utils import setup_logging
+
+# Configure logging (text or JSON lines, see LOG_FORMAT in config.py)
+setup_logging()
+
+
+def fetch(args):
+    db_manager = get_db_manager()
+    try:
+        urls = collect_image_urls(db_manager)
+    finally:
+        db_manager.close()
+    cache = AssetCache(args.root)
+    try:
+        fetcher = AssetFetcher(cache, concurrency=args.concurrency, rate_per_second=args.rate,
+                               revalidate_after=args.revalidate_days, thumbnail_sizes=args.thumbnails)
+        fetcher.run(urls)
+    finally:
+        cache.close()
+        metrics.export()
+    return 0
+
+
+def path(args):
+    cache = AssetCache(args.root)
+    try:
+        local_path = cache.path_for(args.url, thumbnail=args.thumbnail)
+    finally:
+        cache.close()
+    if local_path is None:
+        print(f"{args.url} is not cached.", file=sys.stderr)
+        return 1
+    print(local_path)
+    return 0
+
+
+def stats(args):
+    cache = AssetCache(args.root)
+    try:
+        for name, value in cache.stats().items():
+            print(f"{name:<16} {value}")
+    finally:
+        cache.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local cache of the perfume and brand images.")
+    parser.add_argument("--root", default=ASSET_DIR, help="Cache folder.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = commands.add_parser("fetch", help="Download new images and revalidate stale ones.")
+    fetch_parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Downloads in flight.")
+    fetch_parser.add_argument("--rate", type=float, default=RATE_PER_SECOND, help="New requests per second.")
+    fetch_parser.add_argument("--revalidate-days", type=float, default=REVALIDATE_AFTER,
+                              help="Check cached images again after this many days.")
+    fetch_parser.add_argument("--thumbnails", type=int, nargs="*", default=[], metavar="SIZE",
+                              help="Also make thumbnails of these sizes in pixels (needs Pillow).")
+    fetch_parser.set_defaults(func=fetch)
+
+    path_parser = commands.add_parser("path", help="Print the local file of an image URL.")
+    path_parser.add_argument("url")
+    path_parser.add_argument("--thumbnail", type=int, metavar="SIZE")
+    path_parser.set_defaults(func=path)
+
+    stats_parser = commands.add_parser("stats", help="Show how many images are cached.")
+    stats_parser.set_defaults(func=stats)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
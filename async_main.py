@@ -0,0 +1,41 @@
+import asyncio
+import argparse
+
+from main import prepare_run
+from scraper.async_orchestrator import AsyncOrchestrator, CONCURRENCY, BROWSER_WORKERS, RATE_PER_MINUTE
+from utilities.file_utils import clean_failed_urls
+from utilities.metrics import metrics
+from utilities.log_utils import setup_logging
+from utilities.checkpoint import CheckpointStore
+
+# Configure logging (text or JSON lines, see LOG_FORMAT in config.py)
+setup_logging()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape data/urls.csv with the asyncio orchestrator.")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="URLs in flight at once.")
+    parser.add_argument("--browser-workers", type=int, default=BROWSER_WORKERS,
+                        help="Threads driving Chromium for pages and reviews.")
+    parser.add_argument("--rate", type=float, default=RATE_PER_MINUTE, help="New page fetches per minute.")
+    parser.add_argument("--no-http", action="store_true", help="Always fetch pages with the browser.")
+    args = parser.parse_args(argv)
+
+    prepared = prepare_run()
+    if prepared is None:
+        return
+    db_manager, extractor, scraped_urls, retry_queue, urls_left = prepared
+
+    orchestrator = AsyncOrchestrator(extractor, scraped_urls, retry_queue, CheckpointStore(),
+                                     concurrency=args.concurrency, browser_workers=args.browser_workers,
+                                     rate_per_minute=args.rate, use_http=not args.no_http)
+    try:
+        # The orchestrator closes db_manager on its writer thread
+        asyncio.run(orchestrator.run(urls_left))
+    finally:
+        metrics.export()
+
+
+if __name__ == "__main__":
+    clean_failed_urls()
+    main()
@@ -0,0 +1,197 @@
+"""
+End-to-end check of the image cache (scraper/asset_fetcher.py) against a local HTTP stand-in for the image host.
+
+    python -m benchmarks.asset_check [--thumbnails 64 128] [--workdir /tmp/assets]
+
+The stand-in serves a few generated PNGs (two URLs share the same bytes), honours If-None-Match with a 304,
+and has an oversized image (with and without Content-Length) and a missing one. Three AssetFetcher runs then
+check downloading, dedupe by content hash, the MAX_BYTES refusal, failing URLs, thumbnails of images that are
+already cached, and revalidation. Exits with status 1 if a check fails.
+"""
+import os
+import sys
+import zlib
+import struct
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from scraper.asset_fetcher import AssetCache, AssetFetcher, Image, MAX_BYTES
+
+HOST = "127.0.0.1"
+
+
+def png(width, height, rgb):
+    """A valid single-colour PNG, so thumbnails can be made without any image files on disk."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + bytes(rgb) * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+
+
+class ImageHostHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug("image host: " + format, *args)
+
+    def _send(self, status, body=b"", headers=(), content_length=True):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if content_length:
+            self.send_header("Content-Length", str(len(body)))
+        else:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the fetcher hung up on an oversized body, as it should
+        self.server.requests[(self.path, status)] += 1
+
+    def do_GET(self):
+        images = self.server.images
+        if self.path in ("/img/oversized.png", "/img/oversized-stream.png"):
+            self._send(200, b"\0" * (MAX_BYTES + 1), (("Content-Type", "image/png"),),
+                       content_length=self.path == "/img/oversized.png")
+        elif self.path in images:
+            body = images[self.path]
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, headers=(("ETag", etag),))
+            else:
+                self._send(200, body, (("Content-Type", "image/png"), ("ETag", etag)))
+        else:
+            self._send(404, b"not found", (("Content-Type", "text/plain"),))
+
+
+class ImageHostServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        logging.debug(f"image host: connection from {client_address} dropped", exc_info=True)
+
+
+class ImageHost:
+    """The stand-in image host, served from a background thread; `requests` counts (path, status)."""
+
+    def __init__(self, host=HOST):
+        red = png(300, 200, (200, 30, 30))
+        self.images = {
+            "/img/red.png": red,
+            "/img/red-copy.png": red,  # same image under another URL: stored once
+            "/img/blue.png": png(120, 240, (30, 30, 200)),
+        }
+        self.host = host
+        self._server = None
+        self._thread = None
+
+    def url(self, path):
+        return f"http://{self.host}:{self._server.server_address[1]}{path}"
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    def start(self):
+        self._server = ImageHostServer((self.host, 0), ImageHostHandler)
+        self._server.images = self.images
+        self._server.requests = Counter()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="image-host", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def run_checks(root, thumbnail_sizes):
+    """Runs the fetcher three times against the stand-in. Returns [(check, passed, detail)]."""
+    results = []
+
+    def check(name, passed, detail=""):
+        results.append((name, bool(passed), detail))
+
+    with ImageHost() as host:
+        good = [host.url(path) for path in host.images]
+        oversized = [host.url("/img/oversized.png"), host.url("/img/oversized-stream.png")]
+        missing = host.url("/img/missing.png")
+        urls = good + oversized + [missing]
+        cache = AssetCache(root)
+        try:
+            def fetcher(**options):
+                return AssetFetcher(cache, rate_per_second=1000, burst=100, **options)
+
+            # 1. Empty cache: download, dedupe, refuse oversized bodies, record the failure
+            outcomes = fetcher().run(urls)
+            check("download", outcomes.get("downloaded") == 2, outcomes)
+            check("dedupe by content hash", outcomes.get("deduped") == 1
+                  and cache.entry(good[0])["content_hash"] == cache.entry(good[1])["content_hash"]
+                  and cache.stats()["distinct_images"] == 2, cache.stats())
+            for url in oversized:
+                entry = cache.entry(url)
+                check(f"MAX_BYTES refusal ({url.rsplit('/', 1)[1]})",
+                      entry["content_hash"] is None and "byte limit" in (entry["error"] or ""), entry["error"])
+            entry = cache.entry(missing)
+            check("failing URL", outcomes.get("failed") == 3 and entry["error"] == "HTTP 404", entry["error"])
+            check("cached files", all(cache.path_for(url) for url in good))
+
+            # 2. Cached images are fresh, so they are not fetched, but missing thumbnails are still made
+            before = sum(host.requests.values())
+            outcomes = fetcher(thumbnail_sizes=thumbnail_sizes if Image is not None else ()).run(urls)
+            fetched = sum(host.requests.values()) - before
+            check("fresh URLs skipped, failed ones retried", fetched == 3 and outcomes == {"failed": 3},
+                  f"{fetched} requests, {outcomes}")
+            if Image is None:
+                check("thumbnails of cached images (skipped: no Pillow)", True)
+            else:
+                made = [cache.path_for(url, thumbnail=size) for url in good for size in thumbnail_sizes]
+                check("thumbnails of cached images", all(made), made)
+
+            # 3. Everything is stale: unchanged images cost a 304 each
+            outcomes = fetcher(revalidate_after=0).run(urls)
+            not_modified = sum(count for (path, status), count in host.requests.items() if status == 304)
+            check("304 revalidation", outcomes.get("not_modified") == 3 and not_modified == 3,
+                  f"{outcomes}, {not_modified} responses with 304")
+            check("cache intact after revalidation", all(cache.path_for(url) for url in good)
+                  and cache.stats()["urls_cached"] == 3, cache.stats())
+        finally:
+            cache.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the image cache against a local stand-in image host.")
+    parser.add_argument("--thumbnails", type=int, nargs="*", default=[64], metavar="SIZE",
+                        help="Thumbnail sizes to check (needs Pillow).")
+    parser.add_argument("--workdir", help="Cache folder (default: a new temporary folder).")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.ERROR)  # refused and failing URLs are expected warnings here
+    root = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="asset_check-"))
+    print(f"Cache in {root}")
+    results = run_checks(root, args.thumbnails)
+    for name, passed, detail in results:
+        print(f"  {'ok  ' if passed else 'FAIL'}  {name}" + ("" if passed else f": {detail}"))
+    failed = [name for name, passed, _ in results if not passed]
+    print(f"\n{len(results) - len(failed)}/{len(results)} checks passed.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import itertools
+from collections import defaultdict
+from utilities.storage import StorageBackend, compress_review, split_review_rows
+
+
+class InMemoryDBManager(StorageBackend):
+    """
+    Drop-in stand-in for DBManager that keeps every table in dictionaries.
+    Rows arrive column-ready from the Perfume record, exactly as DBManager receives them.
+    """
+
+    def __init__(self):
+        self._ids = defaultdict(lambda: itertools.count(1))
+        self.countries = {}
+        self.brands = {}
+        self.perfumes = {}
+        self.lookups = defaultdict(dict)
+        self.perfume_notes = set()
+        self.perfume_accords = {}
+        self.votes = defaultdict(list)
+        self.percentages = defaultdict(list)
+        self.stats = defaultdict(list)
+        self.summaries = {}
+        self.reviews = defaultdict(list)
+        self.review_bodies = {}
+        self.change_events = []
+
+    def _next_id(self, table):
+        return next(self._ids[table])
+
+    def create_tables(self):
+        pass
+
+    def clear_perfume_details(self, perfume_id):
+        for table in (self.votes, self.percentages, self.stats, self.summaries, self.reviews):
+            table.pop(perfume_id, None)
+        self.perfume_notes = {link for link in self.perfume_notes if link[0] != perfume_id}
+        self.perfume_accords = {key: value for key, value in self.perfume_accords.items() if key[0] != perfume_id}
+
+    def insert_perfume_vote(self, perfume_id, row):
+        self.votes[perfume_id].append(row)
+
+    def insert_perfume_percentages(self, perfume_id, rows):
+        self.percentages[perfume_id].extend(rows)
+
+    def insert_perfume_stats(self, perfume_id, rows):
+        self.stats[perfume_id].extend(rows)
+
+    def insert_perfume_summary(self, perfume_id, summary):
+        self.summaries[perfume_id] = summary
+
+    def get_perfume_summary(self, perfume_id):
+        return self.summaries.get(perfume_id)
+
+    def insert_reviews(self, perfume_id, rows):
+        bodies, review_rows = split_review_rows(rows)
+        for body_hash, content in bodies.items():
+            if body_hash not in self.review_bodies:
+                self.review_bodies[body_hash] = compress_review(content)
+        self.reviews[perfume_id].extend(review_rows)
+
+    def prune_review_bodies(self):
+        referenced = {row[1] for rows in self.reviews.values() for row in rows}
+        unreferenced = [body_hash for body_hash in self.review_bodies if body_hash not in referenced]
+        for body_hash in unreferenced:
+            del self.review_bodies[body_hash]
+        return len(unreferenced)
+
+    def get_review_body_hashes(self, perfume_id):
+        return [row[1] for row in self.reviews.get(perfume_id, ())]
+
+    def insert_change_events(self, rows):
+        self.change_events.extend(rows)
+
+    def get_or_create_country(self, country_name, brand_count):
+        if country_name not in self.countries:
+            self.countries[country_name] = self._next_id("Countries")
+        return self.countries[country_name]
+
+    def get_or_create_brand(self, brand_name, country_id, brand_url, perfume_count, brand_website_url,
+                            brand_image_url):
+        if brand_name not in self.brands:
+            self.brands[brand_name] = self._next_id("Brands")
+        return self.brands[brand_name]
+
+    def get_or_create_perfume(self, perfume_name, perfume_for, image_url, launch_year, perfumer_name, perfumer_url,
+                              perfume_url, brand_id, description=None):
+        existing = self.perfumes.get(perfume_url)
+        perfume_id = existing["perfume_id"] if existing else self._next_id("Perfumes")
+        self.perfumes[perfume_url] = {
+            "perfume_id": perfume_id, "perfume_name": perfume_name, "perfume_for": perfume_for,
+            "image_url": image_url, "launch_year": launch_year, "perfumer_name": perfumer_name,
+            "perfumer_url": perfumer_url, "brand_id": brand_id, "description": description,
+        }
+        return perfume_id
+
+    def get_or_create_id(self, table_name, column_name, value):
+        table = self.lookups[table_name]
+        if value not in table:
+            table[value] = self._next_id(table_name)
+        return table[value]
+
+    def link_perfume_note(self, perfume_id, note_id, note_level):
+        self.perfume_notes.add((perfume_id, note_id, note_level))
+
+    def link_perfume_accord(self, perfume_id, accord_id, accord_strength):
+        self.perfume_accords.setdefault((perfume_id, accord_id), accord_strength)
@@ -0,0 +1,160 @@
+import os
+import sys
+import gzip
+import random
+import html
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Synthetic pages, from a perfume nobody reviews to one with thousands of reviews.
+SYNTHETIC_SIZES = {
+    "small": 10,
+    "medium": 250,
+    "large": 1500,
+    "xlarge": 5000,
+}
+
+ACCORDS = ["woody", "citrus", "aromatic", "fresh spicy", "amber", "musky", "floral", "vanilla", "powdery",
+           "warm spicy", "fruity", "leather", "green", "sweet", "balsamic", "oud", "smoky", "earthy"]
+NOTES = ["Bergamot", "Lemon", "Pink Pepper", "Lavender", "Cardamom", "Rose", "Jasmine", "Iris", "Vetiver",
+         "Cedar", "Sandalwood", "Patchouli", "Vanilla", "Tonka Bean", "Amber", "Musk", "Oud", "Leather",
+         "Neroli", "Orange Blossom", "Tuberose", "Incense", "Labdanum", "Benzoin"]
+WORDS = ("lovely fresh opening dry down lasts hours projection compliments office summer winter night "
+         "citrusy woody powdery sweet smoky amazing boring synthetic elegant classic modern blind buy "
+         "sample bottle sprays skin jacket scarf date evening spring autumn versatile unique").split()
+
+POSSESSION = ["I have it", "I had it", "I want it"]
+EMOTIONS = ["love", "like", "ok", "dislike", "hate"]
+SEASONS = ["winter", "spring", "summer", "fall", "day", "night"]
+SECTIONS = {
+    "LONGEVITY": ["very weak", "weak", "moderate", "long lasting", "eternal"],
+    "SILLAGE": ["intimate", "moderate", "strong", "enormous"],
+    "GENDER": ["female", "more female", "unisex", "more male", "male"],
+    "PRICE VALUE": ["way overpriced", "overpriced", "ok", "good value", "great value"],
+}
+
+
+def synthetic_review(rng, index, lazy_loaded=False):
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(15, 180))).capitalize() + "."
+    user = f"user{rng.randint(1, 10 ** 6)}"
+    date = f"{rng.randint(2008, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    if lazy_loaded:
+        return (f'<div class="fragrance-review-box" id="review-{index}"><div class="cell">'
+                f'<b><span>{user}</span></b><span class="vote-button-legend">{date}</span></div>'
+                f'<div class="flex-child-auto"><p>{html.escape(text)}</p></div></div>')
+    return (f'<div class="fragrance-review-box" id="review-{index}" itemprop="review"><div class="cell">'
+            f'<b class="idLinkify"><a href="/member/{user}">{user}</a></b>'
+            f'<span itemprop="datePublished" content="{date}">{date}</span></div>'
+            f'<div itemprop="reviewBody"><p>{html.escape(text)}</p></div></div>')
+
+
+def synthetic_reviews_html(rng, start, count, lazy_loaded=True):
+    return "".join(synthetic_review(rng, start + i, lazy_loaded) for i in range(count))
+
+
+def synthetic_perfume_page(review_count, seed=0, perfume_id=None, with_reviews=True, brand_name=None):
+    """
+    Builds a perfume page that matches every selector used by Extractor and the review scrapers.
+    The first ten reviews use the initial page-load structure, the rest the lazy-loaded one.
+    """
+    rng = random.Random(seed)
+    perfume_id = perfume_id if perfume_id is not None else seed
+    brand = brand_name or f"Maison {rng.choice(['Alpha', 'Beta', 'Gamma', 'Delta', 'Epsilon'])}"
+    name = f"Synthetic Perfume {perfume_id}"
+
+    def bar(value):
+        return f'<div><div style="width: {value:.2f}%;"></div></div>'
+
+    parts = [
+        f'<html><head><title>{name} {brand} for women and men</title></head><body>',
+        f'<div id="toptop"><h1>{name}<small>for women and men</small></h1></div>',
+        f'<img itemprop="image" src="https://fimgs.net/mdimg/perfume/375x500.{perfume_id}.jpg">',
+        f'<div class="vote-button"><span class="vote-button-name">{brand}</span></div>',
+        f'<div itemprop="aggregateRating"><span itemprop="ratingValue">{rng.uniform(2.5, 4.8):.2f}</span>'
+        f'<span itemprop="ratingCount">{rng.randint(10, 30000):,}</span>'
+        f'<meta itemprop="reviewCount" content="{review_count:,}"></div>',
+        '<div class="grid-x">',
+    ]
+    for accord in rng.sample(ACCORDS, 8):
+        parts.append(f'<div class="cell accord-box"><div class="accord-bar" '
+                     f'style="width: {rng.uniform(30, 100):.4f}%;">{accord}</div></div>')
+    parts.append('</div>')
+
+    # Possession, emotional attachment and wearing season charts (positional, like the live site).
+    parts.append('<div class="voting-small-chart-size">')
+    for label in POSSESSION:
+        parts.append(f'<span class="vote-button-name">{label}</span>{bar(rng.uniform(0, 100))}')
+    for label in EMOTIONS + SEASONS:
+        parts.append(f'<span class="vote-button-legend">{label}</span>{bar(rng.uniform(0, 100))}')
+    parts.append('</div>')
+
+    for title, labels in SECTIONS.items():
+        parts.append(f'<div class="cell small-12"><div><span>{title}</span></div><div class="grid-x">')
+        for label in labels:
+            parts.append(f'<div><span class="vote-button-name">{label}</span>'
+                         f'<progress value="{rng.randint(0, 5000)}" max="5000"></progress></div>')
+        parts.append('</div></div>')
+
+    parts.append('<div id="pyramid">')
+    for level in ["Top Notes", "Middle Notes", "Base Notes"]:
+        parts.append(f'<h4>{level}</h4><div>')
+        for note in rng.sample(NOTES, rng.randint(2, 6)):
+            parts.append(f'<div style="margin: 0.2rem;"><div><img src="#"></div><div>{note}</div></div>')
+        parts.append('</div>')
+    parts.append('</div>')
+
+    parts.append(f'<div><img class="perfumer-avatar" src="#"><a href="/noses/Perfumer-{perfume_id}.html">'
+                 f'Perfumer {perfume_id}</a></div>')
+    parts.append(f'<div itemprop="description"><p>{name} by {brand} is a fragrance for women and men. '
+                 f'{name} was launched in {rng.randint(1950, 2025)}.</p></div>')
+
+    if with_reviews:
+        parts.append('<div id="all-reviews"><span>All Reviews By Date</span>')
+        initial = min(review_count, 10)
+        parts.append(synthetic_reviews_html(rng, 0, initial, lazy_loaded=False))
+        parts.append(synthetic_reviews_html(rng, initial, review_count - initial, lazy_loaded=True))
+        parts.append('</div>')
+    parts.append('<div id="popBrands"><span>Most Popular Perfumes</span></div></body></html>')
+    return "".join(parts)
+
+
+def recorded_fixtures():
+    """Yields (name, html) for every page saved with `record` in benchmarks/fixtures/."""
+    if not os.path.isdir(FIXTURES_DIR):
+        return
+    for file_name in sorted(os.listdir(FIXTURES_DIR)):
+        path = os.path.join(FIXTURES_DIR, file_name)
+        if file_name.endswith(".html.gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                yield file_name[:-len(".html.gz")], f.read()
+        elif file_name.endswith(".html"):
+            with open(path, "r", encoding="utf-8") as f:
+                yield file_name[:-len(".html")], f.read()
+
+
+def load_fixtures(names=None):
+    """Returns {name: html} for the synthetic pages plus every recorded page, optionally filtered by name."""
+    fixtures = {f"synthetic_{size}": synthetic_perfume_page(count, seed=index)
+                for index, (size, count) in enumerate(SYNTHETIC_SIZES.items())}
+    fixtures.update(recorded_fixtures())
+    if names:
+        fixtures = {name: page for name, page in fixtures.items() if name in names}
+    return fixtures
+
+
+def record(url, name):
+    """Saves a live perfume page as a gzip fixture so it can be replayed offline."""
+    from scraper.CloudflareBypasser import get_page_html
+
+    page = get_page_html(url)
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    path = os.path.join(FIXTURES_DIR, f"{name}.html.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(page)
+    print(f"Recorded {url} -> {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "record":
+        sys.exit("usage: python -m benchmarks.fixtures record <perfume_url> <fixture_name>")
+    record(sys.argv[2], sys.argv[3])
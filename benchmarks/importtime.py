@@ -0,0 +1,137 @@
+"""
+Cold-start benchmark: how long importing each entry point takes in a fresh interpreter, and which heavy
+third-party packages (browser stack, ODBC driver, numpy, pyarrow...) it drags in.
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --save benchmarks/results/importtime.json
+    python -m benchmarks.importtime --compare benchmarks/results/importtime.json
+
+Every run is a separate `python -X importtime -c "import <module>"`, so nothing is cached between runs.
+Reports have the same layout as benchmarks.run, so --compare flags regressions the same way.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+from benchmarks.run import compare, git_revision
+from utilities.metrics import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = [
+    "cli", "main", "async_main", "distributed_main", "discover_main", "export_main", "assets_main",
+    "import_brands_data",
+    "scraper.extractor", "scraper.CloudflareBypasser", "scraper.selenium_scraper",
+    "utilities.storage", "utilities.catalogue", "utilities.search_index", "utilities.similarity",
+    "utilities.columnar_export",
+]
+HEAVY = ["selenium", "undetected_chromedriver", "DrissionPage", "pyodbc", "numpy", "pyarrow", "aiohttp", "bs4"]
+STAGES = ["import", "process"]
+
+
+def parse_importtime(stderr):
+    """-X importtime output -> {module: cumulative seconds (the module plus everything it imported)}."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, total, name = line[len("import time:"):].split("|")
+        cumulative.setdefault(name.strip(), int(total) / 1e6)
+    return cumulative
+
+
+def measure(target):
+    """One cold import of target. Returns (import seconds, process seconds, {heavy package: seconds})."""
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"], cwd=ROOT,
+                               capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    cumulative = parse_importtime(completed.stderr)
+    heavy = {}
+    for package in HEAVY:
+        # A package's modules can be imported from several places: its largest subtree is the best estimate
+        subtrees = [seconds for name, seconds in cumulative.items() if name.split(".")[0] == package]
+        if subtrees:
+            heavy[package] = max(subtrees)
+    return cumulative[target], elapsed, heavy
+
+
+def run_target(target, repeat):
+    samples = {stage: [] for stage in STAGES}
+    heavy = {}
+    for _ in range(repeat):
+        import_seconds, process_seconds, heavy = measure(target)
+        samples["import"].append(import_seconds)
+        samples["process"].append(process_seconds)
+
+    result = {"heavy_imports": {package: round(seconds, 6) for package, seconds in heavy.items()}, "stages": {}}
+    for stage, values in samples.items():
+        values.sort()
+        result["stages"][stage] = {
+            "runs": len(values),
+            "median_seconds": round(percentile(values, 0.5), 6),
+            "min_seconds": round(values[0], 6),
+            "p95_seconds": round(percentile(values, 0.95), 6),
+        }
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start import time of the entry points.")
+    parser.add_argument("--targets", nargs="*", default=TARGETS, help="Modules to import (default: entry points).")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module (median is reported).")
+    parser.add_argument("--save", help="Write the JSON report to this path.")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Relative slowdown of a median that counts as a regression (default 0.25).")
+    parser.add_argument("--noise-floor", type=float, default=0.02,
+                        help="Imports faster than this many seconds are never flagged (default 0.02).")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    print(f"{'module':<28}{'import':>10}{'process':>10}  heavy imports")
+    for target in args.targets:
+        try:
+            result = run_target(target, args.repeat)
+        except RuntimeError as e:
+            print(f"{target:<28}  failed: {e}")
+            continue
+        report["results"][target] = result
+        heavy = ", ".join(f"{package} {seconds * 1000:.0f}ms"
+                          for package, seconds in result["heavy_imports"].items()) or "-"
+        print(f"{target:<28}{result['stages']['import']['median_seconds'] * 1000:>8.0f}ms"
+              f"{result['stages']['process']['median_seconds'] * 1000:>8.0f}ms  {heavy}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold, args.noise_floor)
+        if regressions:
+            print(f"\n{len(regressions)} import(s) regressed by more than {args.threshold:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
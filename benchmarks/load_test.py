@@ -0,0 +1,221 @@
+"""
+End-to-end load test of the crawl pipeline against the local mock site (benchmarks/mock_site.py).
+
+    python -m benchmarks.load_test --pages 1000 --latency 0.05 --error-rate 0.02 --challenge-rate 0.05
+    python -m benchmarks.load_test --pages 100000 --pipeline async --concurrency 32 --rate 6000
+
+Pages and review scrolling go over plain HTTP through MockBrowser instead of Chromium; everything after the
+fetch (checkpoints, extraction, storage, the retry lane, scraped_urls.json) is the real code of main.py or
+the async orchestrator. The run happens in a scratch folder (--workdir) holding its SQLite database, data/
+files and run metrics, so the real data/ folder and database are never touched.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+from benchmarks.mock_site import (MockSite, MockSiteConfig, MockBrowser, PERFUME_PATH, add_site_arguments,
+                                  site_config, review_count)
+from main import process_url
+from scraper.extractor import Extractor
+from scraper.async_orchestrator import AsyncOrchestrator
+from utilities.retry import RetryQueue, RetryPolicy, DeadLetterStore, RETRY_POLICIES
+from utilities.checkpoint import CheckpointStore
+from utilities.storage import get_db_manager
+from utilities.sqlite_manager import SQLiteManager
+from utilities.metrics import metrics, peak_rss_bytes
+from utilities.profiling import add_profiling_arguments, configure_profiler
+
+PROGRESS_EVERY = 1000  # URLs between two progress lines
+REPORT_STAGES = ["process_url", "scrape_reviews", "parse_html", "save_to_db", "http_fetch"]
+STORED_REVIEWS_QUERY = ("SELECT p.perfume_url, COUNT(r.review_id) FROM Perfumes p "
+                        "LEFT JOIN Reviews r ON r.perfume_id = p.perfume_id GROUP BY p.perfume_url")
+LISTED_URLS = 10  # URLs printed per problem; the saved report has all of them
+
+
+def scaled_policies(scale):
+    """The retry policies with their backoffs multiplied by scale, so the retry lane drains within a test run."""
+    return {kind: RetryPolicy(policy.max_attempts, policy.base_delay * scale, policy.max_delay * scale)
+            for kind, policy in RETRY_POLICIES.items()}
+
+
+def run_sync(urls, extractor, scraped_urls, retry_queue, checkpoints, fetch):
+    """main.run_batches without the sleeps between batches: one due retry after each URL, then drain the lane."""
+    start = time.perf_counter()
+    for position, url in enumerate(urls, 1):
+        process_url(url, extractor, scraped_urls, retry_queue, checkpoints, fetch)
+        for item in retry_queue.pop_due(limit=1):
+            process_url(item.url, extractor, scraped_urls, retry_queue, checkpoints, fetch)
+        if position % PROGRESS_EVERY == 0:
+            elapsed = time.perf_counter() - start
+            print(f"  {position}/{len(urls)} URLs, {position / elapsed:.1f}/s, {len(retry_queue)} waiting for retry")
+    while len(retry_queue):
+        time.sleep(retry_queue.seconds_until_next())
+        for item in retry_queue.pop_due():
+            process_url(item.url, extractor, scraped_urls, retry_queue, checkpoints, fetch)
+
+
+def server_stats(site, base_url):
+    if base_url is None:
+        return site.stats()
+    with urllib.request.urlopen(f"{base_url}/mock/stats", timeout=10) as response:
+        return json.load(response)
+
+
+def served_config(site, base_url):
+    if base_url is None:
+        return site.config
+    with urllib.request.urlopen(f"{base_url}/mock/config", timeout=10) as response:
+        return MockSiteConfig(**json.load(response))
+
+
+def check_results(db_manager, urls, config):
+    """
+    (dead-lettered URLs, {url: (stored, served)} of perfumes stored with fewer reviews than the mock site
+    served) among urls. Either one means the pipeline lost data under the injected faults.
+    """
+    wanted = set(urls)
+    dead = sorted(wanted & DeadLetterStore().urls())
+    incomplete = {}
+    for rows in db_manager.stream_rows(STORED_REVIEWS_QUERY):
+        for url, stored in rows:
+            if url not in wanted:
+                continue
+            perfume_id = int(PERFUME_PATH.match(urllib.parse.urlsplit(url).path).group(1))
+            served = review_count(perfume_id, config.max_reviews, config.review_skew)
+            if stored < served:
+                incomplete[url] = (stored, served)
+    return dead, incomplete
+
+
+def print_report(report):
+    print(f"\n{report['urls']} URLs in {report['seconds']:.1f}s ({report['urls_per_second']:.1f}/s), "
+          f"{report['pipeline']} pipeline")
+    print(f"\n{'stage':<16}{'count':>8}{'errors':>8}{'p50 s':>10}{'p95 s':>10}{'max s':>10}")
+    for stage in REPORT_STAGES:
+        stats = report["stages"].get(stage)
+        if stats:
+            print(f"{stage:<16}{stats['count']:>8}{stats['errors']:>8}{stats['p50_seconds']:>10.3f}"
+                  f"{stats['p95_seconds']:>10.3f}{stats['max_seconds']:>10.3f}")
+    print("\nCounters:")
+    for name, value in sorted(report["counters"].items()):
+        print(f"  {name:<36}{value:>10}")
+    print("\nServed by the mock site:")
+    for name, value in report["server"].items():
+        print(f"  {name:<36}{value:>10}")
+    if report["peak_rss_bytes"]:
+        print(f"\nPeak RSS: {report['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+    print(f"\nDead-lettered URLs: {len(report['dead_lettered'])}")
+    for url in report["dead_lettered"][:LISTED_URLS]:
+        print(f"  {url}")
+    print(f"Perfumes stored with fewer reviews than served: {len(report['incomplete_reviews'])}")
+    for url, (stored, served) in list(report["incomplete_reviews"].items())[:LISTED_URLS]:
+        print(f"  {url}  {stored}/{served}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the crawl pipeline against the local mock site.")
+    parser.add_argument("--pages", type=int, default=1000, help="Number of mock perfume URLs to crawl.")
+    parser.add_argument("--start", type=int, default=1, help="First perfume id.")
+    parser.add_argument("--pipeline", choices=["sync", "async"], default="sync",
+                        help="main.py's URL-by-URL loop, or the asyncio orchestrator of async_main.py.")
+    parser.add_argument("--concurrency", type=int, default=8, help="URLs in flight (async pipeline).")
+    parser.add_argument("--rate", type=float, default=6000, help="New page fetches per minute (async pipeline).")
+    parser.add_argument("--timeout", type=float, default=10, help="HTTP timeout of the mock browser, in seconds.")
+    parser.add_argument("--retry-scale", type=float, default=0.01,
+                        help="Multiplier of the retry backoffs (0.01: a 2-minute backoff becomes 1.2s).")
+    parser.add_argument("--db", choices=["sqlite", "configured"], default="sqlite",
+                        help="A fresh SQLite file in the workdir, or the backend configured in config.py.")
+    parser.add_argument("--workdir", help="Scratch folder (default: a new temporary folder).")
+    parser.add_argument("--base-url", help="Use a mock site started with `python -m benchmarks.mock_site serve`.")
+    parser.add_argument("--save", help="Write the JSON report to this path.")
+    parser.add_argument("--verbose", action="store_true", help="Keep the per-URL INFO logging.")
+    add_site_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    save_path = os.path.abspath(args.save) if args.save else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="load_test-"))
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    os.chdir(workdir)  # data/ files, checkpoints, profiles and metrics all use relative paths
+    print(f"Working in {workdir}")
+    configure_profiler(args)
+
+    if args.base_url:
+        parts = urllib.parse.urlsplit(args.base_url)
+        site = MockSite(host=parts.hostname, port=parts.port)
+    else:
+        site = MockSite(site_config(args)).start()
+    urls = site.urls(args.pages, args.start)
+
+    db_manager = SQLiteManager(os.path.join(workdir, "load_test.db")) if args.db == "sqlite" else get_db_manager()
+    db_manager.create_tables()
+    browser = MockBrowser(timeout=args.timeout)
+    extractor = Extractor(db_manager, review_scraper=browser.iter_review_chunks)
+    scraped_urls = set()
+    retry_queue = RetryQueue(DeadLetterStore(), policies=scaled_policies(args.retry_scale))
+    checkpoints = CheckpointStore()
+
+    metrics.reset()
+    start = time.perf_counter()
+    try:
+        if args.pipeline == "sync":
+            try:
+                run_sync(urls, extractor, scraped_urls, retry_queue, checkpoints, browser.get_page_html)
+            finally:
+                db_manager.close()
+        else:
+            # HTTP fetches hit the mock site with aiohttp; challenges fall back to the mock browser
+            orchestrator = AsyncOrchestrator(extractor, scraped_urls, retry_queue, checkpoints,
+                                             concurrency=args.concurrency, browser_workers=args.concurrency,
+                                             rate_per_minute=args.rate, burst=args.concurrency,
+                                             browser_fetch=lambda url, isolated=False: browser.get_page_html(url))
+            asyncio.run(orchestrator.run(urls))  # closes db_manager
+        seconds = time.perf_counter() - start
+        summary = metrics.summary()
+        try:
+            dead, incomplete = check_results(db_manager, urls, served_config(site, args.base_url))
+        finally:
+            db_manager.close()
+        report = {
+            "created_at": datetime.now().isoformat(),
+            "pipeline": args.pipeline,
+            "urls": len(urls),
+            "seconds": round(seconds, 3),
+            "urls_per_second": round(len(urls) / seconds, 3) if seconds else 0.0,
+            "stages": summary["stages"],
+            "counters": summary["counters"],
+            "server": server_stats(site, args.base_url),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "dead_lettered": dead,
+            "incomplete_reviews": incomplete,
+        }
+    finally:
+        if not args.base_url:
+            site.stop()
+        metrics.export()
+
+    print_report(report)
+    if save_path:
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {save_path}")
+    if dead or incomplete:
+        print(f"\nWARNING: {len(dead)} URL(s) dead-lettered and {len(incomplete)} perfume(s) stored with "
+              f"missing reviews.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
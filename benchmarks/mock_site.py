@@ -0,0 +1,396 @@
+"""
+Local stand-in for fragrantica.com, for end-to-end load tests that never touch the real site.
+
+    python -m benchmarks.mock_site serve --port 8765 --latency 0.2 --error-rate 0.02 --challenge-rate 0.1
+    python -m benchmarks.mock_site urls --count 100000 > data/urls.csv
+
+Perfume pages are built on the fly from benchmarks/fixtures.py, seeded by the id in the URL
+(/perfume/Mock-Brand/Synthetic-Perfume-<id>.html), so any number of them can be served without storing any.
+A page holds its first ten reviews; the rest are loaded ten at a time by an infinite-scroll script that
+calls /mock/reviews/<id>?offset=N, the way the live site lazy-loads them for the Selenium scroller.
+Latency and faults (5xx, 429, hung responses, truncated pages, "Just a moment..." challenges) are injected
+at configurable rates, and /mock/stats returns what was served.
+"""
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, asdict
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.fixtures import synthetic_perfume_page, synthetic_reviews_html
+from scraper.review_parser import parse_reviews
+from utilities.errors import CloudflareBlockedError, FetchTimeoutError, raise_for_error_page
+
+HOST = "127.0.0.1"
+PORT = 8765
+INITIAL_REVIEWS = 10  # reviews in the page itself, like the live site
+REVIEWS_PER_LOAD = 10  # reviews per infinite-scroll request
+CLEARANCE_COOKIE = "cf_clearance"
+HTTP_TIMEOUT = 30  # seconds, as in async_orchestrator
+
+PERFUME_PATH = re.compile(r"^/perfume/[^/]+/[^/]+-(\d+)\.html$")
+REVIEWS_PATH = re.compile(r"^/mock/reviews/(\d+)$")
+
+CHALLENGE_PAGE = """<!DOCTYPE html><html><head><title>Just a moment...</title></head><body>
+<div id="challenge-platform"><h1>Checking if the site connection is secure</h1>{solve}</div></body></html>"""
+# The browser passes the challenge after `delay` seconds, like Cloudflare's JS challenge.
+# Without the script (plain HTTP clients) the page stays a challenge; see MockBrowser for the scripted pass.
+CHALLENGE_SOLVE = """<a id="cf-chl-solve" href="{href}" data-delay="{delay}"></a>
+<script>setTimeout(function () {{ location.href = "{href}"; }}, {delay_ms});</script>"""
+
+SCROLL_SCRIPT = """<div class="infinite-status-prompt" style="display: none;">No more data :(</div>
+<script>
+(function () {
+  var box = document.getElementById("all-reviews"), prompt = document.querySelector(".infinite-status-prompt");
+  var loading = false, done = false;
+  window.addEventListener("scroll", function () {
+    if (loading || done) return;
+    loading = true;
+    var offset = box.getElementsByClassName("fragrance-review-box").length;
+    fetch(box.getAttribute("data-reviews") + "?offset=" + offset)
+      .then(function (response) { return response.text(); })
+      .then(function (html) {
+        if (html) { box.insertAdjacentHTML("beforeend", html); } else { done = true; prompt.style.display = "block"; }
+      })
+      .finally(function () { loading = false; });
+  });
+})();
+</script>"""
+
+
+@dataclass
+class MockSiteConfig:
+    """Rates are per request and drawn independently, so a retried URL can get a different outcome."""
+    latency: float = 0.0  # seconds added to every response...
+    jitter: float = 0.0  # ...plus up to this many more, uniformly
+    error_rate: float = 0.0  # 503 Service Unavailable
+    throttle_rate: float = 0.0  # 429 Too Many Requests with Retry-After
+    hang_rate: float = 0.0  # response held for hang_seconds, then dropped
+    hang_seconds: float = 60.0
+    truncate_rate: float = 0.0  # 200 with the page cut off at a random point
+    challenge_rate: float = 0.0  # "Just a moment..." page, passed after challenge_seconds (sets a clearance cookie)
+    challenge_seconds: float = 2.0
+    clearance_seconds: float = 30.0  # how long a passed challenge's cookie lasts
+    block_rate: float = 0.0  # "Just a moment..." page that cannot be passed
+    max_reviews: int = 2000
+    review_skew: float = 0.6  # Pareto shape of the review counts: most perfumes have a few, some thousands
+    seed: int = 0
+
+
+def review_count(perfume_id, max_reviews, skew=0.6):
+    """Deterministic, long-tailed number of reviews of a mock perfume."""
+    return min(max_reviews, int(random.Random(f"reviews-{perfume_id}").paretovariate(skew)) - 1)
+
+
+class MockSite:
+    """
+    The mock site, served from a background thread:
+
+        with MockSite(MockSiteConfig(latency=0.1, error_rate=0.05)) as site:
+            urls = site.urls(1000)
+            ...
+            print(site.stats())
+    """
+
+    def __init__(self, config=None, host=HOST, port=0):
+        self.config = config or MockSiteConfig()
+        self.host = host
+        self.port = port
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def url(self, perfume_id):
+        return f"{self.base_url}/perfume/Mock-Brand/Synthetic-Perfume-{perfume_id}.html"
+
+    def urls(self, count, start=1):
+        return [self.url(perfume_id) for perfume_id in range(start, start + count)]
+
+    def start(self):
+        self._server = MockSiteServer((self.host, self.port), MockSiteHandler)
+        self._server.site = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-site", daemon=True)
+        self._thread.start()
+        logging.info(f"🧪 Mock site serving on {self.base_url}")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(sorted(self._stats.items()))
+
+    def roll(self):
+        with self._lock:
+            return self._rng.random()
+
+    def delay(self):
+        config = self.config
+        with self._lock:
+            return config.latency + self._rng.uniform(0, config.jitter)
+
+    def fault(self, has_clearance):
+        """The fault to inject into one page request, or None."""
+        config = self.config
+        roll = self.roll()
+        for name, rate in (("error", config.error_rate), ("throttle", config.throttle_rate),
+                           ("hang", config.hang_rate), ("truncate", config.truncate_rate),
+                           ("block", config.block_rate),
+                           ("challenge", 0.0 if has_clearance else config.challenge_rate)):
+            if roll < rate:
+                return name
+            roll -= rate
+        return None
+
+    def perfume_page(self, perfume_id):
+        count = review_count(perfume_id, self.config.max_reviews, self.config.review_skew)
+        page = synthetic_perfume_page(count, seed=perfume_id, perfume_id=perfume_id, with_reviews=False,
+                                      brand_name="Mock Brand")
+        initial = min(count, INITIAL_REVIEWS)
+        reviews = (f'<div id="all-reviews" data-reviews="/mock/reviews/{perfume_id}"><span>All Reviews By Date</span>'
+                   f'{synthetic_reviews_html(random.Random(f"{perfume_id}-0"), 0, initial, lazy_loaded=False)}</div>'
+                   f'{SCROLL_SCRIPT}')
+        return page.replace('<div id="popBrands">', reviews + '<div id="popBrands">', 1)
+
+    def reviews_fragment(self, perfume_id, offset):
+        count = review_count(perfume_id, self.config.max_reviews, self.config.review_skew)
+        size = max(0, min(REVIEWS_PER_LOAD, count - offset))
+        return synthetic_reviews_html(random.Random(f"{perfume_id}-{offset}"), offset, size, lazy_loaded=True)
+
+
+class MockSiteServer(ThreadingHTTPServer):
+    daemon_threads = True  # hung requests must not hold up shutdown
+    request_queue_size = 128  # the default of 5 drops connections under a concurrent crawl
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug("mock site: " + format, *args)
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=()):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        site = self.server.site
+        parsed = urllib.parse.urlsplit(self.path)
+        if parsed.path == "/mock/stats":
+            self._send(200, json.dumps(site.stats()), "application/json")
+            return
+        if parsed.path == "/mock/config":
+            self._send(200, json.dumps(asdict(site.config)), "application/json")
+            return
+
+        time.sleep(site.delay())
+        if parsed.path == "/cdn-cgi/challenge":
+            site.count("challenge.passed")
+            target = urllib.parse.parse_qs(parsed.query).get("return", ["/"])[0]
+            cookie = f"{CLEARANCE_COOKIE}=mock; Path=/; Max-Age={int(site.config.clearance_seconds)}"
+            self._send(302, "", headers=(("Location", target), ("Set-Cookie", cookie)))
+            return
+
+        match = REVIEWS_PATH.match(parsed.path)
+        if match:
+            offset = int(urllib.parse.parse_qs(parsed.query).get("offset", ["0"])[0])
+            site.count("reviews.200")
+            self._send(200, site.reviews_fragment(int(match.group(1)), offset))
+            return
+
+        match = PERFUME_PATH.match(parsed.path)
+        if not match:
+            site.count("other.404")
+            self._send(404, "<html><head><title>Not Found</title></head><body>404</body></html>")
+            return
+        self._perfume(site, int(match.group(1)), parsed.path)
+
+    def _perfume(self, site, perfume_id, path):
+        fault = site.fault(f"{CLEARANCE_COOKIE}=" in self.headers.get("Cookie", ""))
+        site.count(f"page.{fault or 'ok'}")
+        if fault == "error":
+            self._send(503, "<html><head><title>503 Service Unavailable</title></head><body>503</body></html>")
+        elif fault == "throttle":
+            self._send(429, "<html><head><title>429 Too Many Requests</title></head><body>429</body></html>",
+                       headers=(("Retry-After", "60"),))
+        elif fault == "hang":
+            time.sleep(site.config.hang_seconds)
+            self.close_connection = True
+        elif fault == "truncate":
+            page = site.perfume_page(perfume_id)
+            self._send(200, page[:random.Random(f"{perfume_id}-cut").randrange(len(page))])
+        elif fault in ("challenge", "block"):
+            solve = ""
+            if fault == "challenge":
+                delay = site.config.challenge_seconds
+                solve = CHALLENGE_SOLVE.format(href=f"/cdn-cgi/challenge?return={urllib.parse.quote(path)}",
+                                               delay=delay, delay_ms=int(delay * 1000))
+            self._send(403, CHALLENGE_PAGE.format(solve=solve))
+        else:
+            self._send(200, site.perfume_page(perfume_id))
+
+
+class MockBrowser:
+    """
+    Plain-HTTP stand-in for the Chromium fetch and the Selenium review scroller, so main.py's pipeline can run
+    against the mock site without a browser. It keeps cookies and passes challenges the way the browser would
+    (waiting out the challenge, then following its link); a challenge without a way through raises
+    CloudflareBlockedError, as get_page_html does. Error statuses and cut-off pages raise FetchTimeoutError.
+    """
+
+    def __init__(self, timeout=HTTP_TIMEOUT, sleep=time.sleep):
+        self.timeout = timeout
+        self.sleep = sleep
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def _get(self, url):
+        """(status, body). Error statuses return their page like a browser would show it."""
+        try:
+            with self.opener.open(url, timeout=self.timeout) as response:
+                return response.status, response.read().decode("utf-8", errors="replace")
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode("utf-8", errors="replace")
+        except (urllib.error.URLError, ConnectionError) as e:
+            if "timed out" in str(e):
+                raise FetchTimeoutError(f"Timed out fetching {url}") from e
+            raise
+
+    def get_page_html(self, url):
+        status, html = self._get(url)
+        if "<title>Just a moment" in html[:512]:
+            solve = re.search(r'id="cf-chl-solve" href="([^"]+)" data-delay="([\d.]+)"', html)
+            if not solve:
+                raise CloudflareBlockedError(f"Cloudflare challenge not bypassed for {url}")
+            self.sleep(float(solve.group(2)))
+            status, html = self._get(urllib.parse.urljoin(url, solve.group(1)))
+        raise_for_error_page(url, html, status)
+        if not html.rstrip().endswith("</html>"):
+            raise FetchTimeoutError(f"Connection cut off fetching {url}")
+        return html
+
+    def iter_review_chunks(self, url, chunk_size=200):
+        """Loads the page again and 'scrolls' through its reviews, like iter_review_chunks_with_selenium."""
+        html = self.get_page_html(url)
+        match = re.search(r'data-reviews="([^"]+)"', html)
+        if not match:
+            raise FetchTimeoutError(f"No reviews container on {url}")
+        reviews = parse_reviews(html)["reviews"]
+        reviews_url = urllib.parse.urljoin(url, match.group(1))
+        offset = html.count('class="fragrance-review-box"')
+        while True:
+            while len(reviews) >= chunk_size:
+                yield reviews[:chunk_size]
+                reviews = reviews[chunk_size:]
+            status, fragment = self._get(f"{reviews_url}?offset={offset}")
+            raise_for_error_page(reviews_url, fragment, status)
+            if not fragment:
+                break
+            offset += fragment.count('class="fragrance-review-box"')
+            reviews.extend(parse_reviews(fragment)["reviews"])
+        if reviews:
+            yield reviews
+
+
+def add_site_arguments(parser):
+    """Latency and fault options, shared by `serve` and benchmarks/load_test.py."""
+    defaults = MockSiteConfig()
+    for name, help_text in (("latency", "Seconds added to every response."),
+                            ("jitter", "Up to this many extra seconds per response, at random."),
+                            ("error-rate", "Share of page requests answered with 503."),
+                            ("throttle-rate", "Share of page requests answered with 429."),
+                            ("hang-rate", "Share of page requests held for --hang-seconds and dropped."),
+                            ("hang-seconds", "How long a hung request is held."),
+                            ("truncate-rate", "Share of pages cut off at a random point."),
+                            ("challenge-rate", "Share of page requests (without clearance) that get a challenge."),
+                            ("challenge-seconds", "How long the challenge takes to pass."),
+                            ("clearance-seconds", "How long a passed challenge keeps later requests clear."),
+                            ("block-rate", "Share of page requests that get a challenge that cannot be passed.")):
+        parser.add_argument(f"--{name}", type=float, default=getattr(defaults, name.replace("-", "_")),
+                            help=help_text)
+    parser.add_argument("--max-reviews", type=int, default=defaults.max_reviews, help="Most reviews of a perfume.")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Seed of the fault rolls.")
+
+
+def site_config(args):
+    return MockSiteConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          throttle_rate=args.throttle_rate, hang_rate=args.hang_rate, hang_seconds=args.hang_seconds,
+                          truncate_rate=args.truncate_rate, challenge_rate=args.challenge_rate,
+                          challenge_seconds=args.challenge_seconds,
+                          clearance_seconds=args.clearance_seconds, block_rate=args.block_rate,
+                          max_reviews=args.max_reviews, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock of fragrantica.com for load tests.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Serve mock perfume pages until interrupted.")
+    serve_parser.add_argument("--host", default=HOST)
+    serve_parser.add_argument("--port", type=int, default=PORT)
+    add_site_arguments(serve_parser)
+    urls_parser = commands.add_parser("urls", help="Print a main.py input CSV of mock perfume URLs.")
+    urls_parser.add_argument("--count", type=int, default=1000)
+    urls_parser.add_argument("--start", type=int, default=1, help="First perfume id.")
+    urls_parser.add_argument("--host", default=HOST)
+    urls_parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args(argv)
+
+    if args.command == "urls":
+        site = MockSite(host=args.host, port=args.port)
+        print("url")
+        for url in site.urls(args.count, args.start):
+            print(url)
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    site = MockSite(site_config(args), host=args.host, port=args.port).start()
+    try:
+        while True:
+            time.sleep(60)
+            logging.info(f"Served: {site.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Offline benchmark for page parsing, review extraction and DB writes.
+
+    python -m benchmarks.run --save benchmarks/results/baseline.json
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Pages come from benchmarks/fixtures.py (synthetic pages plus any recorded ones) and writes go to
+InMemoryDBManager or SQLiteManager, so nothing touches fragrantica.com or SQL Server.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from bs4 import BeautifulSoup
+
+from benchmarks.fixtures import load_fixtures
+from benchmarks.fake_db import InMemoryDBManager
+from scraper.extractor import Extractor
+from scraper.models import Perfume
+from scraper.review_parser import parse_reviews
+from utilities.metrics import percentile, peak_rss_bytes
+from utilities.sqlite_manager import SQLiteManager
+
+STAGES = ["parse_html", "extract_fields", "extract_reviews", "db_write"]
+FIXTURE_URL = "https://www.fragrantica.com/perfume/Benchmark/{name}.html"
+
+
+def make_db(kind):
+    if kind == "memory":
+        return InMemoryDBManager()
+    if kind == "sqlite":
+        db = SQLiteManager(":memory:")
+        db.create_tables()
+        return db
+    raise ValueError(f"Unknown benchmark database '{kind}'")
+
+
+def run_fixture(name, page, repeat, db_kind):
+    samples = {stage: [] for stage in STAGES}
+    review_count = 0
+    for _ in range(repeat):
+        db = make_db(db_kind)
+        extractor = Extractor(db, review_scraper=None)
+        url = FIXTURE_URL.format(name=name)
+
+        start = time.perf_counter()
+        soup = BeautifulSoup(page, "html.parser")
+        samples["parse_html"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        perfume = Perfume.from_extracted(extractor._extract_page_fields(soup, url))
+        samples["extract_fields"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        perfume.reviews = parse_reviews(soup)["reviews"]
+        samples["extract_reviews"].append(time.perf_counter() - start)
+        review_count = len(perfume.reviews)
+
+        start = time.perf_counter()
+        extractor.save(perfume)
+        samples["db_write"].append(time.perf_counter() - start)
+
+        close = getattr(db, "close", None)
+        if close:
+            close()
+
+    result = {"html_bytes": len(page), "review_count": review_count, "stages": {}}
+    for stage, values in samples.items():
+        values.sort()
+        result["stages"][stage] = {
+            "runs": len(values),
+            "median_seconds": round(percentile(values, 0.5), 6),
+            "min_seconds": round(values[0], 6),
+            "p95_seconds": round(percentile(values, 0.95), 6),
+        }
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold, noise_floor=0.001):
+    """
+    Prints median changes per fixture/stage and returns the list of regressions beyond threshold.
+    Stages faster than noise_floor seconds in both runs are reported but never flagged.
+    """
+    regressions = []
+    print(f"\n{'fixture':<22}{'stage':<18}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in current["results"].items():
+        base_result = baseline["results"].get(name)
+        if not base_result:
+            continue
+        for stage, stats in result["stages"].items():
+            base_stats = base_result["stages"].get(stage)
+            if not base_stats or not base_stats["median_seconds"]:
+                continue
+            change = stats["median_seconds"] / base_stats["median_seconds"] - 1
+            noisy = max(stats["median_seconds"], base_stats["median_seconds"]) < noise_floor
+            flag = "  REGRESSION" if change > threshold and not noisy else ""
+            print(f"{name:<22}{stage:<18}{base_stats['median_seconds']:>12.4f}{stats['median_seconds']:>12.4f}"
+                  f"{change:>+10.1%}{flag}")
+            if flag:
+                regressions.append((name, stage, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline parse/extract/DB-write benchmark.")
+    parser.add_argument("--fixtures", nargs="*", help="Only run these fixture names.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per fixture (median is reported).")
+    parser.add_argument("--db", default="memory", choices=["memory", "sqlite"],
+                        help="Storage stand-in to write to: in-memory fake or an in-memory SQLite database.")
+    parser.add_argument("--save", help="Write the JSON report to this path.")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative slowdown of a median that counts as a regression (default 0.15).")
+    parser.add_argument("--noise-floor", type=float, default=0.001,
+                        help="Stages faster than this many seconds are never flagged (default 0.001).")
+    args = parser.parse_args(argv)
+
+    # Keep per-perfume INFO logging out of the measurements.
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "db": args.db,
+        },
+        "results": {},
+    }
+    for name, page in load_fixtures(args.fixtures).items():
+        result = run_fixture(name, page, args.repeat, args.db)
+        report["results"][name] = result
+        stages = "  ".join(f"{stage}={stats['median_seconds'] * 1000:.1f}ms"
+                           for stage, stats in result["stages"].items())
+        print(f"{name:<22} {result['review_count']:>5} reviews  {stages}")
+
+    report["meta"]["peak_rss_bytes"] = peak_rss_bytes()
+    if report["meta"]["peak_rss_bytes"]:
+        print(f"Peak RSS: {report['meta']['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold, args.noise_floor)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+One entry point for every task:
+
+    python cli.py <command> [arguments...]
+    python cli.py search reviews smoky vanilla
+    python cli.py export --full
+
+Each command runs the module it names exactly as `python -m <module>` would, and that module is only
+imported once the command is chosen. Offline tasks (exports, searches, brand imports...) therefore never
+load Selenium, undetected_chromedriver, DrissionPage or pyodbc unless they actually need them.
+"""
+import sys
+import runpy
+import argparse
+
+# command -> (module run as __main__, help)
+COMMANDS = {
+    "scrape": ("main", "Scrape data/urls.csv in timed batches."),
+    "async": ("async_main", "Scrape data/urls.csv with the asyncio orchestrator."),
+    "distributed": ("distributed_main", "Multi-host crawling from the shared CrawlQueue table."),
+    "retry": ("utilities.retry", "List or requeue dead-lettered URLs."),
+    "import-brands": ("import_brands_data", "Load countries and brands from data/ into the database."),
+    "discover": ("discover_main", "Queue new perfumes from brand pages whose perfume count changed."),
+    "export": ("export_main", "Export the catalogue to Parquet/Arrow files."),
+    "assets": ("assets_main", "Download and cache the perfume and brand images."),
+    "similarity": ("utilities.similarity", "Build the similar-perfumes index or query it."),
+    "search": ("utilities.search_index", "Build the full-text search index or query it."),
+    "catalogue": ("utilities.catalogue", "Print whole perfume documents by id, URL or brand."),
+    "perfume-metrics": ("utilities.perfume_metrics", "Recompute the catalogue-wide PerfumeMetrics table."),
+    "storage": ("utilities.storage", "Storage maintenance: prune unreferenced review bodies."),
+    "changes": ("utilities.change_events", "Read the change-event outbox from a consumer cursor."),
+    "profile": ("utilities.profiling", "Summarize the profiles saved with --profile-every/--profile-slower-than."),
+    "benchmark": ("benchmarks.run", "Offline parse/extract/DB-write benchmark."),
+    "load-test": ("benchmarks.load_test", "Crawl the local mock site end to end with injected latency and faults."),
+    "mock-site": ("benchmarks.mock_site", "Serve the local mock of fragrantica.com."),
+    "importtime": ("benchmarks.importtime", "Cold-start import time of the entry points."),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="ScentSymphony scraper and catalogue tools.")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="<command>")
+    for name, (module, help_text) in COMMANDS.items():
+        # Everything after the command name (including -h) is left to the command's own parser
+        commands.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+def main(argv=None):
+    args, command_args = build_parser().parse_known_args(argv)
+    module = COMMANDS[args.command][0]
+    sys.argv = [module, *command_args]  # sys.argv[0] becomes the module's path, as with `python -m`
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
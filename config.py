@@ -2,6 +2,13 @@ ZENROWS_API_KEY = "f4e71584dc06fa15fe908e9c858371b5ffc99e7c"
 #OUTPUT_FOLDER = "fragrance_json"
 NOTES_URL = "https://www.fragrantica.com/notes/"
 OUTPUT_FOLDER = 'output'
+METRICS_FOLDER = 'metrics'  # per-run JSON summaries and Prometheus text files
+LOG_LEVEL = 'INFO'  # set to 'DEBUG' for per-review and per-scroll messages
+LOG_FORMAT = 'text'  # 'text' or 'json' (one JSON object per line with url/correlation_id)
+LOG_FILE = None  # optional path; logs always go to stdout as well
+DB_BACKEND = 'mssql'  # 'mssql' (SQL Server via DB_CONNECTION_STRING) or 'sqlite' (local file at SQLITE_PATH)
+SQLITE_PATH = 'data/fragrance.db'
+REVIEW_CHUNK_SIZE = 200  # reviews parsed, spooled and inserted per batch, which bounds memory on huge pages
 DB_CONNECTION_STRING = (
     "DRIVER={ODBC Driver 18 for SQL Server};"
     "SERVER=AliAkbarPC;"  # <-- Your Server Name
@@ -0,0 +1,44 @@
+import sys
+import argparse
+
+from scraper.discovery import BrandDiscovery, load_brand_listing, BRANDS_JSON_PATH
+from utilities.storage import get_db_manager
+from utilities.metrics import metrics
+from utilities.log_utils import setup_logging
+
+# Configure logging (text or JSON lines, see LOG_FORMAT in config.py)
+setup_logging()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Find new perfumes on the brand pages whose perfume count changed, and queue them.")
+    parser.add_argument("--brands", default=BRANDS_JSON_PATH, help="Brand listing with perfume counts.")
+    parser.add_argument("--recheck-days", type=int,
+                        help="Also recrawl brands whose page was last checked more than this many days ago.")
+    parser.add_argument("--limit", type=int, help="Fetch at most this many brand pages in this run.")
+    parser.add_argument("--csv", help="Also append the new URLs to this main.py input CSV (e.g. data/urls.csv).")
+    parser.add_argument("--dry-run", action="store_true", help="List the brands that are due, fetch nothing.")
+    args = parser.parse_args(argv)
+
+    db_manager = get_db_manager()
+    try:
+        db_manager.create_tables()
+        listing = load_brand_listing(args.brands)
+        if args.dry_run:
+            discovery = BrandDiscovery(db_manager, fetch=lambda url: None)
+            due = discovery.due_brands(listing, discovery.load_state(), args.recheck_days)
+            for reason, country, name, brand_url, perfume_count in due[:args.limit]:
+                print(f"{reason:<14} {name} ({country}): {perfume_count} perfumes  {brand_url}")
+            print(f"{len(due)} of {len(listing)} brands are due.")
+            return 0
+        BrandDiscovery(db_manager).run(listing, recheck_days=args.recheck_days, limit=args.limit,
+                                       csv_path=args.csv)
+    finally:
+        db_manager.close()
+        metrics.export()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
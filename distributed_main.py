@@ -0,0 +1,100 @@
+import sys
+import logging
+import argparse
+
+from main import prepare_run, attach_derived_indexes
+from scraper.extractor import Extractor
+from scraper.crawl_worker import CrawlWorker, LEASE_SECONDS, LEASE_BATCH
+from utilities.storage import get_db_manager
+from utilities.metrics import metrics
+from utilities.log_utils import setup_logging
+from utilities.checkpoint import CheckpointStore
+from utilities.profiling import add_profiling_arguments, configure_profiler
+
+# Configure logging (text or JSON lines, see LOG_FORMAT in config.py)
+setup_logging()
+
+
+def enqueue(args):
+    """Loads data/urls.csv (minus scraped and dead-lettered URLs) into the shared CrawlQueue table."""
+    prepared = prepare_run(args.csv)
+    if prepared is None:
+        return 1
+    db_manager, _, _, _, urls_left = prepared
+    try:
+        db_manager.enqueue_urls(urls_left)
+        logging.info(f"📥 Offered {len(urls_left)} URLs to the queue. Queue now: {db_manager.queue_counts()}")
+    finally:
+        db_manager.close()
+    return 0
+
+
+def work(args):
+    configure_profiler(args)
+    db_manager = get_db_manager()
+    queue_db = get_db_manager()
+    try:
+        db_manager.create_tables()
+        extractor = Extractor(db_manager)
+        attach_derived_indexes(extractor)
+        worker = CrawlWorker(extractor, queue_db, CheckpointStore(), owner=args.owner,
+                             lease_seconds=args.lease_seconds, lease_batch=args.lease_batch)
+        worker.run(wait=args.wait)
+    finally:
+        queue_db.close()
+        db_manager.close()
+        metrics.export()
+    return 0
+
+
+def status(args):
+    db_manager = get_db_manager()
+    try:
+        for state, count in sorted(db_manager.queue_counts().items()):
+            print(f"{state:<8} {count}")
+    finally:
+        db_manager.close()
+    return 0
+
+
+def requeue(args):
+    db_manager = get_db_manager()
+    try:
+        count = db_manager.requeue_dead_urls(args.urls or None)
+        # A requeued URL starts from a fresh fetch on this host (each host has its own checkpoints)
+        CheckpointStore().discard_fetched(args.urls or None)
+        print(f"Requeued {count} dead URL(s).")
+    finally:
+        db_manager.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-host crawling from a shared CrawlQueue table.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Load a URL CSV into the queue (run once, from any host).")
+    enqueue_parser.add_argument("--csv", default="data/urls.csv")
+    enqueue_parser.set_defaults(func=enqueue)
+
+    work_parser = commands.add_parser("work", help="Lease and scrape URLs until the queue is drained.")
+    work_parser.add_argument("--owner", help="Lease owner name (default: host-pid-random).")
+    work_parser.add_argument("--lease-seconds", type=int, default=LEASE_SECONDS)
+    work_parser.add_argument("--lease-batch", type=int, default=LEASE_BATCH, help="URLs claimed per lease.")
+    work_parser.add_argument("--wait", action="store_true", help="Keep polling when nothing is due instead of exiting.")
+    add_profiling_arguments(work_parser)
+    work_parser.set_defaults(func=work)
+
+    status_parser = commands.add_parser("status", help="Show how many URLs are in each state.")
+    status_parser.set_defaults(func=status)
+
+    requeue_parser = commands.add_parser("requeue", help="Give dead URLs (all, or the ones listed) another chance.")
+    requeue_parser.add_argument("urls", nargs="*")
+    requeue_parser.set_defaults(func=requeue)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+import sys
+import argparse
+
+from utilities.storage import get_db_manager
+from utilities.metrics import metrics
+from utilities.log_utils import setup_logging
+from utilities.columnar_export import ColumnarExporter, EXPORT_DIR, FORMATS, BATCH_SIZE
+
+# Configure logging (text or JSON lines, see LOG_FORMAT in config.py)
+setup_logging()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the catalogue to partitioned Parquet/Arrow files.")
+    parser.add_argument("--out", default=EXPORT_DIR, help="Output folder (holds the watermark too).")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--full", action="store_true", help="Export every perfume instead of just the changed ones.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows fetched per round trip.")
+    args = parser.parse_args(argv)
+
+    db_manager = get_db_manager()
+    try:
+        db_manager.create_tables()
+        exporter = ColumnarExporter(db_manager, out_dir=args.out, fmt=args.format, batch_size=args.batch_size)
+        exporter.run(full=args.full)
+    finally:
+        db_manager.close()
+        metrics.export()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
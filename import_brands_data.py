@@ -1,7 +1,8 @@
 import json
 import csv
 import logging
-from utilities.dbmanager import DBManager
+from utilities.storage import get_db_manager
+from utilities.log_utils import setup_logging
 
 # --- CONFIGURATION ---
 COUNTRIES_JSON_PATH = 'data/countries.json'
@@ -10,7 +11,7 @@ DETAILS_CSV_PATH = 'data/perfume_url.csv'
 BASE_URL = "https://www.fragrantica.com"
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 
 
 def load_brand_details_from_csv(csv_path):
@@ -104,7 +105,7 @@ def main():
     """
     logging.info("--- Starting Brand and Country Data Import ---")
 
-    db = DBManager()
+    db = get_db_manager()
     db.create_tables()
 
     brand_details_lookup = load_brand_details_from_csv(DETAILS_CSV_PATH)
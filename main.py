@@ -1,16 +1,23 @@
 import logging
 import time
 import random
+import argparse
 
 from utilities.file_utils import read_urls_from_csv, load_scraped_urls, save_scraped_urls
 from scraper.CloudflareBypasser import get_page_html
 from scraper.extractor import Extractor
-from utilities.dbmanager import DBManager
-from config import DB_CONNECTION_STRING
-from utilities.file_utils import failed_url, clean_failed_urls
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from scraper.models import Perfume
+from utilities.storage import get_db_manager
+from utilities.file_utils import clean_failed_urls
+from utilities.metrics import metrics
+from utilities.log_utils import setup_logging, url_context
+from utilities.errors import FetchTimeoutError, classify_error
+from utilities.retry import RetryQueue
+from utilities.checkpoint import CheckpointStore, FETCHED, PARSED
+from utilities.profiling import profiler, add_profiling_arguments, configure_profiler
+
+# Configure logging (text or JSON lines, see LOG_FORMAT in config.py)
+setup_logging()
 
 BATCH_SIZE = 25  # Number of URLs to process in each batch
 SLEEP_MIN = 8 * 60  # 8 minutes
@@ -18,25 +25,132 @@ SLEEP_MAX = 15 * 60  # 15 minutes
 FAILED_LOG_FILE = "failed_urls.log"
 
 
-def main():
-    url_csv = "data/urls.csv"
+def attach_derived_indexes(extractor):
+    """Hooks the local indexes that have been built (similarity, full-text search) to the extractor's saves."""
+    # Imported here so commands that never save (e.g. `distributed_main.py status`) don't load numpy
+    from utilities.similarity import attach_similarity_index
+    from utilities.search_index import attach_search_index
+
+    attach_similarity_index(extractor)
+    attach_search_index(extractor)
+
+
+def prepare_run(url_csv="data/urls.csv"):
+    """
+    Opens the storage backend and works out which URLs still need scraping.
+    Returns (db_manager, extractor, scraped_urls, retry_queue, urls_left), or None if the tables could not be created.
+    """
     urls_to_scrape = read_urls_from_csv(url_csv)
     scraped_urls = load_scraped_urls()
-    connection_string = DB_CONNECTION_STRING
 
     # --- Initialization ---
-    db_manager = DBManager(connection_string)
+    db_manager = get_db_manager()
     extractor = Extractor(db_manager)
 
     try:
         db_manager.create_tables()
     except Exception as e:
         logging.error(f"❌ Exiting: Could not initialize database tables. Error: {e}")
-        return
+        return None
+    attach_derived_indexes(extractor)
+
+    # Filter out already scraped URLs and URLs parked in the dead-letter store
+    retry_queue = RetryQueue()
+    dead_letters = retry_queue.dead_letters.urls()
+    urls_left = [u for u in urls_to_scrape if u not in scraped_urls and u not in dead_letters]
+    if dead_letters:
+        logging.info(f"Skipping {len(dead_letters)} dead-lettered URLs (requeue with `python -m utilities.retry requeue`).")
+    return db_manager, extractor, scraped_urls, retry_queue, urls_left
 
-    # Filter out already scraped URLs
-    urls_left = [u for u in urls_to_scrape if u not in scraped_urls]
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape data/urls.csv in timed batches.")
+    add_profiling_arguments(parser)
+    configure_profiler(parser.parse_args(argv))
+
+    prepared = prepare_run()
+    if prepared is None:
+        return
+    db_manager, extractor, scraped_urls, retry_queue, urls_left = prepared
+
+    try:
+        run_batches(urls_left, extractor, scraped_urls, retry_queue, CheckpointStore())
+    finally:
+        db_manager.close()
+        metrics.export()
+
+
+def scrape_url(url, extractor, checkpoints, fetch=get_page_html, scroll=None, save=None):
+    """
+    Fetches, parses and stores one URL, resuming from its last checkpoint. Raises on failure.
+    fetch(url) -> html, scroll(perfume, spool) and save(perfume) default to the browser fetch,
+    extractor.extract_reviews and extractor.save; the async orchestrator passes hooks that run them
+    on its event loop, browser pool and DB writer thread.
+    """
+    scroll = scroll or extractor.extract_reviews
+    save = save or extractor.save
+    stage = checkpoints.stage(url)
+    perfume = checkpoints.load_parsed(url, Perfume.from_dict) if stage == PARSED else None
+
+    if perfume is None:
+        html_content = checkpoints.load_html(url) if stage == FETCHED else None
+        resumed = html_content is not None
+        if resumed:
+            logging.info("♻️ Resuming from fetched checkpoint.")
+        else:
+            html_content = fetch(url)
+            if not html_content:
+                raise FetchTimeoutError(f"Could not retrieve HTML for {url}")
+        try:
+            perfume = extractor.extract_page(html_content, url)
+        except Exception:
+            if resumed:
+                checkpoints.discard_fetched([url])  # the next attempt fetches the page again
+            raise
+        if not resumed:
+            # Only pages that parsed are checkpointed, so an error page is never replayed by a retry
+            checkpoints.save_fetched(url, html_content)
+        del html_content  # not needed while the reviews are scrolled and spooled
+        scroll(perfume, checkpoints.review_spool(url))
+        checkpoints.save_parsed(url, perfume.to_dict())
+    else:
+        logging.info("♻️ Resuming from parsed checkpoint.")
+
+    save(perfume)
+
+
+def process_url(url, extractor, scraped_urls, retry_queue, checkpoints, fetch=get_page_html):
+    """
+    Scrapes and stores one URL, resuming from its last checkpoint. Failures go to the retry lane.
+    fetch(url) -> html replaces the browser fetch (e.g. benchmarks/load_test.py uses the mock site).
+    """
+    with url_context(url):
+        try:
+            logging.info(f"\n🔍 Scraping: {url}")
+            with profiler.profile(url), metrics.timer("process_url"):
+                scrape_url(url, extractor, checkpoints, fetch)
+
+            # ✅ Only mark as scraped if insertion is successful
+            scraped_urls.add(url)
+            save_scraped_urls(scraped_urls)
+            checkpoints.mark_persisted(url)
+            retry_queue.record_success(url)
+            metrics.increment("urls_scraped")
+
+        except Exception as e:
+            kind = classify_error(e)
+            logging.error(f"❌ Error while processing {url} ({kind}): {e}", exc_info=True)
+            metrics.increment(f"urls_failed.{kind}")
+            retry_queue.record_failure(url, e)
+
+
+def run_due_retries(extractor, scraped_urls, retry_queue, checkpoints, limit=None):
+    for item in retry_queue.pop_due(limit):
+        logging.info(f"🔁 Retry lane: attempt {item.attempt + 1} for {item.url} (last error: {item.kind})")
+        process_url(item.url, extractor, scraped_urls, retry_queue, checkpoints)
+
+
+def run_batches(urls_left, extractor, scraped_urls, retry_queue, checkpoints):
     batch_num = 0
 
     while urls_left:
@@ -46,23 +160,9 @@ def main():
         logging.info(f"\n📦 Processing batch {batch_num} with {len(batch)} URLs...")
 
         for url in batch:
-            try:
-                logging.info(f"\n🔍 Scraping: {url}")
-                html_content = get_page_html(url)
-
-                if html_content:
-                    extractor.process_and_save(html_content, url)
-                    # ✅ Only mark as scraped if insertion is successful
-                    scraped_urls.add(url)
-                    save_scraped_urls(scraped_urls)
-                else:
-                    logging.warning(f"⚠️ Could not retrieve HTML for {url}. Skipping.")
-                    # failed_url(url) if the internet is off the url's are added to the failed_urls.json
-
-            except Exception as e:
-                logging.error(f"❌ Error while processing {url}: {e}", exc_info=True)
-                print("Adding URL to failed_urls JSON File!")
-                failed_url(url)
+            process_url(url, extractor, scraped_urls, retry_queue, checkpoints)
+            # At most one retry between main-queue URLs so the main queue keeps moving
+            run_due_retries(extractor, scraped_urls, retry_queue, checkpoints, limit=1)
 
         # Wait between batches if there’s still work left
         if urls_left:
@@ -70,6 +170,13 @@ def main():
             logging.info(f"⏳ Batch {batch_num} complete. Sleeping for {wait_time // 60} minutes...")
             time.sleep(wait_time)
 
+    # Main queue is empty: drain the retry lane, waiting for each backoff to expire
+    while len(retry_queue):
+        wait_time = retry_queue.seconds_until_next()
+        logging.info(f"⏳ {len(retry_queue)} URL(s) waiting for retry. Next one in {wait_time:.0f}s...")
+        time.sleep(wait_time)
+        run_due_retries(extractor, scraped_urls, retry_queue, checkpoints)
+
     logging.info("🚀 All batches processed. Scraping complete!")
 
 if __name__ == "__main__":
@@ -1,16 +1,24 @@
-from DrissionPage import ChromiumPage, ChromiumOptions
-from scraper.bypass_core import CloudflareBypasser   # ✅ FIXED
-from selenium import webdriver
-import undetected_chromedriver as uc
+from utilities.metrics import timed
+from utilities.errors import CloudflareBlockedError, raise_for_error_page
 
-def get_page_html(url):
-    page = ChromiumPage()
-    page.get(url)
-    driver=page
-    bypasser = CloudflareBypasser(driver, max_retries=5, log=True)
-    bypasser.bypass()
-      # 2. Dismiss Adblock popup
+@timed("get_page_html")
+def get_page_html(url, isolated=False):
+    # DrissionPage is imported on first use, so importing this module does not load the browser stack
+    from DrissionPage import ChromiumPage, ChromiumOptions
+    from scraper.bypass_core import CloudflareBypasser
 
-    html = page.html
-    page.quit()
-    return html
+    # isolated=True starts a separate browser on a free port, so several threads can fetch at once
+    page = ChromiumPage(ChromiumOptions().auto_port()) if isolated else ChromiumPage()
+    try:
+        page.get(url)
+        driver=page
+        bypasser = CloudflareBypasser(driver, max_retries=5, log=True)
+        if not bypasser.bypass():
+            raise CloudflareBlockedError(f"Cloudflare challenge not bypassed for {url}")
+        # 2. Dismiss Adblock popup
+
+        html = page.html
+        raise_for_error_page(url, html)
+        return html
+    finally:
+        page.quit()
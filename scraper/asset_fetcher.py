@@ -0,0 +1,322 @@
+"""
+Local copies of the images the catalogue references (perfume bottles, brand logos), so apps stop hotlinking them.
+
+Images are fetched concurrently over one pooled aiohttp session, paced by a token bucket, and stored
+content-addressed in a sharded folder (<root>/blobs/ab/cd/<sha256>.<ext>): a URL is downloaded once, and an
+image served under several URLs is stored once. A small SQLite index maps each URL to its blob and remembers
+its ETag/Last-Modified, so refreshing the cache costs a 304 per unchanged image. Thumbnails are optional and
+made in a process pool (Pillow), off the event loop, for every cached image that lacks them.
+"""
+import os
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import mimetypes
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import aiohttp
+except ImportError:  # optional: only the asset fetcher needs it
+    aiohttp = None
+
+try:
+    from PIL import Image
+except ImportError:  # optional: only thumbnails need it
+    Image = None
+
+from scraper.async_orchestrator import AsyncRateLimiter, HTTP_HEADERS
+from utilities.metrics import metrics, increment
+
+ASSET_DIR = "data/assets"
+CONCURRENCY = 8  # downloads in flight (also the connection pool size)
+PER_HOST = 4  # connections to any one host
+RATE_PER_SECOND = 5.0  # new requests per second
+RATE_BURST = 10
+HTTP_TIMEOUT = 30  # seconds
+MAX_BYTES = 10 * 1024 * 1024  # larger responses are refused
+REVALIDATE_AFTER = 7  # days before a cached image is checked again
+THUMBNAIL_WORKERS = 2
+ASSET_HEADERS = {
+    **HTTP_HEADERS,
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+    "Referer": "https://www.fragrantica.com/",
+}
+
+INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS assets (
+        url TEXT PRIMARY KEY,
+        content_hash TEXT,
+        extension TEXT,
+        content_type TEXT,
+        size INTEGER,
+        etag TEXT,
+        last_modified TEXT,
+        checked_at TEXT,
+        error TEXT
+    )"""
+
+# Image URLs of the catalogue; scrapes store 'N/A' when a page had none
+IMAGE_URL_QUERIES = [
+    "SELECT DISTINCT image_url FROM Perfumes WHERE image_url LIKE 'http%'",
+    "SELECT DISTINCT brand_image_url FROM Brands WHERE brand_image_url LIKE 'http%'",
+]
+
+
+def collect_image_urls(db_manager):
+    """Every distinct image URL referenced by the catalogue."""
+    urls = {}
+    for query in IMAGE_URL_QUERIES:
+        for rows in db_manager.stream_rows(query):
+            urls.update(dict.fromkeys(row[0].strip() for row in rows))
+    return list(urls)
+
+
+def _extension(content_type, url):
+    extension = mimetypes.guess_extension((content_type or "").split(";")[0].strip()) if content_type else None
+    if not extension:
+        extension = os.path.splitext(urlsplit(url).path)[1].lower() or ".bin"
+    return ".jpg" if extension in (".jpe", ".jpeg") else extension
+
+
+def make_thumbnail(source, target, size):
+    """Writes a JPEG no larger than size x size. Runs in a worker process."""
+    with Image.open(source) as image:
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.tmp"
+        image.save(tmp_path, "JPEG", quality=85, optimize=True)
+        os.replace(tmp_path, target)
+    return target
+
+
+class AssetCache:
+    """The on-disk store: content-addressed blobs and thumbnails, plus the URL index."""
+
+    def __init__(self, root=ASSET_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, "index.db"))
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(INDEX_SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _sharded(self, folder, content_hash, extension):
+        return os.path.join(self.root, folder, content_hash[:2], content_hash[2:4], f"{content_hash}{extension}")
+
+    def blob_path(self, content_hash, extension):
+        return self._sharded("blobs", content_hash, extension)
+
+    def thumbnail_path(self, content_hash, size):
+        return self._sharded(os.path.join("thumbs", str(size)), content_hash, ".jpg")
+
+    def entry(self, url):
+        """The index row of url as a dict, or None if it was never fetched."""
+        cursor = self.conn.execute("SELECT * FROM assets WHERE url = ?", (url,))
+        row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    def path_for(self, url, thumbnail=None):
+        """Local file of url (or of its thumbnail of that size), or None if it is not cached."""
+        entry = self.entry(url)
+        if entry is None or entry["content_hash"] is None:
+            return None
+        if thumbnail:
+            path = self.thumbnail_path(entry["content_hash"], thumbnail)
+        else:
+            path = self.blob_path(entry["content_hash"], entry["extension"])
+        return path if os.path.exists(path) else None
+
+    def store_blob(self, body, content_type, url):
+        """Writes body unless an identical image is stored already. Returns (content_hash, extension, written)."""
+        content_hash = hashlib.sha256(body).hexdigest()
+        extension = _extension(content_type, url)
+        path = self.blob_path(content_hash, extension)
+        if os.path.exists(path):
+            return content_hash, extension, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        return content_hash, extension, True
+
+    def record(self, url, **columns):
+        """Inserts or updates the index row of url; checked_at is always set to now (UTC)."""
+        columns["checked_at"] = datetime.utcnow().isoformat(sep=" ", timespec="seconds")
+        names = ", ".join(columns)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in columns)
+        self.conn.execute(f"INSERT INTO assets (url, {names}) VALUES (?, {', '.join('?' for _ in columns)}) "
+                          f"ON CONFLICT (url) DO UPDATE SET {updates}", [url, *columns.values()])
+        self.conn.commit()
+
+    def stats(self):
+        cached, failed = self.conn.execute(
+            "SELECT COUNT(content_hash), COUNT(error) FROM assets").fetchone()
+        blobs, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM "
+            "(SELECT content_hash, MAX(size) AS size FROM assets WHERE content_hash IS NOT NULL GROUP BY content_hash)"
+        ).fetchone()
+        return {"urls_cached": cached, "urls_failed": failed, "distinct_images": blobs, "bytes": size}
+
+
+class AssetFetcher:
+    """
+    Brings the cache up to date for a list of image URLs. New URLs are downloaded; cached ones are revalidated
+    with If-None-Match/If-Modified-Since once they are older than revalidate_after days, and skipped before that.
+    Failures are recorded in the index and counted, never raised: one dead image must not stop the run.
+    """
+
+    def __init__(self, cache, concurrency=CONCURRENCY, per_host=PER_HOST, rate_per_second=RATE_PER_SECOND,
+                 burst=RATE_BURST, revalidate_after=REVALIDATE_AFTER, thumbnail_sizes=(),
+                 thumbnail_workers=THUMBNAIL_WORKERS):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required to fetch assets: pip install aiohttp")
+        if thumbnail_sizes and Image is None:
+            raise RuntimeError("Pillow is required for thumbnails: pip install Pillow")
+        self.cache = cache
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.revalidate_after = revalidate_after
+        self.thumbnail_sizes = list(thumbnail_sizes)
+        self.thumbnail_workers = thumbnail_workers
+        self._session = None
+        self._limiter = None
+
+    def due(self, urls):
+        """URLs (deduplicated) that were never fetched, failed last time, or are due for revalidation."""
+        check_before = (datetime.utcnow() - timedelta(days=self.revalidate_after)).isoformat(sep=" ",
+                                                                                              timespec="seconds")
+        due = []
+        for url in dict.fromkeys(urls):
+            entry = self.cache.entry(url)
+            if entry is None or entry["content_hash"] is None or entry["checked_at"] <= check_before:
+                due.append(url)
+        increment("assets.skipped_fresh", len(set(urls)) - len(due))
+        return due
+
+    def run(self, urls):
+        return asyncio.run(self.fetch_all(urls))
+
+    async def fetch_all(self, urls):
+        """
+        Fetches the due URLs, then makes the missing thumbnails of every cached one.
+        Returns {outcome: count} (downloaded, deduped, not_modified, failed).
+        """
+        due = self.due(urls)
+        logging.info(f"🖼️ {len(due)} of {len(set(urls))} image URLs to fetch or revalidate.")
+        outcomes = {}
+        if due:
+            await self._fetch_due(due, outcomes)
+        if self.thumbnail_sizes:
+            await self.make_thumbnails(urls)
+        logging.info(f"🖼️ Asset fetch finished: {outcomes}")
+        return outcomes
+
+    async def _fetch_due(self, due, outcomes):
+        self._limiter = AsyncRateLimiter(self.rate_per_second, self.burst)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        self._session = aiohttp.ClientSession(headers=ASSET_HEADERS, connector=connector,
+                                              timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT))
+        try:
+            queue = asyncio.Queue()
+            for url in due:
+                queue.put_nowait(url)
+            workers = [asyncio.create_task(self._worker(queue, outcomes)) for _ in range(self.concurrency)]
+            await queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            await self._session.close()
+
+    async def make_thumbnails(self, urls):
+        """
+        Makes every missing thumbnail of the cached URLs in a process pool, whether they were just downloaded,
+        deduped, revalidated or skipped as fresh, so adding a size to an existing cache fills it in.
+        Returns the number made.
+        """
+        jobs = {}  # target -> (source, size); URLs sharing an image share its thumbnails
+        for url in dict.fromkeys(urls):
+            entry = self.cache.entry(url)
+            if entry is None or entry["content_hash"] is None:
+                continue
+            source = self.cache.blob_path(entry["content_hash"], entry["extension"])
+            for size in self.thumbnail_sizes:
+                target = self.cache.thumbnail_path(entry["content_hash"], size)
+                if target not in jobs and not os.path.exists(target) and os.path.exists(source):
+                    jobs[target] = (source, size)
+        if not jobs:
+            return 0
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=self.thumbnail_workers) as pool:
+            results = await asyncio.gather(*(loop.run_in_executor(pool, make_thumbnail, source, target, size)
+                                             for target, (source, size) in jobs.items()), return_exceptions=True)
+        made = 0
+        for result in results:
+            if isinstance(result, Exception):
+                increment("assets.thumbnail_failures")
+                logging.warning(f"Thumbnail failed: {result}")
+            else:
+                increment("assets.thumbnails")
+                made += 1
+        return made
+
+    async def _worker(self, queue, outcomes):
+        while True:
+            url = await queue.get()
+            try:
+                outcome = await self.fetch(url)
+            except Exception as e:
+                outcome = "failed"
+                logging.warning(f"Could not fetch image {url}: {e}")
+                self.cache.record(url, error=str(e)[:500])
+            finally:
+                queue.task_done()
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            increment(f"assets.{outcome}")
+
+    async def fetch(self, url):
+        entry = self.cache.entry(url)
+        headers = {}
+        if entry is not None and entry["content_hash"] is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        await self._limiter.acquire()
+        with metrics.timer("asset_fetch"):
+            async with self._session.get(url, headers=headers) as response:
+                if response.status == 304 and headers:
+                    self.cache.record(url, error=None)
+                    return "not_modified"
+                if response.status != 200:
+                    raise ValueError(f"HTTP {response.status}")
+                if (response.content_length or 0) > MAX_BYTES:
+                    raise ValueError(f"{response.content_length} bytes is over the {MAX_BYTES} byte limit")
+                # read(n) returns what is buffered, not n bytes: collect chunks until EOF or the limit
+                body = bytearray()
+                async for chunk in response.content.iter_any():
+                    body += chunk
+                    if len(body) > MAX_BYTES:
+                        raise ValueError(f"response is over the {MAX_BYTES} byte limit")
+                body = bytes(body)
+                content_type = response.headers.get("Content-Type")
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+
+        content_hash, extension, written = await asyncio.to_thread(self.cache.store_blob, body, content_type, url)
+        self.cache.record(url, content_hash=content_hash, extension=extension, content_type=content_type,
+                          size=len(body), etag=etag, last_modified=last_modified, error=None)
+        return "downloaded" if written else "deduped"
@@ -0,0 +1,230 @@
+import time
+import asyncio
+import logging
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiohttp
+except ImportError:  # optional: without it every page goes through the browser
+    aiohttp = None
+
+from main import scrape_url
+from scraper.CloudflareBypasser import get_page_html
+from utilities.file_utils import save_scraped_urls
+from utilities.metrics import metrics
+from utilities.log_utils import url_context
+from utilities.errors import classify_error
+
+CONCURRENCY = 8  # URLs in flight at once
+BROWSER_WORKERS = 2  # threads driving Chromium (page fetch fallback + review scrolling)
+RATE_PER_MINUTE = 2.0  # new page fetches per minute, roughly what main.py's batches + sleeps average out to
+RATE_BURST = 3
+HTTP_TIMEOUT = 30  # seconds
+HTTP_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/126.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+CHALLENGE_MARKERS = ("just a moment", "cf-chl", "challenge-platform")
+
+
+async def run_in_executor(executor, func, *args):
+    """Runs func in executor with the caller's context, so log records keep their url/correlation_id."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, func, *args))
+
+
+class AsyncRateLimiter:
+    """Token bucket: `rate` acquisitions per second on average, up to `burst` back to back."""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncDBWriter:
+    """
+    Runs every storage call on one dedicated thread. The event loop never waits on the database,
+    and the backend's connection is only ever used from that thread, one perfume transaction at a time.
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+    async def run(self, func, *args):
+        return await run_in_executor(self._executor, func, *args)
+
+    async def close(self):
+        await self.run(self.db_manager.close)
+        self._executor.shutdown(wait=True)
+
+
+class AsyncOrchestrator:
+    """
+    asyncio version of main.run_batches. Up to `concurrency` URLs are in flight:
+    pages are fetched over plain HTTP when aiohttp is installed and Cloudflare lets the request through,
+    otherwise (and for review scrolling) by Chromium in a small thread pool.
+    New fetches are paced by a token bucket instead of sleeping between batches,
+    and all DB writes are funnelled through a single AsyncDBWriter thread.
+    Each URL goes through main.scrape_url, so checkpoints, the retry lane and scraped_urls.json work as in main.py.
+    """
+
+    def __init__(self, extractor, scraped_urls, retry_queue, checkpoints, concurrency=CONCURRENCY,
+                 browser_workers=BROWSER_WORKERS, rate_per_minute=RATE_PER_MINUTE, burst=RATE_BURST,
+                 use_http=True, browser_fetch=get_page_html):
+        self.extractor = extractor
+        self.scraped_urls = scraped_urls
+        self.retry_queue = retry_queue
+        self.checkpoints = checkpoints
+        self.concurrency = concurrency
+        self.browser_workers = browser_workers
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.use_http = use_http and aiohttp is not None
+        self.browser_fetch = browser_fetch
+        if use_http and aiohttp is None:
+            logging.info("aiohttp is not installed; every page will be fetched with the browser.")
+        self._session = None
+        self._browser_pool = None
+        self._limiter = None
+        self._db_writer = None
+        self._pipeline_pool = None
+        self._loop = None
+
+    async def run(self, urls):
+        self._loop = asyncio.get_running_loop()
+        self._pipeline_pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="pipeline")
+        self._browser_pool = ThreadPoolExecutor(max_workers=self.browser_workers, thread_name_prefix="browser")
+        self._limiter = AsyncRateLimiter(self.rate_per_minute / 60, self.burst)
+        self._db_writer = AsyncDBWriter(self.extractor.db_manager)
+        if self.use_http:
+            self._session = aiohttp.ClientSession(headers=HTTP_HEADERS,
+                                                  timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT))
+        try:
+            queue = asyncio.Queue()
+            for url in urls:
+                queue.put_nowait(url)
+            logging.info(f"🚦 Async crawl of {len(urls)} URLs, {self.concurrency} in flight, "
+                         f"{self.rate_per_minute:g} fetches/min.")
+            workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+            try:
+                await queue.join()
+                # Main queue is empty: drain the retry lane, waiting for each backoff to expire
+                while len(self.retry_queue):
+                    wait_time = self.retry_queue.seconds_until_next()
+                    logging.info(f"⏳ {len(self.retry_queue)} URL(s) waiting for retry. "
+                                 f"Next one in {wait_time:.0f}s...")
+                    await asyncio.sleep(wait_time)
+                    for item in self.retry_queue.pop_due():
+                        queue.put_nowait(item.url)
+                    await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            if self._session is not None:
+                await self._session.close()
+            await self._db_writer.close()
+            self._pipeline_pool.shutdown(wait=True)
+            self._browser_pool.shutdown(wait=True)
+        logging.info("🚀 Async crawl complete!")
+
+    async def _worker(self, queue):
+        while True:
+            url = await queue.get()
+            try:
+                await self.process_url(url)
+                # At most one due retry per finished URL, as in main.run_batches
+                for item in self.retry_queue.pop_due(limit=1):
+                    logging.info(f"🔁 Retry lane: attempt {item.attempt + 1} for {item.url} (last error: {item.kind})")
+                    await self.process_url(item.url)
+            except Exception as e:
+                # e.g. the retry lane failing to write its files; a dead worker would stall queue.join() forever
+                logging.error(f"❌ Worker error after {url}: {e}", exc_info=True)
+            finally:
+                queue.task_done()
+
+    async def process_url(self, url):
+        """Async counterpart of main.process_url: main.scrape_url with hooks into the loop, same retry lane."""
+        with url_context(url):
+            try:
+                logging.info(f"\n🔍 Scraping: {url}")
+                with metrics.timer("process_url"):
+                    # Checkpoint I/O and parsing run on a pipeline thread; fetches, review scrolling and
+                    # DB writes are handed back to the loop, the browser pool and the DB writer thread
+                    await run_in_executor(self._pipeline_pool, scrape_url, url, self.extractor, self.checkpoints,
+                                          self._fetch_blocking, self._scroll_blocking, self._save_blocking)
+
+                # ✅ Only mark as scraped if insertion is successful
+                self.scraped_urls.add(url)
+                await self._db_writer.run(save_scraped_urls, set(self.scraped_urls))
+                await asyncio.to_thread(self.checkpoints.mark_persisted, url)
+                self.retry_queue.record_success(url)
+                metrics.increment("urls_scraped")
+
+            except Exception as e:
+                kind = classify_error(e)
+                logging.error(f"❌ Error while processing {url} ({kind}): {e}", exc_info=True)
+                metrics.increment(f"urls_failed.{kind}")
+                self.retry_queue.record_failure(url, e)
+
+    def _fetch_blocking(self, url):
+        return asyncio.run_coroutine_threadsafe(self.fetch(url), self._loop).result()
+
+    def _scroll_blocking(self, perfume, spool):
+        # Review scrolling drives Chromium, so it runs in the browser pool
+        ctx = contextvars.copy_context()
+        return self._browser_pool.submit(ctx.run, self.extractor.extract_reviews, perfume, spool).result()
+
+    def _save_blocking(self, perfume):
+        return asyncio.run_coroutine_threadsafe(self._db_writer.run(self.extractor.save, perfume),
+                                                self._loop).result()
+
+    async def fetch(self, url):
+        await self._limiter.acquire()
+        if self._session is not None:
+            html_content = await self._fetch_http(url)
+            if html_content:
+                return html_content
+        return await run_in_executor(self._browser_pool, self.browser_fetch, url, self.browser_workers > 1)
+
+    async def _fetch_http(self, url):
+        """Plain GET. Returns None (so the browser takes over) on errors, non-200s and Cloudflare challenges."""
+        with metrics.timer("http_fetch"):
+            try:
+                async with self._session.get(url) as response:
+                    html_content = await response.text()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.debug(f"HTTP fetch failed ({e}); falling back to the browser.")
+                metrics.increment("http_fetch_errors")
+                return None
+
+        head = html_content[:4096].lower()
+        if status != 200 or any(marker in head for marker in CHALLENGE_MARKERS):
+            logging.debug(f"HTTP fetch got status {status} or a challenge page; falling back to the browser.")
+            metrics.increment("http_fetch_fallbacks")
+            return None
+        metrics.increment("http_fetch_hits")
+        return html_content
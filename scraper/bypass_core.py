@@ -1,5 +1,7 @@
 import time
+import logging
 from DrissionPage import ChromiumPage
+from utilities.metrics import timed, increment
 
 class CloudflareBypasser:
     def __init__(self, driver: ChromiumPage, max_retries=-1, log=True):
@@ -54,7 +56,7 @@ class CloudflareBypasser:
 
     def log_message(self, message):
         if self.log:
-            print(message)
+            logging.info(message)
 
     def click_verification_button(self):
         try:
@@ -76,6 +78,7 @@ class CloudflareBypasser:
             self.log_message(f"Error checking page title: {e}")
             return False
 
+    @timed("cloudflare_bypass")
     def bypass(self):
         
         try_count = 0
@@ -87,11 +90,14 @@ class CloudflareBypasser:
 
             self.log_message(f"Attempt {try_count + 1}: Verification page detected. Trying to bypass...")
             self.click_verification_button()
+            increment("cloudflare_bypass_attempts")
 
             try_count += 1
             time.sleep(2)
 
         if self.is_bypassed():
             self.log_message("Bypass successful.")
-        else:
-            self.log_message("Bypass failed.")
+            return True
+        increment("cloudflare_bypass_failures")
+        self.log_message("Bypass failed.")
+        return False
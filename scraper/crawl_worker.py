@@ -0,0 +1,156 @@
+import os
+import time
+import uuid
+import random
+import socket
+import logging
+import threading
+
+from main import scrape_url
+from utilities.file_utils import failed_url
+from utilities.metrics import metrics
+from utilities.log_utils import url_context
+from utilities.profiling import profiler
+from utilities.errors import classify_error, UNKNOWN
+from utilities.retry import RETRY_POLICIES
+
+LEASE_SECONDS = 10 * 60  # a host that stops heartbeating loses its URLs after this long
+LEASE_BATCH = 3  # URLs claimed per lease call; small, so idle hosts can still find work
+POLL_SECONDS = 60  # how often an idle worker with --wait looks for new work
+BATCH_SIZE = 25  # same pacing as main.py: pause after this many URLs
+SLEEP_MIN = 8 * 60
+SLEEP_MAX = 15 * 60
+
+
+def default_owner():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class LeaseHeartbeat(threading.Thread):
+    """Renews the worker's leases every lease_seconds / 3 so long scrapes are not taken over by other hosts."""
+
+    def __init__(self, worker):
+        super().__init__(name="lease-heartbeat", daemon=True)
+        self.worker = worker
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval = self.worker.lease_seconds / 3
+        while not self.stopped.wait(interval):
+            try:
+                self.worker.renew()
+            except Exception as e:
+                # The next beat tries again; the lease only runs out if every renewal in lease_seconds fails.
+                logging.warning(f"💓 Lease renewal failed: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+
+class CrawlWorker:
+    """
+    One scraper host in distributed mode. URLs are leased from the shared CrawlQueue table instead of
+    data/urls.csv + scraped_urls.json, so any number of hosts can work through the same catalogue.
+
+    - A leased URL belongs to this worker until its lease expires; the heartbeat keeps it alive while we work.
+    - Completion is idempotent: a perfume is rewritten in one transaction keyed by its URL, so if a lease
+      was lost and two hosts finish the same URL, the second write just replaces the first.
+    - Failures are retried across hosts with the same RETRY_POLICIES as the in-run retry lane; when a URL runs
+      out of attempts it is parked as 'dead' (see `python distributed_main.py requeue`).
+    """
+
+    def __init__(self, extractor, queue_db, checkpoints, owner=None, lease_seconds=LEASE_SECONDS,
+                 lease_batch=LEASE_BATCH, scrape=scrape_url):
+        self.extractor = extractor
+        # queue_db must be its own backend instance: the heartbeat thread uses it while the extractor's
+        # connection is inside a perfume transaction.
+        self.queue_db = queue_db
+        self.checkpoints = checkpoints
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds
+        self.lease_batch = lease_batch
+        self.scrape = scrape
+        self._held = set()
+        self._queue_lock = threading.Lock()
+
+    def _queue_call(self, method, *args, **kwargs):
+        with self._queue_lock:
+            return method(*args, **kwargs)
+
+    def renew(self):
+        held = list(self._held)
+        if not held:
+            return
+        renewed = set(self._queue_call(self.queue_db.renew_leases, self.owner, held, self.lease_seconds))
+        for url in set(held) - renewed:
+            if url in self._held:
+                logging.warning(f"💓 Lost the lease on {url}; another host may scrape it too.")
+                metrics.increment("leases_lost")
+
+    def run(self, wait=False, poll_seconds=POLL_SECONDS, batch_size=BATCH_SIZE, sleep_range=(SLEEP_MIN, SLEEP_MAX)):
+        """Works until the queue has nothing due (or forever with wait=True). Returns the number of URLs processed."""
+        logging.info(f"🛰️ Worker {self.owner} started (lease {self.lease_seconds}s).")
+        heartbeat = LeaseHeartbeat(self)
+        heartbeat.start()
+        processed = 0
+        try:
+            while True:
+                leased = self._queue_call(self.queue_db.lease_urls, self.owner, self.lease_batch, self.lease_seconds)
+                if not leased:
+                    if not wait:
+                        logging.info(f"Queue has nothing due: {self._queue_call(self.queue_db.queue_counts)}")
+                        break
+                    time.sleep(poll_seconds)
+                    continue
+
+                self._held.update(url for url, _ in leased)
+                metrics.increment("urls_leased", len(leased))
+                for url, attempts in leased:
+                    self.process(url, attempts)
+                    processed += 1
+                    if processed % batch_size == 0:
+                        break
+
+                if processed % batch_size == 0:
+                    # Hand back the URLs we have not started, so other hosts can use the pause
+                    self._release_held()
+                    wait_time = random.randint(*sleep_range)
+                    logging.info(f"⏳ {processed} URLs done. Sleeping for {wait_time // 60} minutes...")
+                    time.sleep(wait_time)
+        finally:
+            heartbeat.stop()
+            self._release_held()
+        logging.info(f"🚀 Worker {self.owner} finished after {processed} URLs.")
+        return processed
+
+    def _release_held(self):
+        for url in list(self._held):
+            self._queue_call(self.queue_db.release_url, url, self.owner, 0, started=False)
+            self._held.discard(url)
+
+    def process(self, url, attempts):
+        with url_context(url):
+            try:
+                logging.info(f"\n🔍 Scraping: {url} (attempt {attempts}, worker {self.owner})")
+                with profiler.profile(url), metrics.timer("process_url"):
+                    self.scrape(url, self.extractor, self.checkpoints)
+                self._queue_call(self.queue_db.complete_url, url)
+                self.checkpoints.mark_persisted(url)
+                metrics.increment("urls_scraped")
+
+            except Exception as e:
+                kind = classify_error(e)
+                logging.error(f"❌ Error while processing {url} ({kind}): {e}", exc_info=True)
+                metrics.increment(f"urls_failed.{kind}")
+                policy = RETRY_POLICIES.get(kind, RETRY_POLICIES[UNKNOWN])
+                dead = attempts >= policy.max_attempts
+                delay = 0 if dead else policy.delay(attempts)
+                if dead:
+                    logging.error(f"☠️ Giving up on {url} after {attempts} attempt(s) ({kind}).")
+                    failed_url(url)
+                else:
+                    logging.warning(f"🔁 Released {url} for retry in {delay:.0f}s "
+                                    f"(attempt {attempts + 1}/{policy.max_attempts}, {kind}).")
+                self._queue_call(self.queue_db.release_url, url, self.owner, delay, kind, str(e), dead=dead)
+            finally:
+                self._held.discard(url)
@@ -0,0 +1,211 @@
+"""
+Finds newly released perfumes without re-walking every brand.
+
+data/brands.json lists each brand's page and its perfume count. A brand page is fetched only when that count
+differs from the one recorded at its last crawl (or the brand was never crawled, or a periodic recheck is due).
+Its perfume links are hashed: an unchanged hash means nothing to diff. Otherwise the links are checked
+against Perfumes.perfume_url and the CrawlQueue, and only the unknown ones are pushed to the queue.
+"""
+import os
+import re
+import csv
+import json
+import time
+import random
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from utilities.metrics import metrics, increment
+from utilities.storage import url_hash
+
+BRANDS_JSON_PATH = "data/brands.json"
+BASE_URL = "https://www.fragrantica.com"
+URL_BATCH = 500  # URLs per IN (...) lookup, well under SQL Server's 2100 parameter limit
+FETCH_DELAY = (5, 15)  # seconds between two brand pages, chosen at random
+
+PERFUME_LINK = re.compile(r'href="(?:https?://www\.fragrantica\.com)?(/perfume/[^"/?#]+/[^"/?#]+-\d+\.html)"')
+
+# Why a brand page is due
+NEVER_CRAWLED = "new"
+COUNT_CHANGED = "count_changed"
+RECHECK = "recheck"
+
+
+def load_brand_listing(path=BRANDS_JSON_PATH):
+    """data/brands.json -> [(country, brand_name, absolute brand_url, perfume_count)]."""
+    with open(path, "r", encoding="utf-8") as f:
+        brands_by_country = json.load(f)
+    return [(country, brand["brand_name"].strip(), f"{BASE_URL}{brand['brand_url']}", brand.get("perfume_count"))
+            for country, brands in brands_by_country.items() for brand in brands]
+
+
+def perfume_links(html):
+    """Absolute perfume URLs linked from a brand page, in page order, without duplicates."""
+    return list(dict.fromkeys(f"{BASE_URL}{path}" for path in PERFUME_LINK.findall(html)))
+
+
+def page_hash(urls):
+    """SHA-256 of the sorted perfume links: layout, ads and vote counts on the page do not change it."""
+    return hashlib.sha256("\n".join(sorted(urls)).encode("utf-8")).digest()
+
+
+def _parse_timestamp(value):
+    """SQL Server returns datetime objects, SQLite 'YYYY-MM-DD HH:MM:SS.SSS' text."""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class BrandState:
+    __slots__ = ("brand_id", "discovered_count", "page_hash", "discovered_at")
+
+    def __init__(self, brand_id, discovered_count, page_hash, discovered_at):
+        self.brand_id = brand_id
+        self.discovered_count = discovered_count
+        self.page_hash = page_hash
+        self.discovered_at = discovered_at
+
+
+class BrandDiscovery:
+    """
+    One discovery pass: run() picks the due brands, fetches their pages one at a time (with a pause between
+    them), and enqueues the perfume URLs that are in neither Perfumes nor the queue yet. A brand whose page
+    could not be fetched keeps its old state, so the next pass tries it again.
+    """
+
+    def __init__(self, db_manager, fetch=None, delay=FETCH_DELAY, sleep=time.sleep, clock=datetime.utcnow):
+        if fetch is None:
+            from scraper.CloudflareBypasser import get_page_html
+            fetch = get_page_html
+        self.db_manager = db_manager
+        self.fetch = fetch
+        self.delay = delay
+        self.sleep = sleep
+        self.clock = clock
+
+    def load_state(self):
+        """{brand_name: BrandState} for the brands in the database."""
+        return {name: BrandState(brand_id, count, bytes(hash_) if hash_ is not None else None,
+                                 _parse_timestamp(discovered_at))
+                for rows in self.db_manager.stream_rows(
+                    "SELECT id, brand_name, discovered_count, page_hash, discovered_at FROM Brands")
+                for brand_id, name, count, hash_, discovered_at in rows}
+
+    def due_brands(self, listing, state, recheck_days=None):
+        """[(reason, country, brand_name, brand_url, perfume_count)] for the brands whose page should be fetched."""
+        recheck_before = self.clock() - timedelta(days=recheck_days) if recheck_days else None
+        due = []
+        for country, name, brand_url, perfume_count in listing:
+            brand = state.get(name)
+            if brand is None or brand.discovered_at is None:
+                reason = NEVER_CRAWLED
+            elif perfume_count != brand.discovered_count:
+                reason = COUNT_CHANGED
+            elif recheck_before is not None and brand.discovered_at < recheck_before:
+                reason = RECHECK
+            else:
+                continue
+            due.append((reason, country, name, brand_url, perfume_count))
+        return due
+
+    def known_urls(self, urls):
+        """
+        The subset of urls already scraped (in Perfumes, looked up through the perfume_url_hash index)
+        or already waiting in the CrawlQueue.
+        """
+        known = set()
+        for start in range(0, len(urls), URL_BATCH):
+            batch = urls[start:start + URL_BATCH]
+            placeholders = ", ".join("?" for _ in batch)
+            for query, params in ((f"SELECT perfume_url FROM Perfumes WHERE perfume_url_hash IN ({placeholders})",
+                                   [url_hash(url) for url in batch]),
+                                  (f"SELECT url FROM CrawlQueue WHERE url IN ({placeholders})", batch)):
+                for rows in self.db_manager.stream_rows(query, params):
+                    known.update(row[0] for row in rows)
+        return known
+
+    def run(self, listing, recheck_days=None, limit=None, csv_path=None):
+        """
+        Crawls the due brand pages of listing (see load_brand_listing), at most `limit` of them, and returns
+        the new perfume URLs. With csv_path they are also appended to that main.py input file.
+        """
+        state = self.load_state()
+        due = self.due_brands(listing, state, recheck_days)
+        increment("discovery.brands_listed", len(listing))
+        for reason in (NEVER_CRAWLED, COUNT_CHANGED, RECHECK):
+            count = sum(1 for brand in due if brand[0] == reason)
+            increment(f"discovery.brands_due.{reason}", count)
+        logging.info(f"🔎 {len(due)} of {len(listing)} brands are due for discovery.")
+        if limit is not None:
+            due = due[:limit]
+
+        new_urls = []
+        for position, (reason, country, name, brand_url, perfume_count) in enumerate(due):
+            if position:
+                self.sleep(random.uniform(*self.delay))
+            try:
+                with metrics.timer("discovery.brand"):
+                    new_urls.extend(self._discover_brand(state.get(name), country, name, brand_url, perfume_count))
+            except Exception as e:
+                increment("discovery.brand_failures")
+                logging.error(f"❌ Discovery failed for brand '{name}' ({brand_url}): {e}", exc_info=True)
+        if new_urls and csv_path:
+            append_urls_to_csv(csv_path, new_urls)
+        logging.info(f"🔎 Discovery finished: {len(new_urls)} new perfume URLs queued.")
+        return new_urls
+
+    def _discover_brand(self, brand, country, name, brand_url, perfume_count):
+        html = self.fetch(brand_url)
+        if not html:
+            raise ValueError("empty page")
+        urls = perfume_links(html)
+        if not urls and perfume_count:
+            raise ValueError("no perfume links found, the page layout may have changed")
+        increment("discovery.urls_found", len(urls))
+        links_hash = page_hash(urls)
+
+        new_urls = []
+        if brand is not None and brand.page_hash == links_hash:
+            increment("discovery.pages_unchanged")
+            logging.info(f"Brand '{name}': {len(urls)} perfumes, links unchanged.")
+        else:
+            known = self.known_urls(urls)
+            new_urls = [url for url in urls if url not in known]
+            if new_urls:
+                self.db_manager.enqueue_urls(new_urls)
+            increment("discovery.urls_new", len(new_urls))
+            logging.info(f"Brand '{name}': {len(urls)} perfumes, {len(new_urls)} new.")
+
+        brand_id = brand.brand_id if brand is not None else self._create_brand(country, name, brand_url, perfume_count)
+        # Recorded last: if anything above fails, the brand stays due and enqueue_urls ignores repeats
+        self.db_manager.record_brand_discovery(brand_id, perfume_count, links_hash)
+        return new_urls
+
+    def _create_brand(self, country, name, brand_url, perfume_count):
+        """A brand listed in brands.json but not imported yet (see import_brands_data.py)."""
+        country_id = self.db_manager.get_or_create_country(country, None)
+        brand_id = self.db_manager.get_or_create_brand(brand_name=name, country_id=country_id, brand_url=brand_url,
+                                                       perfume_count=perfume_count, brand_website_url=None,
+                                                       brand_image_url=None)
+        if brand_id is None:
+            raise ValueError("could not create the brand")
+        return brand_id
+
+
+def append_urls_to_csv(csv_path, urls):
+    """Adds URLs to a main.py input CSV (header row, then one URL per row), skipping the ones already in it."""
+    existing = set()
+    if os.path.exists(csv_path):
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            existing = {row[0].strip() for row in csv.reader(f) if row}
+    new_rows = [[url] for url in urls if url not in existing]
+    if not new_rows:
+        return
+    write_header = not existing
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(["url"])
+        writer.writerows(new_rows)
+    logging.info(f"📄 Appended {len(new_rows)} URLs to {csv_path}.")
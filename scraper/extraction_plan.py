@@ -0,0 +1,361 @@
+"""
+Page extraction rules as data, compiled once into an ExtractionPlan.
+
+A rule names the elements it reads with a CSS selector and says what to take from them: their text or an
+attribute, an optional regex (group 1 is the value) and the type to convert to. The plan compiles every
+selector and regex up front, then evaluates all rules in a single walk over the parse tree. Subtrees
+matching a `prune` selector (e.g. review boxes, which review_parser handles) are not walked at all.
+"""
+import re
+import time
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+
+import soupsieve
+from bs4.element import Tag
+
+from utilities.file_utils import normalize_key
+from utilities.metrics import metrics
+from .models import to_int, to_float
+
+
+def _percent(value):
+    number = to_float(value)
+    return None if number is None else round(number, 2)
+
+
+CONVERTERS = {
+    "str": lambda value: value,
+    "int": to_int,
+    "float": to_float,
+    "percent": _percent,  # float rounded to two decimals
+    "key": normalize_key,  # 'Long lasting' -> 'long_lasting'
+}
+
+
+@dataclass(slots=True, frozen=True)
+class Read:
+    """What to take from a matched element."""
+    source: str = "text"  # "text", "words" (strings joined by spaces), "own_text" (first direct string) or "@attr"
+    pattern: str | None = None  # regex searched in the source; group 1 is the value, no match gives None
+    convert: str = "str"  # key of CONVERTERS
+
+
+@dataclass(slots=True)
+class Field:
+    """The first element matching `select` (every one with many=True). A dict `read` makes one record per element."""
+    name: str
+    select: str
+    read: Read | dict = Read()
+    many: bool = False
+    default: object = None  # output when nothing matched or the value could not be read
+    unless: str | None = None  # skipped when this earlier output has a value (e.g. linear notes vs the pyramid)
+
+
+@dataclass(slots=True)
+class Grouped:
+    """Values of the `select` elements, listed under the last `heading` element before them: {heading: [...]}."""
+    name: str
+    heading: str
+    select: str
+    read: Read = Read()
+    heading_read: Read = Read("words", convert="key")
+
+
+@dataclass(slots=True)
+class Votes:
+    """
+    Label/value pairs: every `value` element is paired with the last `label` element before it.
+    With `headings` ({heading text: section}), a pair belongs to the section of the last `heading` element
+    whose text is listed; with a `vocabulary` ({section: label keys}), to the section that lists its label,
+    or the section of the pair before it. Each section becomes one output, {label key: value}.
+    """
+    name: str
+    label: str
+    value: str
+    read: Read
+    heading: str | None = None
+    headings: dict | None = None
+    vocabulary: dict | None = None
+    label_read: Read = Read("words", convert="key")
+
+
+def _own_text(element):
+    for child in element.children:
+        if not isinstance(child, Tag):
+            return child.strip()
+    return None
+
+
+_SOURCES = {
+    "text": lambda element: element.get_text(strip=True),
+    "words": lambda element: element.get_text(" ", strip=True),
+    "own_text": _own_text,
+}
+
+
+def compile_read(read):
+    """Read -> function(element) returning the converted value or None."""
+    if read.source.startswith("@"):
+        attribute = read.source[1:]
+        source = lambda element: element.get(attribute)
+    else:
+        source = _SOURCES[read.source]
+    pattern = re.compile(read.pattern) if read.pattern else None
+    convert = CONVERTERS[read.convert]
+
+    def value(element):
+        raw = source(element)
+        if raw is not None and pattern is not None:
+            match = pattern.search(raw)
+            raw = match.group(1) if match else None
+        return None if raw is None or raw == "" else convert(raw)
+    return value
+
+
+def _found(value):
+    return value not in (None, "", [], {})
+
+
+class _FieldStep:
+    def __init__(self, rule):
+        self.rule = rule
+        if isinstance(rule.read, dict):
+            readers = {key: compile_read(read) for key, read in rule.read.items()}
+            self.value = lambda element: {key: reader(element) for key, reader in readers.items()}
+        else:
+            self.value = compile_read(rule.read)
+
+    def selectors(self):
+        return [("item", self.rule.select)]
+
+    def defaults(self):
+        if self.rule.many and self.rule.default is None:
+            return {self.rule.name: []}
+        return {self.rule.name: self.rule.default}
+
+    def start(self):
+        return []
+
+    def feed(self, state, role, element):
+        if self.rule.many or not state:
+            state.append(element)
+
+    def finish(self, state):
+        values = [self.value(element) for element in state]
+        if isinstance(self.rule.read, dict):
+            values = [record for record in values if all(_found(value) for value in record.values())]
+        else:
+            values = [value for value in values if _found(value)]
+        if self.rule.many:
+            return {self.rule.name: values}
+        return {self.rule.name: values[0] if values else None}
+
+
+class _GroupedStep:
+    def __init__(self, rule):
+        self.rule = rule
+        self.value = compile_read(rule.read)
+        self.heading_value = compile_read(rule.heading_read)
+
+    def selectors(self):
+        return [("heading", self.rule.heading), ("item", self.rule.select)]
+
+    def defaults(self):
+        return {self.rule.name: {}}
+
+    def start(self):
+        return {"groups": {}, "current": None}
+
+    def feed(self, state, role, element):
+        if role == "heading":
+            state["current"] = self.heading_value(element)
+            state["groups"].setdefault(state["current"], [])
+        elif state["current"] is not None:
+            value = self.value(element)
+            if _found(value):
+                state["groups"][state["current"]].append(value)
+
+    def finish(self, state):
+        return {self.rule.name: state["groups"]}
+
+
+class _VotesStep:
+    def __init__(self, rule):
+        self.rule = rule
+        self.value = compile_read(rule.read)
+        self.label_value = compile_read(rule.label_read)
+        self.sections = list((rule.headings or {}).values()) or list(rule.vocabulary)
+        self.section_of = {label: section for section, labels in (rule.vocabulary or {}).items() for label in labels}
+
+    def selectors(self):
+        selectors = [("label", self.rule.label), ("value", self.rule.value)]
+        if self.rule.heading:
+            selectors.append(("heading", self.rule.heading))
+        return selectors
+
+    def defaults(self):
+        return {section: {} for section in self.sections}
+
+    def start(self):
+        return {"pairs": {section: {} for section in self.sections}, "section": None, "label": None}
+
+    def feed(self, state, role, element):
+        if role == "heading":
+            section = self.rule.headings.get(element.get_text(" ", strip=True))
+            if section is not None:
+                state["section"] = section
+        elif role == "label":
+            state["label"] = self.label_value(element)
+        elif state["label"] is not None:
+            label, state["label"] = state["label"], None
+            if not self.rule.headings:
+                state["section"] = self.section_of.get(label, state["section"])
+            if state["section"] is not None:
+                state["pairs"][state["section"]][label] = self.value(element)
+
+    def finish(self, state):
+        return state["pairs"]
+
+
+_STEPS = {Field: _FieldStep, Grouped: _GroupedStep, Votes: _VotesStep}
+
+
+def _requirements(compound):
+    """Tag name, id, classes and attribute names a simple compound such as 'div.cell[style]' requires."""
+    tag = re.match(r"[a-zA-Z][\w-]*", compound)
+    element_id = re.search(r"#([\w-]+)", compound)
+    return (tag.group(0).lower() if tag else None, element_id.group(1) if element_id else None,
+            frozenset(re.findall(r"\.([\w-]+)", compound)), tuple(re.findall(r"\[([\w-]+)\]", compound)))
+
+
+class _Selector:
+    """
+    One compiled selector (no commas). Before running soupsieve, match() checks what the last compound
+    and its '>' parents require: tag names, ids, classes and attribute names ('div' under 'div' under
+    '.voting-small-chart-size' for '.voting-small-chart-size > div > div'). That turns most elements away
+    for the price of a few dict lookups.
+    """
+
+    __slots__ = ("tag", "chain", "compiled")
+
+    def __init__(self, selector):
+        selector = selector.strip()
+        # Keep attribute names and drop values and pseudo-class arguments, which may contain spaces, '.' or '#'
+        bare = re.sub(r"\([^)]*\)", "()", re.sub(r"\[\s*([\w-]+)[^\]]*\]", r"[\1]", selector))
+        parts = re.split(r"\s*([>+~])\s*|\s+", bare)  # compounds, with the combinator (None: descendant) between
+        compounds, combinators = parts[::2], parts[1::2]
+        self.chain = [_requirements(compounds[-1])]
+        for compound, combinator in zip(reversed(compounds[:-1]), reversed(combinators)):
+            if combinator != ">":
+                break
+            self.chain.append(_requirements(compound))
+        self.tag = self.chain[0][0]
+        # A bare tag name needs nothing beyond the tag dispatch
+        self.compiled = None if re.fullmatch(r"[a-zA-Z][\w-]*", selector) else soupsieve.compile(selector)
+
+    @classmethod
+    def parse(cls, selector_list):
+        return [cls(part) for part in selector_list.split(",")]
+
+    def match(self, element):
+        node = element
+        for tag, element_id, classes, attributes in self.chain:
+            if node is None or (tag is not None and node.name != tag):
+                return False
+            if element_id is not None and node.get("id") != element_id:
+                return False
+            if classes and not classes.issubset(node.get("class") or ()):
+                return False
+            if attributes and not all(attribute in node.attrs for attribute in attributes):
+                return False
+            node = node.parent
+        return self.compiled is None or self.compiled.match(element)
+
+
+class ExtractionPlan:
+    """
+    Rules compiled for one page type. evaluate(soup) returns {output: value}. The walk is timed (metrics stage
+    extract_plan) and every output counted as a hit or a miss (extract_hits.<output> / extract_misses.<output>),
+    so broken rules show up in the run metrics. With DEBUG logging each rule is timed as well (extract.<rule>);
+    otherwise the element tests run without clock calls.
+    Stateless once built, so one plan can serve every thread.
+    """
+
+    def __init__(self, rules, prune=()):
+        self.rules = list(rules)
+        self.steps = [_STEPS[type(rule)](rule) for rule in self.rules]
+        # Dispatch on the tag name, so an element is only tested against selectors that can match it
+        self._by_tag = defaultdict(list)  # tag name (None: any tag) -> [(_Selector, step index, role)]
+        for index, step in enumerate(self.steps):
+            for role, selector_list in step.selectors():
+                for selector in _Selector.parse(selector_list):
+                    self._by_tag[selector.tag].append((selector, index, role))
+        self._prune = defaultdict(list)
+        for selector in (selector for selector_list in prune for selector in _Selector.parse(selector_list)):
+            self._prune[selector.tag].append(selector)
+
+    def _pruned(self, element):
+        for selectors in (self._prune.get(element.name, ()), self._prune.get(None, ())):
+            if any(selector.match(element) for selector in selectors):
+                return True
+        return False
+
+    def evaluate(self, soup):
+        clock = time.perf_counter
+        # Per-rule timing costs two clock calls per element test, so it is only done when debugging
+        verbose = logging.getLogger().isEnabledFor(logging.DEBUG)
+        states = [step.start() for step in self.steps]
+        spent = [0.0] * len(self.steps)
+        failed = {}
+
+        with metrics.timer("extract_plan"):
+            stack = [child for child in reversed(soup.contents) if isinstance(child, Tag)]
+            while stack:
+                element = stack.pop()
+                if self._prune and self._pruned(element):
+                    continue
+                for entries in (self._by_tag.get(element.name, ()), self._by_tag.get(None, ())):
+                    for selector, index, role in entries:
+                        if index in failed:
+                            continue
+                        if verbose:
+                            start = clock()
+                        try:
+                            if selector.match(element):
+                                self.steps[index].feed(states[index], role, element)
+                        except Exception as e:
+                            failed[index] = e
+                        if verbose:
+                            spent[index] += clock() - start
+                stack.extend(child for child in reversed(element.contents) if isinstance(child, Tag))
+
+            data = {}
+            for index, (rule, step) in enumerate(zip(self.rules, self.steps)):
+                if getattr(rule, "unless", None) and _found(data.get(rule.unless)):
+                    continue
+                outputs = {}
+                if index not in failed:
+                    start = clock() if verbose else 0.0
+                    try:
+                        outputs = step.finish(states[index])
+                    except Exception as e:
+                        failed[index] = e
+                    if verbose:
+                        spent[index] += clock() - start
+                if index in failed:
+                    logging.warning(f"No Value found in {rule.name}: {failed[index]}")
+                if verbose:
+                    metrics.observe(f"extract.{rule.name}", spent[index])
+
+                for name, default in step.defaults().items():
+                    value = outputs.get(name)
+                    if _found(value):
+                        metrics.increment(f"extract_hits.{name}")
+                        data[name] = value
+                    else:
+                        metrics.increment(f"extract_misses.{name}")
+                        logging.debug(f"Extraction rule {rule.name} found no {name}.")
+                        data[name] = default
+        return data
@@ -1,30 +1,147 @@
 import logging
-import re
 from bs4 import BeautifulSoup
-from utilities.dbmanager import DBManager
-from utilities.file_utils import normalize_key, failed_url
-from .selenium_scraper import scrape_all_reviews_with_selenium
+from utilities.storage import StorageBackend
+from utilities.metrics import timer
+from utilities.errors import ScrapeError, ParseError, PersistError, FetchTimeoutError
+from utilities.checkpoint import ReviewSpool
+from utilities.change_events import ReviewDelta, perfume_change_events
+from .models import Perfume, PERCENTAGE_LABELS
+from .extraction_plan import ExtractionPlan, Field, Grouped, Votes, Read
+
+NOTE_BOX = 'div[style*="margin: 0.2rem"]'
+
+# What a Fragrantica perfume page holds and where, as data. Compiled once, evaluated in a single tree walk.
+PERFUME_PAGE_RULES = [
+    Field("perfume_name", "#toptop > h1", Read("own_text"), default=""),
+    Field("perfume_for", "#toptop > h1 small", default=""),
+    Field("brand_name", "span.vote-button-name", default="N/A"),  # the first one on the page
+    Field("image_url", 'img[itemprop="image"]', Read("@src"), default="N/A"),
+    Field("review_count", 'meta[itemprop="reviewCount"]', Read("@content", convert="int"), default=0),
+    Field("rating_count", 'span[itemprop="ratingCount"]', Read(convert="int"), default=0),
+    Field("rating_value", 'span[itemprop="ratingValue"]', Read(convert="float"), default=0.0),
+    Field("main_accords", "div.cell.accord-box > div.accord-bar", many=True, read={
+        "name": Read(), "strength": Read("@style", r"width\s*:\s*([\d.]+)", "float")}),
+    # Possession / emotional attachment / wearing season bars: each bar follows its label,
+    # and the label itself says which chart it belongs to
+    Votes("percentages", label="span.vote-button-name, span.vote-button-legend",
+          value=".voting-small-chart-size > div > div", read=Read("@style", r"width:\s*([\d.]+)%", "percent"),
+          vocabulary=PERCENTAGE_LABELS),
+    # Longevity / sillage / gender / price value: a titled block of labels, each followed by a <progress>
+    Votes("stats", label="span.vote-button-name", value="progress", read=Read("@value", convert="int"),
+          heading="span", headings={"LONGEVITY": "longevity", "SILLAGE": "sillage", "GENDER": "gender",
+                                    "PRICE VALUE": "price_value"}),
+    Grouped("perfume_pyramid", heading="#pyramid h4", select=f"#pyramid {NOTE_BOX}"),
+    Field("linear_notes", f"{NOTE_BOX} > div:nth-child(2)", many=True, unless="perfume_pyramid"),
+    Field("perfumer_name", "img.perfumer-avatar ~ a", default="N/A"),
+    Field("perfumer_url", "img.perfumer-avatar ~ a", Read("@href"), default="N/A"),
+    # Searched in the whole page text, as before the plan existed: the sentence is not always in the description
+    Field("launch_year", "body", Read("words", r"was launched (?:in|during the) (\d{4})", "int")),
+    Field("description", 'div[itemprop="description"] p', default="N/A"),
+]
+# Reviews are parsed by review_parser; skipping their boxes keeps the walk small on pages with thousands
+PERFUME_PAGE_PLAN = ExtractionPlan(PERFUME_PAGE_RULES, prune=["div.fragrance-review-box"])
+
+
+def scrape_reviews_with_selenium(url):
+    """Default review scraper. Selenium and undetected_chromedriver are only imported once reviews are scraped."""
+    from .selenium_scraper import iter_review_chunks_with_selenium
+    return iter_review_chunks_with_selenium(url)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class Extractor:
-    def __init__(self, db_manager: DBManager):
+    def __init__(self, db_manager: StorageBackend, review_scraper=scrape_reviews_with_selenium):
         self.db_manager = db_manager
+        # Called with the perfume URL; must return an iterable of review chunks (lists of Review records).
+        self.review_scraper = review_scraper
+        self.save_listeners = []
+
+    def add_save_listener(self, listener):
+        """listener(perfume_id, perfume) is called after each perfume's transaction has committed."""
+        self.save_listeners.append(listener)
 
     def process_and_save(self, html_content: str, url: str):
-        perfume_data = self._extract_all_data(html_content, url)
-        if perfume_data:
-            self._save_to_relational_db(perfume_data)
+        self.save(self.extract(html_content, url))
+
+    def extract(self, html_content: str, url: str, review_spool: ReviewSpool = None) -> Perfume:
+        """Parses the page and scrapes its reviews. Raises ParseError if it is not a perfume page."""
+        perfume = self.extract_page(html_content, url)
+        self.extract_reviews(perfume, review_spool)
+        return perfume
+
+    def extract_page(self, html_content: str, url: str) -> Perfume:
+        """
+        Extracts every page field, then frees the parse tree. Raises ParseError if it is not a perfume page,
+        or only part of one: saving a cut-off page would replace the perfume's stored notes, accords and stats.
+        """
+        if "</html>" not in html_content[-4096:].lower():
+            raise ParseError(f"Page of {url} is cut off (no closing </html>). Skipping database insertion.")
+        with timer("parse_html"):
+            soup = BeautifulSoup(html_content, "html.parser")
+        try:
+            fields = self._extract_page_fields(soup, url)
+        finally:
+            soup.decompose()
+        if not fields.get('perfume_name'):
+            raise ParseError(f"Could not extract perfume data for URL: {url}. Skipping database insertion.")
+        if (fields.get('description') in (None, '', 'N/A') and not fields.get('perfume_pyramid')
+                and not fields.get('linear_notes')):
+            raise ParseError(f"Perfume page of {url} has neither a description nor notes; it did not load "
+                             f"completely. Skipping database insertion.")
+        return Perfume.from_extracted(fields)
+
+    def extract_reviews(self, perfume: Perfume, review_spool: ReviewSpool = None):
+        """
+        Scrapes the reviews of the perfume. With a review_spool, chunks are streamed to disk as they
+        arrive and only the spool path is kept on the record; otherwise they are collected in perfume.reviews.
+        Perfumes whose page counts no reviews are not scraped. Raises FetchTimeoutError (or the scraper's
+        ScrapeError) if the reviews could not all be scraped.
+        """
+        url = perfume.url
+        reviews = []
+        if perfume.review_count == 0:
+            # Nothing to scroll: the page shows no review list at all, which the scraper would take for a failure
+            logging.info("No reviews on the page; skipping the review scrape.")
+            perfume.reviews = reviews
+            return
+        try:
+            with timer("scrape_reviews"):
+                for chunk in self.review_scraper(url):
+                    if review_spool is not None:
+                        review_spool.write([review.to_dict() for review in chunk])
+                    else:
+                        reviews.extend(chunk)
+        except ScrapeError:
+            raise
+        except Exception as e:
+            # Saving the perfume with part of its reviews would replace the complete set already stored:
+            # fail the URL so the retry lane scrapes it again
+            raise FetchTimeoutError(f"Review scraping failed for {url}: {e}") from e
+        finally:
+            if review_spool is not None:
+                review_spool.close()
+
+        if review_spool is not None and review_spool.count:
+            perfume.review_spool = review_spool.path
         else:
-            logging.warning(f"Could not extract any data for URL: {url}. Skipping database insertion.")
+            perfume.reviews = reviews
 
-    def _save_to_relational_db(self, data: dict):
-        logging.info(f"Processing data for '{data.get('perfume_name')}' for the database...")
+    def save(self, perfume: Perfume):
+        """Writes one perfume and all of its child rows in a single transaction."""
+        with timer("save_to_db"), self.db_manager.transaction():
+            perfume_id = self._save_to_relational_db(perfume)
+        for listener in self.save_listeners:
+            try:
+                listener(perfume_id, perfume)
+            except Exception as e:
+                # The perfume is stored already; a derived index falling behind must not fail the URL
+                logging.warning(f"Save listener {listener!r} failed for PerfumeID {perfume_id}: {e}", exc_info=True)
+
+    def _save_to_relational_db(self, perfume: Perfume):
+        logging.info(f"Processing data for '{perfume.name}' for the database...")
 
         # CHANGED
         brand_id = self.db_manager.get_or_create_brand(
-            brand_name=data.get('brand_name'),
+            brand_name=perfume.brand_name,
             country_id=None,
             brand_url=None,
             perfume_count=None,
@@ -34,210 +151,65 @@ class Extractor:
 
         # CHANGED
         perfume_id = self.db_manager.get_or_create_perfume(
-            perfume_name=data.get('perfume_name'),
-            perfume_for=data.get('perfume_for'),
-            image_url=data.get('image_url'),
-            launch_year=data.get('launch_year'),
-            perfumer_name=data.get('perfumer_name'),
-            perfumer_url=data.get('perfumer_url'),
-            perfume_url=data.get('perfume_url'),
-            brand_id=brand_id
+            perfume_name=perfume.name,
+            perfume_for=perfume.perfume_for,
+            image_url=perfume.image_url,
+            launch_year=perfume.launch_year,
+            perfumer_name=perfume.perfumer_name,
+            perfumer_url=perfume.perfumer_url,
+            perfume_url=perfume.url,
+            brand_id=brand_id,
+            description=perfume.description
         )
 
         if not perfume_id:
-            logging.error(f"❌ Failed to get or create perfume ID for '{data.get('perfume_name')}'.")
-            return
+            raise PersistError(f"Failed to get or create perfume ID for '{perfume.name}'.")
+
+        # What the perfume looked like before this save, for the change events written at the end
+        previous_summary = self.db_manager.get_perfume_summary(perfume_id)
+        reviews = ReviewDelta(self.db_manager.get_review_body_hashes(perfume_id))
 
         self.db_manager.clear_perfume_details(perfume_id)
         logging.info(f"Updating all details for PerfumeID: {perfume_id}")
 
-        self.db_manager.insert_perfume_vote(perfume_id, data)
-
-        for category in ["possession", "emotional_attachment", "wearing_season"]:
-            if category in data:
-                self.db_manager.insert_perfume_percentages(perfume_id, category, data[category])
-
-        for category in ["longevity", "sillage", "gender", "price_value"]:
-            if category in data:
-                self.db_manager.insert_perfume_stats(perfume_id, category, data[category])
-
-        if data.get('reviews'):
-            self.db_manager.insert_reviews(perfume_id, data['reviews'])
-
-        for accord_info in data.get('main_accords', []):
-            accord_name = accord_info.get('name')
-            accord_strength = accord_info.get('strength')
-            if accord_name:
-                accord_id = self.db_manager.get_or_create_id("Accords", "accord", accord_name.strip())
-                if accord_id:
-                    self.db_manager.link_perfume_accord(perfume_id, accord_id, accord_strength)
-
-        for level_key, notes_list in data.get('perfume_pyramid', {}).items():
-            level = level_key.replace('_notes', '')
-            for note_name in notes_list:
-                note_id = self.db_manager.get_or_create_id("Notes", "note", note_name.strip())
-                if note_id:
-                    # CHANGED
-                    self.db_manager.link_perfume_note(perfume_id, note_id, note_level=level)
-
-        for note_name in data.get('linear_notes', []):
-            note_id = self.db_manager.get_or_create_id("Notes", "note", note_name.strip())
+        vote_row = perfume.vote_row(perfume_id)
+        if vote_row:
+            self.db_manager.insert_perfume_vote(perfume_id, vote_row)
+        else:
+            logging.error(f"Failed to insert vote data for PerfumeID {perfume_id}: counts could not be parsed.")
+
+        if perfume.percentages:
+            self.db_manager.insert_perfume_percentages(perfume_id, [p.row(perfume_id) for p in perfume.percentages])
+        if perfume.stats:
+            self.db_manager.insert_perfume_stats(perfume_id, [s.row(perfume_id) for s in perfume.stats])
+        # Pivoted copy of the three writes above, kept in step by sharing their transaction
+        summary = perfume.summary_row(perfume_id)
+        self.db_manager.insert_perfume_summary(perfume_id, summary)
+
+        for chunk in perfume.review_chunks():
+            rows = [review.row(perfume_id) for review in chunk]
+            reviews.add(rows)
+            self.db_manager.insert_reviews(perfume_id, rows)
+
+        for accord in perfume.accords:
+            accord_id = self.db_manager.get_or_create_id("Accords", "accord", accord.name)
+            if accord_id:
+                self.db_manager.link_perfume_accord(perfume_id, accord_id, accord.strength)
+
+        for note in perfume.notes:
+            note_id = self.db_manager.get_or_create_id("Notes", "note", note.note)
             if note_id:
                 # CHANGED
-                self.db_manager.link_perfume_note(perfume_id, note_id, note_level='linear')
+                self.db_manager.link_perfume_note(perfume_id, note_id, note_level=note.level)
+
+        # Outbox: committed or rolled back together with the rows they describe
+        self.db_manager.insert_change_events(
+            perfume_change_events(perfume_id, perfume, previous_summary, summary, reviews))
 
         logging.info(f"✅ Finished processing all data for PerfumeID {perfume_id}.")
+        return perfume_id
 
-    def _extract_all_data(self, html_content: str, url: str) -> dict:
-        soup = BeautifulSoup(html_content, "html.parser")
-        # CHANGED
+    def _extract_page_fields(self, soup, url: str) -> dict:
         data = {"perfume_url": url}
-        extractor_methods = [
-            self._extract_title, self._extract_brand, self._extract_image_url,
-            self._extract_reviews_and_ratings, self._extract_main_accords,
-            self._extract_vote_sections, self._extract_notes_pyramid,
-            self._extract_linear_notes_if_no_pyramid,
-            lambda s: self._extract_section_votes(s, 'LONGEVITY', 'longevity'),
-            lambda s: self._extract_section_votes(s, 'SILLAGE', 'sillage'),
-            lambda s: self._extract_section_votes(s, 'GENDER', 'gender'),
-            lambda s: self._extract_section_votes(s, 'PRICE VALUE', 'price_value'),
-            self._extract_perfumer_info, self._parse_launch_year, self._extract_description
-        ]
-        for method in extractor_methods:
-            try:
-                data.update(method(soup))
-            except Exception as e:
-                logging.warning(f"No Value found in {getattr(method, '__name__', 'lambda')}: {e}")
-
-        try:
-            # IMPORTANT: This function must now return reviews with keys:
-            # 'review_content', 'reviewer_name', 'review_date'
-            data.update(scrape_all_reviews_with_selenium(url))
-        except Exception as e:
-            logging.error(f"❌ Selenium review scraping failed for {url}: {e}")
-            print("Adding URL to JSON file!")
-            failed_url(url)
+        data.update(PERFUME_PAGE_PLAN.evaluate(soup))
         return data
-
-    # ---------- Individual Extract Methods Below ----------
-
-    # CHANGED
-    def _extract_title(self, soup):
-        title_tag = soup.select_one('#toptop > h1')
-        return {
-            "perfume_name": title_tag.contents[0].strip() if title_tag and title_tag.contents else "",
-            "perfume_for": title_tag.find('small').get_text(strip=True) if title_tag and title_tag.find('small') else ""
-        }
-
-    def _extract_brand(self, soup):
-        tag = soup.select_one('span.vote-button-name')
-        return {"brand_name": tag.get_text(strip=True) if tag else "N/A"}
-
-    def _extract_image_url(self, soup):
-        img = soup.find('img', itemprop='image')
-        return {"image_url": img.get("src") if img else "N/A"}
-
-    def _extract_description(self, soup):
-        desc = soup.find('div', itemprop='description')
-        return {"description": desc.p.get_text(strip=True) if desc and desc.p else "N/A"}
-
-    def _extract_reviews_and_ratings(self, soup):
-        def safe_get_text(selector):
-            element = soup.select_one(selector)
-            return element.get_text(strip=True).replace(",", "") if element else "0"
-
-        def safe_get_content(selector):
-            element = soup.find('meta', itemprop=selector)
-            return element.get("content").replace(",", "") if element else "0"
-
-        return {
-            "review_count": safe_get_content("reviewCount"),
-            "rating_count": safe_get_text('span[itemprop="ratingCount"]'),
-            "rating_value": safe_get_text('span[itemprop="ratingValue"]')
-        }
-
-    def _extract_main_accords(self, soup):
-        accords = []
-        strengths = []
-        for a in soup.select('div.cell.accord-box > div.accord-bar'):
-            name = a.get_text(strip=True)
-            width = re.search(r'width\s*:\s*([\d\.]+)', a.get("style", ""))
-            if name and width:
-                strength = float(width.group(1))
-                accords.append({"name": name, "strength": strength})
-                strengths.append(strength)
-        return {
-            "main_accords": accords,
-            "strengths": strengths
-        }
-
-    def _extract_vote_sections(self, soup):
-        brands = soup.select('span.vote-button-name')
-        legends = soup.select('span.vote-button-legend')
-        bars = soup.select('.voting-small-chart-size > div > div')
-
-        sections = {
-            "possession": (brands[1:4], bars[:3]),
-            "emotional_attachment": (legends[:5], bars[3:8]),
-            "wearing_season": (legends[5:11], bars[8:])
-        }
-
-        results = {}
-        for section_name, (labels, bars_slice) in sections.items():
-            section_data = {}
-            for label, bar in zip(labels, bars_slice):
-                key = normalize_key(label.get_text())
-                match = re.search(r'width:\s*([\d.]+)%', bar.get("style", ""))
-                value = f"{float(match.group(1)):.2f}%"
-                if match:
-                    value = round(float(match.group(1)), 2)
-                else:
-                    value = None
-                section_data[key] = value
-            results[section_name] = section_data
-        return results
-
-    def _extract_section_votes(self, soup, section_title, key_name):
-        anchor = soup.find('span', string=section_title)
-        container = anchor.find_parent() if anchor else None
-        while container and not container.select('span.vote-button-name'):
-            container = container.find_parent()
-        section_data = {}
-        if container:
-            for label, progress in zip(container.select('span.vote-button-name'), container.find_all('progress')):
-                section_data[normalize_key(label.get_text())] = progress.get('value', '0')
-        return {key_name: section_data}
-
-    def _extract_notes_pyramid(self, soup):
-        pyramid = {}
-        for h4 in soup.select('#pyramid h4'):
-            level = normalize_key(h4.get_text())
-            container = h4.find_next_sibling('div')
-            if container:
-                notes = [n.get_text(strip=True) for n in container.select('div[style*="margin: 0.2rem"]') if
-                         n.get_text(strip=True)]
-                pyramid[level] = notes
-        return {"perfume_pyramid": pyramid}
-
-    def _extract_linear_notes_if_no_pyramid(self, soup):
-        if soup.select('#pyramid h4'):
-            return {}
-        notes = [div.get_text(strip=True) for div in soup.select('div[style*="margin: 0.2rem"] > div:nth-child(2)') if
-                 div.get_text(strip=True)]
-        return {"linear_notes": notes} if notes else {}
-
-    def _extract_perfumer_info(self, soup):
-        avatar = soup.find('img', class_='perfumer-avatar')
-        link = avatar.find_next_sibling('a') if avatar else None
-        return {
-            "perfumer_name": link.get_text(strip=True) if link else "N/A",
-            "perfumer_url": link.get("href") if link else "N/A"
-        }
-
-    def _parse_launch_year(self, soup):
-        text = soup.get_text(separator=" ")
-        match = re.search(r'was launched (?:in|during the) (\d{4})(?:\'?s)?', text)
-        if match:
-            return {"launch_year": match.group(1)}
-        else:
-            return {"launch_year": "N/A"}
\ No newline at end of file
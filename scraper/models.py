@@ -0,0 +1,212 @@
+import logging
+from dataclasses import dataclass, field, asdict
+from config import REVIEW_CHUNK_SIZE
+from utilities.checkpoint import ReviewSpool
+
+# Vote sections stored in PerfumePercentages and PerfumeStats respectively, with the labels Fragrantica shows.
+# Labels outside these lists are still stored in the EAV tables, they just get no PerfumeSummary column.
+PERCENTAGE_LABELS = {
+    "possession": ("i_have_it", "i_had_it", "i_want_it"),
+    "emotional_attachment": ("love", "like", "ok", "dislike", "hate"),
+    "wearing_season": ("winter", "spring", "summer", "fall", "day", "night"),
+}
+STAT_LABELS = {
+    "longevity": ("very_weak", "weak", "moderate", "long_lasting", "eternal"),
+    "sillage": ("intimate", "moderate", "strong", "enormous"),
+    "gender": ("female", "more_female", "unisex", "more_male", "male"),
+    "price_value": ("way_overpriced", "overpriced", "ok", "good_value", "great_value"),
+}
+PERCENTAGE_CATEGORIES = tuple(PERCENTAGE_LABELS)
+STAT_CATEGORIES = tuple(STAT_LABELS)
+
+# Columns of PerfumeSummary (migration 7): one typed column per known label plus vote totals
+SUMMARY_COLUMNS = (
+    ["perfume_id", "review_count", "rating_count", "rating_value"]
+    + [f"{category}_{label}" for category, labels in STAT_LABELS.items() for label in labels]
+    + [f"{category}_votes" for category in STAT_LABELS]
+    + [f"{category}_{label}" for category, labels in PERCENTAGE_LABELS.items() for label in labels]
+)
+
+
+def to_int(value):
+    """'1,234' -> 1234; None for 'N/A', '' and anything else that is not a whole number."""
+    try:
+        return int(str(value).replace(",", "").strip())
+    except (ValueError, TypeError):
+        return None
+
+
+def to_float(value):
+    """'45.5%' -> 45.5; None for 'N/A', '' and anything else that is not a number."""
+    try:
+        return float(str(value).replace(",", "").strip().rstrip("%"))
+    except (ValueError, TypeError):
+        return None
+
+
+@dataclass(slots=True)
+class Review:
+    content: str
+    reviewer_name: str | None = None
+    review_date: str | None = None
+
+    def row(self, perfume_id):
+        """Row for insert_reviews (perfume_id, review_content, reviewer_name, review_date); the text goes to ReviewBodies."""
+        return perfume_id, self.content, self.reviewer_name, self.review_date
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+@dataclass(slots=True)
+class Percentage:
+    category: str
+    label: str
+    value: float
+
+    def row(self, perfume_id):
+        """Column order of PerfumePercentages (perfume_id, category, label, percentage_value)."""
+        return perfume_id, self.category, self.label, self.value
+
+    @classmethod
+    def parse(cls, category, label, raw):
+        value = to_float(raw)
+        if value is None:
+            logging.warning(f"Could not parse percentage '{raw}' for {category} - {label}. Skipping.")
+            return None
+        return cls(category, label, value)
+
+
+@dataclass(slots=True)
+class VoteStat:
+    category: str
+    label: str
+    votes: int
+
+    def row(self, perfume_id):
+        """Column order of PerfumeStats (perfume_id, category, label, vote_count)."""
+        return perfume_id, self.category, self.label, self.votes
+
+    @classmethod
+    def parse(cls, category, label, raw):
+        votes = to_int(raw)
+        if votes is None:
+            logging.warning(f"Could not parse vote count '{raw}' for {category} - {label}. Skipping.")
+            return None
+        return cls(category, label, votes)
+
+
+@dataclass(slots=True)
+class NoteLink:
+    note: str
+    level: str  # 'top', 'middle', 'base' or 'linear'
+
+
+@dataclass(slots=True)
+class Accord:
+    name: str
+    strength: float | None = None
+
+
+@dataclass(slots=True)
+class Perfume:
+    """
+    One perfume page, built once by Extractor with every number already converted.
+    Storage backends take column-ready tuples from it (see the row() methods) instead of re-parsing strings.
+    """
+    url: str
+    name: str
+    perfume_for: str | None = None
+    brand_name: str | None = None
+    image_url: str | None = None
+    description: str | None = None
+    perfumer_name: str | None = None
+    perfumer_url: str | None = None
+    launch_year: int | None = None
+    review_count: int | None = 0
+    rating_count: int | None = 0
+    rating_value: float | None = 0.0
+    accords: list[Accord] = field(default_factory=list)
+    percentages: list[Percentage] = field(default_factory=list)
+    stats: list[VoteStat] = field(default_factory=list)
+    notes: list[NoteLink] = field(default_factory=list)
+    reviews: list[Review] = field(default_factory=list)
+    review_spool: str | None = None  # set instead of `reviews` when they were streamed to disk
+
+    def summary_row(self, perfume_id):
+        """{column: value} for PerfumeSummary (SUMMARY_COLUMNS); labels the page did not show are None."""
+        votes = {(stat.category, stat.label): stat.votes for stat in self.stats}
+        totals = {}
+        for stat in self.stats:
+            totals[stat.category] = totals.get(stat.category, 0) + stat.votes
+        percentages = {(p.category, p.label): p.value for p in self.percentages}
+        values = ([perfume_id, self.review_count, self.rating_count, self.rating_value]
+                  + [votes.get((category, label)) for category, labels in STAT_LABELS.items() for label in labels]
+                  + [totals.get(category) for category in STAT_LABELS]
+                  + [percentages.get((category, label)) for category, labels in PERCENTAGE_LABELS.items()
+                     for label in labels])
+        return dict(zip(SUMMARY_COLUMNS, values))
+
+    def vote_row(self, perfume_id):
+        """Column order of PerfumeVotes, or None if one of the counts could not be parsed."""
+        if None in (self.review_count, self.rating_count, self.rating_value):
+            return None
+        return perfume_id, self.review_count, self.rating_count, self.rating_value
+
+    @classmethod
+    def from_extracted(cls, data):
+        """Builds the record from the dict merged together by Extractor's field methods."""
+        percentages = [Percentage.parse(category, label, raw)
+                       for category in PERCENTAGE_CATEGORIES for label, raw in data.get(category, {}).items()]
+        stats = [VoteStat.parse(category, label, raw)
+                 for category in STAT_CATEGORIES for label, raw in data.get(category, {}).items()]
+
+        notes = [NoteLink(name.strip(), level_key.replace('_notes', ''))
+                 for level_key, names in data.get('perfume_pyramid', {}).items() for name in names]
+        notes += [NoteLink(name.strip(), 'linear') for name in data.get('linear_notes', [])]
+
+        return cls(
+            url=data['perfume_url'],
+            name=data.get('perfume_name'),
+            perfume_for=data.get('perfume_for'),
+            brand_name=data.get('brand_name'),
+            image_url=data.get('image_url'),
+            description=None if data.get('description') in (None, '', 'N/A') else data['description'],
+            perfumer_name=data.get('perfumer_name'),
+            perfumer_url=data.get('perfumer_url'),
+            launch_year=to_int(data.get('launch_year')),
+            review_count=to_int(data.get('review_count', 0)),
+            rating_count=to_int(data.get('rating_count', 0)),
+            rating_value=to_float(data.get('rating_value', 0.0)),
+            accords=[Accord(accord['name'].strip(), accord.get('strength'))
+                     for accord in data.get('main_accords', []) if accord.get('name')],
+            percentages=[p for p in percentages if p is not None],
+            stats=[s for s in stats if s is not None],
+            notes=notes,
+        )
+
+    def review_chunks(self):
+        """Reviews in insert-sized chunks, read back from the spool when they were streamed to disk."""
+        if self.review_spool:
+            for chunk in ReviewSpool(self.review_spool):
+                yield [Review.from_dict(review) for review in chunk]
+        for start in range(0, len(self.reviews), REVIEW_CHUNK_SIZE):
+            yield self.reviews[start:start + REVIEW_CHUNK_SIZE]
+
+    def to_dict(self):
+        """Plain JSON-ready dict, used for the parsed-page checkpoint."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['accords'] = [Accord(**a) for a in data.get('accords', [])]
+        data['percentages'] = [Percentage(**p) for p in data.get('percentages', [])]
+        data['stats'] = [VoteStat(**s) for s in data.get('stats', [])]
+        data['notes'] = [NoteLink(**n) for n in data.get('notes', [])]
+        data['reviews'] = [Review(**r) for r in data.get('reviews', [])]
+        return cls(**data)
@@ -0,0 +1,55 @@
+from bs4 import BeautifulSoup
+from .models import Review
+
+
+def parse_reviews(page):
+    """
+    Extracts reviews from already-loaded page HTML (or a BeautifulSoup tree) using the same
+    strategies as scrape_all_reviews_with_selenium, without talking to a browser.
+    Returns {"reviews": [Review, ...]}.
+    """
+    soup = page if isinstance(page, BeautifulSoup) else BeautifulSoup(page, "html.parser")
+    reviews = []
+    for box in soup.select('div.fragrance-review-box'):
+        review = parse_review_box(box)
+        if review:
+            reviews.append(review)
+    return {"reviews": reviews}
+
+
+def parse_review_box(box):
+    """
+    The Review in one review box, or None for boxes that are not reviews: ads and placeholders have no text,
+    reviewer name or date, and are skipped as the Selenium scraper always did.
+    """
+    # STRATEGY 1: lazy-loaded reviews, STRATEGY 2: initial page load structure with itemprop
+    text_element = box.select_one('div.flex-child-auto p') or box.select_one('div[itemprop="reviewBody"]')
+    review_text = text_element.get_text().strip() if text_element else ""
+    if not review_text:
+        return None
+
+    username = None
+    username_element = box.select_one('b.idLinkify a')
+    if username_element:
+        username = username_element.get_text().strip()
+    else:
+        for span in box.select('b > span'):
+            text = span.get_text().strip()
+            if text:
+                username = text
+                break
+    if not username:
+        return None
+
+    review_date = None
+    date_element = box.select_one('span[itemprop="datePublished"]')
+    if date_element:
+        review_date = date_element.get("content")
+    else:
+        fallback_date_element = box.select_one('span.vote-button-legend')
+        if fallback_date_element:
+            review_date = fallback_date_element.get_text()
+    if review_date is None:
+        return None
+
+    return Review(review_text, username, review_date)
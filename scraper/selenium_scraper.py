@@ -1,14 +1,29 @@
 import time
+import logging
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from utilities.file_utils import failed_url
+from bs4 import BeautifulSoup
+from config import REVIEW_CHUNK_SIZE
+from utilities.errors import FetchTimeoutError
+from utilities.metrics import timer, increment
+from .review_parser import parse_review_box
 
 
-# Due to space limitations, placeholder only
-def scrape_all_reviews_with_selenium(url):
+REVIEW_SLICE_SCRIPT = """
+return Array.prototype.slice.call(document.getElementsByClassName('fragrance-review-box'), arguments[0], arguments[1])
+    .map(function (box) { return box.outerHTML; });
+"""
+
+
+def iter_review_chunks_with_selenium(url, chunk_size=REVIEW_CHUNK_SIZE):
+    """
+    Scrolls every review into the page, then yields them as lists of at most chunk_size Review records.
+    Expects a page with reviews: raises FetchTimeoutError if the review list or its boxes did not load;
+    other errors propagate.
+    """
     # --- 1. Setup undetected Chrome driver ---
     options = uc.ChromeOptions()
     options.add_argument("--disable-blink-features=AutomationControlled")
@@ -35,10 +50,11 @@ def scrape_all_reviews_with_selenium(url):
 
     driver = uc.Chrome(options=options)
     wait = WebDriverWait(driver, 6)
-    scraped_data = []
+    # Per-scroll and per-review messages are only built when DEBUG logging is enabled.
+    verbose = logging.getLogger().isEnabledFor(logging.DEBUG)
     try:
         # --- 2. Navigate to the URL ---
-        print(f"Navigating to: {url}")
+        logging.info(f"Navigating to: {url}")
         driver.get(url)
 
         time.sleep(3)
@@ -46,9 +62,9 @@ def scrape_all_reviews_with_selenium(url):
         # --- 3. Wait for loader to disappear ---
         try:
             wait.until(EC.invisibility_of_element_located((By.ID, "fragranticaloader")))
-            print("Loader disappeared.")
+            logging.debug("Loader disappeared.")
         except TimeoutException:
-            print("Loader did not disappear in time. Proceeding anyway.")
+            logging.info("Loader did not disappear in time. Proceeding anyway.")
 
         # --- 4. Handle cookie consent (if exists) ---
         try:
@@ -56,13 +72,13 @@ def scrape_all_reviews_with_selenium(url):
                 EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'AGREE')]"))
             )
             cookie_button.click()
-            print("Cookie consent clicked.")
+            logging.debug("Cookie consent clicked.")
             time.sleep(1)
         except TimeoutException:
-            print("No cookie consent found.")
+            logging.debug("No cookie consent found.")
 
         # --- 5. Scroll using #popBrands logic ---
-        print("Scrolling using #popBrands logic...")
+        logging.info("Scrolling using #popBrands logic...")
 
         last_height = driver.execute_script("return document.body.scrollHeight")
 
@@ -70,131 +86,88 @@ def scrape_all_reviews_with_selenium(url):
             target_div = driver.find_element(By.XPATH,
                                              "//div[@id='popBrands' and .//span[text()='Most Popular Perfumes']]")
         except NoSuchElementException:
-            print("❌ #popBrands not found. Falling back to normal scroll.")
+            logging.warning("❌ #popBrands not found. Falling back to normal scroll.")
             target_div = None
 
-        while True:
-            if target_div:
-                driver.execute_script("arguments[0].scrollIntoView();", target_div)
-                time.sleep(0.5)
-                driver.execute_script("window.scrollBy(0, -540);")
-                time.sleep(4)  # Give time to load more reviews
-            else:
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
-
-            new_height = driver.execute_script("return document.body.scrollHeight")
-
-            if new_height == last_height:
-                print("No more height change. Stopping.")
-                break
-            else:
-                print("Page grew, continue scrolling...")
-                last_height = new_height
-            try:
-                no_more_data_xpath = "//div[contains(@class, 'infinite-status-prompt') and contains(text(), 'No more data')]"
-                end_element = driver.find_element(By.XPATH, no_more_data_xpath)
-                if end_element.is_displayed():
-                    print("Detected 'No more data' message. Stopping.")
+        with timer("review_scroll"):
+            while True:
+                if target_div:
+                    driver.execute_script("arguments[0].scrollIntoView();", target_div)
+                    time.sleep(0.5)
+                    driver.execute_script("window.scrollBy(0, -540);")
+                    time.sleep(4)  # Give time to load more reviews
+                else:
+                    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                    time.sleep(2)
+
+                new_height = driver.execute_script("return document.body.scrollHeight")
+
+                if new_height == last_height:
+                    logging.debug("No more height change. Stopping.")
                     break
-            except NoSuchElementException:
-                pass
+                else:
+                    if verbose:
+                        logging.debug("Page grew to %s px, continue scrolling...", new_height)
+                    last_height = new_height
+                try:
+                    no_more_data_xpath = "//div[contains(@class, 'infinite-status-prompt') and contains(text(), 'No more data')]"
+                    end_element = driver.find_element(By.XPATH, no_more_data_xpath)
+                    if end_element.is_displayed():
+                        logging.debug("Detected 'No more data' message. Stopping.")
+                        break
+                except NoSuchElementException:
+                    pass
         try:
             review_conatiner = driver.find_element(By.XPATH, "//span[text()='All Reviews By Date']")
             if review_conatiner.is_displayed():
-                print("Scrolling was Successfull ")
+                logging.info("Scrolling was Successfull ")
         except NoSuchElementException:
-            print("Scrolling was Failed Due to Some Pop-Up or Something!")
-            print("Adding URL to JSON file!")
-            failed_url(url)
+            # Only perfumes with reviews are scrolled (Extractor.extract_reviews skips the others),
+            # so a missing review list means a pop-up or an unloaded page
+            raise FetchTimeoutError(f"Scrolling through the reviews of {url} failed (pop-up or page not loaded)")
 
-        print("Finished scrolling. Waiting to let final reviews fully render...")
+        logging.info("Finished scrolling. Waiting to let final reviews fully render...")
 
-        # --- 6. Extract data from all review containers ---
-        review_containers = driver.find_elements(By.CLASS_NAME, 'fragrance-review-box')
-        print(f"Extraction started. Total review containers found: {len(review_containers)}")
+        # --- 6. Extract reviews in chunks ---
+        # Review boxes are read back as HTML slices and parsed with BeautifulSoup: no WebElement is kept for
+        # thousands of reviews, and only one chunk of parsed reviews is in memory at a time.
+        total = driver.execute_script("return document.getElementsByClassName('fragrance-review-box').length")
+        logging.info(f"Extraction started. Total review containers found: {total}")
+        if not total:
+            raise FetchTimeoutError(f"No review boxes loaded on {url}")
 
+        scraped_count = 0
         skipped_reviews = 0
-        for i, review in enumerate(review_containers):
-            review_text = ""  # Reset text for each loop
-            review_date = None  # Reset date for each loop
-            try:
-                # STRATEGY 1: Look for the structure used in lazy-loaded reviews
-                text_element = review.find_element(By.CSS_SELECTOR, 'div.flex-child-auto p')
-                review_text = text_element.text.strip()
-
-            except NoSuchElementException:
-                # If that fails, it might be the initial page load structure
-                try:
-                    # STRATEGY 2: Look for the original structure with itemprop
-                    text_element = review.find_element(By.CSS_SELECTOR, 'div[itemprop="reviewBody"]')
-                    review_text = text_element.text.strip()
-                except NoSuchElementException:
-                    skipped_reviews += 1
-                    continue
-
-            try:
-                username = None  # Default to None
-                try:
-                    # Try to find <b class="idLinkify"><a>Username</a></b>
-                    username_element = review.find_element(By.CSS_SELECTOR, "b.idLinkify a")
-                    username = username_element.text.strip()
-
-                except NoSuchElementException:
-                    try:
-                        # Fallback: extract first <b><span>...</span></b>
-                        b_tags = review.find_elements(By.TAG_NAME, "b")
-                        for b in b_tags:
-                            span = b.find_element(By.TAG_NAME, "span")
-                            text = span.text.strip()
-                            if text:
-                                username = text
-                                break
-                    except NoSuchElementException:
-                        print("No username found in fallback <b><span> structure.")
-                        continue
-                # print("Username:", username)
-            except NoSuchElementException:
-                print("Error while extracting username:")
-
-            # Now, attempt to find the date for the review
-            try:
-                review_date = None
-                try:
-                    # Primary strategy: Look for <span itemprop="datePublished">
-                    date_element = review.find_element(By.CSS_SELECTOR, 'span[itemprop="datePublished"]')
-                    review_date = date_element.get_attribute("content")
-                except NoSuchElementException:
-                    # Fallback strategy: Look for <time datetime="...">
-                    try:
-                        fallback_date_element = review.find_element(By.CSS_SELECTOR, 'span.vote-button-legend')
-                        review_date = fallback_date_element.text  # or .get_attribute("innerText")
-                    except NoSuchElementException:
-                        print("No date found in this review.")
+        for start in range(0, total, chunk_size):
+            with timer("review_extract"):
+                boxes_html = driver.execute_script(REVIEW_SLICE_SCRIPT, start, start + chunk_size)
+                chunk = []
+                for i, box_html in enumerate(boxes_html, start):
+                    review = parse_review_box(BeautifulSoup(box_html, "html.parser"))
+                    if review is None:
+                        skipped_reviews += 1
                         continue
-
-                # print("Review Date:", review_date)
-            except NoSuchElementException:
-                # This is not critical, so we'll just log and continue without a date.
-                print("Date not found for a review. Skipping date extraction.")
-
-            # Add the found text and date to our list if text is not empty
-            if review_text:
-                # CHANGED: Updated dictionary keys to match dbmanager expectations
-                scraped_data.append(
-                    {'review_content': review_text, 'review_date': review_date, 'reviewer_name': username})
-            else:
-                skipped_reviews += 1
-
-        print(f"Extraction complete. Successfully parsed {len(scraped_data)} reviews.")
+                    if verbose:
+                        logging.debug("Review %d username: %s, date: %s", i, review.reviewer_name,
+                                      review.review_date)
+                    chunk.append(review)
+                del boxes_html
+            increment("reviews_scraped", len(chunk))
+            scraped_count += len(chunk)
+            if chunk:
+                yield chunk
+
+        increment("review_containers_skipped", skipped_reviews)
+        logging.info(f"Extraction complete. Successfully parsed {scraped_count} reviews.")
         if skipped_reviews > 0:
-            print(f"Skipped {skipped_reviews} containers that were ads or empty placeholders.")
+            logging.info(f"Skipped {skipped_reviews} containers that were ads or empty placeholders.")
 
-    except Exception as e:
-        print("Error:", e)
-        print("Adding URL to failed_url JSON file!")
-        failed_url(url)
+    except TimeoutException as e:
+        raise FetchTimeoutError(f"Timed out scraping the reviews of {url}: {e}") from e
     finally:
         driver.quit()
 
-    return {"reviews": scraped_data}
\ No newline at end of file
+
+def scrape_all_reviews_with_selenium(url):
+    """Collects every chunk into one list. Prefer iter_review_chunks_with_selenium for perfumes with many reviews."""
+    return {"reviews": [review for chunk in iter_review_chunks_with_selenium(url) for review in chunk]}
\ No newline at end of file
@@ -0,0 +1,202 @@
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from utilities.metrics import metrics
+from utilities.storage import url_hash
+
+CACHE_SIZE = 2048  # perfume documents kept in memory
+CACHE_TTL = 5 * 60  # seconds; bounds staleness for writes made by other processes
+ID_BATCH = 500  # perfume ids per IN (...) list, well under SQL Server's 2100 parameter limit
+
+PERFUMES_QUERY = """
+    SELECT p.perfume_id, p.perfume_url, p.perfume_name, b.brand_name, p.perfume_for, p.launch_year,
+           p.perfumer_name, p.perfumer_url, p.image_url, p.description, v.review_count, v.rating_count, v.rating_value
+    FROM Perfumes p
+    LEFT JOIN Brands b ON b.id = p.brand_id
+    LEFT JOIN PerfumeVotes v ON v.perfume_id = p.perfume_id
+    WHERE p.perfume_id IN ({ids})"""
+NOTES_QUERY = """
+    SELECT pn.perfume_id, pn.note_level, n.note_name
+    FROM PerfumeNotes pn JOIN Notes n ON n.note_id = pn.note_id
+    WHERE pn.perfume_id IN ({ids})"""
+ACCORDS_QUERY = """
+    SELECT pa.perfume_id, a.accord_name, pa.accord_strength
+    FROM PerfumeAccords pa JOIN Accords a ON a.accord_id = pa.accord_id
+    WHERE pa.perfume_id IN ({ids})
+    ORDER BY pa.perfume_id, pa.accord_strength DESC"""
+STATS_QUERY = "SELECT perfume_id, category, label, vote_count FROM PerfumeStats WHERE perfume_id IN ({ids})"
+PERCENTAGES_QUERY = ("SELECT perfume_id, category, label, percentage_value FROM PerfumePercentages "
+                     "WHERE perfume_id IN ({ids})")
+PERFUME_COLUMNS = ("perfume_id", "perfume_url", "perfume_name", "brand_name", "perfume_for", "launch_year",
+                   "perfumer_name", "perfumer_url", "image_url", "description", "review_count", "rating_count",
+                   "rating_value")
+
+
+def _number(value):
+    """DECIMAL columns come back from pyodbc as Decimal, which json cannot serialise."""
+    return None if value is None else float(value)
+
+
+class TTLCache:
+    """LRU cache whose entries also expire ttl seconds after they were stored. Thread-safe."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CatalogueReader:
+    """
+    Read side of the catalogue for internal apps: whole perfume documents by id, URL or brand.
+
+    A document is assembled with one query per table for a whole batch of perfumes (not one per perfume),
+    and kept in an LRU/TTL cache. Hook the reader to the extractor (attach) when both run in one process,
+    so a perfume rewritten by _save_to_relational_db is evicted at once; otherwise the TTL bounds staleness.
+    Returned documents are shared with the cache and must not be modified.
+    """
+
+    def __init__(self, db_manager, cache_size=CACHE_SIZE, ttl=CACHE_TTL, clock=time.monotonic):
+        self.db_manager = db_manager
+        self.documents = TTLCache(cache_size, ttl, clock)  # perfume_id -> document
+        self.url_ids = TTLCache(cache_size, ttl, clock)  # perfume_url -> perfume_id
+        self.brand_ids = TTLCache(256, ttl, clock)  # brand_name -> [perfume_id, ...]
+        self._invalidations = 0
+
+    def attach(self, extractor):
+        extractor.add_save_listener(self.on_save)
+        return self
+
+    def on_save(self, perfume_id, perfume):
+        """Extractor save listener: drops everything the rewritten perfume may be part of."""
+        self._invalidations += 1
+        self.documents.pop(perfume_id)
+        self.url_ids.pop(perfume.url)
+        self.brand_ids.pop(perfume.brand_name)  # a new perfume joins its brand's list
+
+    def get_by_id(self, perfume_id):
+        return self.get_many([perfume_id]).get(perfume_id)
+
+    def get_by_url(self, perfume_url):
+        perfume_id = self.url_ids.get(perfume_url)
+        if perfume_id is None:
+            rows = self._rows("SELECT perfume_id FROM Perfumes WHERE perfume_url_hash = ? AND perfume_url = ?",
+                              [url_hash(perfume_url), perfume_url])
+            if not rows:
+                return None
+            perfume_id = rows[0][0]
+            self.url_ids.put(perfume_url, perfume_id)
+        return self.get_by_id(perfume_id)
+
+    def get_by_brand(self, brand_name):
+        """Every perfume of the brand, by name."""
+        perfume_ids = self.brand_ids.get(brand_name)
+        if perfume_ids is None:
+            perfume_ids = [row[0] for row in self._rows(
+                "SELECT p.perfume_id FROM Perfumes p JOIN Brands b ON b.id = p.brand_id "
+                "WHERE b.brand_name = ? ORDER BY p.perfume_name", [brand_name])]
+            self.brand_ids.put(brand_name, perfume_ids)
+        documents = self.get_many(perfume_ids)
+        return [documents[perfume_id] for perfume_id in perfume_ids if perfume_id in documents]
+
+    def get_many(self, perfume_ids):
+        """{perfume_id: document} for the ids that exist; cache misses are loaded together."""
+        found, missing = {}, []
+        for perfume_id in perfume_ids:
+            document = self.documents.get(perfume_id)
+            if document is None:
+                missing.append(perfume_id)
+            else:
+                found[perfume_id] = document
+        metrics.increment("catalogue.cache_hits", len(found))
+        if missing:
+            metrics.increment("catalogue.cache_misses", len(missing))
+            invalidations = self._invalidations
+            with metrics.timer("catalogue.load"):
+                loaded = {}
+                for start in range(0, len(missing), ID_BATCH):
+                    loaded.update(self._load(missing[start:start + ID_BATCH]))
+            # A save that landed while we were reading may have been evicted before we got here: don't cache
+            if invalidations == self._invalidations:
+                for perfume_id, document in loaded.items():
+                    self.documents.put(perfume_id, document)
+            found.update(loaded)
+        return found
+
+    def _rows(self, query, params):
+        return [row for rows in self.db_manager.stream_rows(query, params) for row in rows]
+
+    def _load(self, perfume_ids):
+        ids = ", ".join("?" for _ in perfume_ids)
+        documents = {}
+        for row in self._rows(PERFUMES_QUERY.format(ids=ids), perfume_ids):
+            document = dict(zip(PERFUME_COLUMNS, row))
+            document["rating_value"] = _number(document["rating_value"])
+            document.update(accords=[], notes={}, stats={}, percentages={})
+            documents[document["perfume_id"]] = document
+        if not documents:
+            return documents
+
+        for perfume_id, level, note in self._rows(NOTES_QUERY.format(ids=ids), perfume_ids):
+            documents[perfume_id]["notes"].setdefault(level, []).append(note)
+        for perfume_id, accord, strength in self._rows(ACCORDS_QUERY.format(ids=ids), perfume_ids):
+            documents[perfume_id]["accords"].append({"name": accord, "strength": _number(strength)})
+        for perfume_id, category, label, votes in self._rows(STATS_QUERY.format(ids=ids), perfume_ids):
+            documents[perfume_id]["stats"].setdefault(category, {})[label] = votes
+        for perfume_id, category, label, value in self._rows(PERCENTAGES_QUERY.format(ids=ids), perfume_ids):
+            documents[perfume_id]["percentages"].setdefault(category, {})[label] = _number(value)
+        return documents
+
+
+if __name__ == "__main__":
+    from utilities.storage import get_db_manager
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("id", "url", "brand"):
+        sys.exit("usage: python -m utilities.catalogue id <perfume_id> | url <perfume_url> | brand <brand name>")
+    db_manager = get_db_manager()
+    try:
+        reader = CatalogueReader(db_manager)
+        if sys.argv[1] == "id":
+            result = reader.get_by_id(int(sys.argv[2]))
+        elif sys.argv[1] == "url":
+            result = reader.get_by_url(sys.argv[2])
+        else:
+            result = reader.get_by_brand(" ".join(sys.argv[2:]))
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    finally:
+        db_manager.close()
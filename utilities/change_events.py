@@ -0,0 +1,149 @@
+import sys
+import json
+from collections import Counter
+from dataclasses import dataclass
+from decimal import Decimal
+
+from utilities.metrics import increment
+from utilities.storage import review_body_hash
+
+# Event types written to the ChangeEvents outbox, in the same transaction as the perfume they describe
+PERFUME_UPSERTED = "perfume_upserted"  # every save: {"url", "name", "brand", "created"}
+REVIEWS_ADDED = "reviews_added"  # reviews not stored before: {"count", "total"}
+STATS_CHANGED = "stats_changed"  # PerfumeSummary columns that changed: {"changed": {column: [old, new]}}
+
+READ_BATCH = 1000  # events per read
+SETTLE_SECONDS = 5  # events younger than this are held back (see ChangeFeed)
+
+
+@dataclass(slots=True)
+class ChangeEvent:
+    event_id: int
+    perfume_id: int
+    event_type: str
+    payload: dict
+    created_at: object
+
+    def to_dict(self):
+        created_at = self.created_at.isoformat() if hasattr(self.created_at, "isoformat") else self.created_at
+        return {"event_id": self.event_id, "perfume_id": self.perfume_id, "event_type": self.event_type,
+                "payload": self.payload, "created_at": created_at}
+
+
+def _comparable(value):
+    """DECIMAL columns come back as Decimal from pyodbc, the scraper has floats: compare both at column precision."""
+    if isinstance(value, (Decimal, float)):
+        return round(float(value), 2)
+    return value
+
+
+class ReviewDelta:
+    """Counts the reviews of a save that the perfume did not have before, by body hash (a multiset)."""
+
+    def __init__(self, previous_hashes):
+        self.previous = Counter(previous_hashes)
+        self.new = 0
+        self.total = 0
+
+    def add(self, rows):
+        """rows: review rows as passed to insert_reviews."""
+        for _, content, _, _ in rows:
+            body_hash = None if content is None else review_body_hash(content)
+            self.total += 1
+            if self.previous[body_hash] > 0:
+                self.previous[body_hash] -= 1
+            else:
+                self.new += 1
+
+
+def perfume_change_events(perfume_id, perfume, previous_summary, summary, reviews):
+    """
+    ChangeEvents rows [(perfume_id, event_type, payload json)] for one save. previous_summary is the perfume's
+    PerfumeSummary row before the save (None: first save, which is reported as created and has no stats diff).
+    """
+    created = previous_summary is None
+    events = [(PERFUME_UPSERTED, {"url": perfume.url, "name": perfume.name, "brand": perfume.brand_name,
+                                  "created": created})]
+    if reviews.new:
+        events.append((REVIEWS_ADDED, {"count": reviews.new, "total": reviews.total}))
+    if not created:
+        changed = {}
+        for column, value in summary.items():
+            old, new = _comparable(previous_summary.get(column)), _comparable(value)
+            if old != new:
+                changed[column] = [old, new]
+        if changed:
+            events.append((STATS_CHANGED, {"changed": changed}))
+    for event_type, _ in events:
+        increment(f"change_events.{event_type}")
+    return [(perfume_id, event_type, json.dumps(payload, ensure_ascii=False)) for event_type, payload in events]
+
+
+class ChangeFeed:
+    """
+    Consumer side of the outbox: the events after this consumer's cursor, oldest first.
+
+        feed = ChangeFeed(db_manager, "search-sync")
+        for events in feed.batches():
+            handle(events)  # the cursor moves past a batch once the loop asks for the next one
+
+    Delivery is at-least-once: a consumer that stops mid-batch sees that batch again. Events younger than
+    settle_seconds are held back, because on SQL Server a transaction that took its event_id first can commit
+    after a later one, and a cursor must never move past an event that is not visible yet.
+    """
+
+    def __init__(self, db_manager, consumer, settle_seconds=SETTLE_SECONDS):
+        self.db_manager = db_manager
+        self.consumer = consumer
+        self.settle_seconds = settle_seconds
+
+    def position(self):
+        """The last event_id this consumer acknowledged (0 before the first)."""
+        return self.db_manager.get_consumer_cursor(self.consumer)
+
+    def read(self, limit=READ_BATCH):
+        """Up to `limit` events after the cursor. Reading does not move the cursor; ack() does."""
+        rows = self.db_manager.read_change_events(self.position(), limit, self.settle_seconds)
+        return [ChangeEvent(event_id, perfume_id, event_type, json.loads(payload), created_at)
+                for event_id, perfume_id, event_type, payload, created_at in rows]
+
+    def ack(self, event_id):
+        """Moves the cursor to event_id: everything up to it is processed. ack(0) replays the whole outbox."""
+        self.db_manager.save_consumer_cursor(self.consumer, event_id)
+
+    def batches(self, limit=READ_BATCH):
+        """Yields batches of events until the consumer has caught up, acknowledging each one after it is handled."""
+        while True:
+            events = self.read(limit)
+            if not events:
+                return
+            yield events
+            self.ack(events[-1].event_id)
+
+
+if __name__ == "__main__":
+    from utilities.log_utils import setup_logging
+    from utilities.storage import get_db_manager
+
+    setup_logging()
+    command = sys.argv[1] if len(sys.argv) >= 2 else None
+    if command not in ("read", "position", "reset", "prune") or (command != "prune" and len(sys.argv) != 3):
+        sys.exit("usage: python -m utilities.change_events read <consumer> | position <consumer> | "
+                 "reset <consumer> | prune")
+    db_manager = get_db_manager()
+    try:
+        db_manager.create_tables()
+        if command == "prune":
+            print(f"Deleted {db_manager.prune_change_events()} events every consumer has processed.")
+        else:
+            feed = ChangeFeed(db_manager, sys.argv[2])
+            if command == "read":
+                # One JSON object per line; the cursor advances, so the next run continues after the last one
+                for events in feed.batches():
+                    for event in events:
+                        print(json.dumps(event.to_dict(), ensure_ascii=False, default=str))
+            elif command == "reset":
+                feed.ack(0)
+            print(f"{feed.consumer} is at event {feed.position()}.", file=sys.stderr)
+    finally:
+        db_manager.close()
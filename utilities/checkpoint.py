@@ -0,0 +1,152 @@
+import os
+import json
+import gzip
+import hashlib
+from datetime import datetime
+
+CHECKPOINT_DIR = "data/checkpoints"
+
+FETCHED = "fetched"
+PARSED = "parsed"
+
+
+class CheckpointStore:
+    """
+    Per-URL stage checkpoints (fetched -> parsed -> persisted) so a restarted run resumes where it stopped.
+
+    Each URL gets <key>.json holding its stage plus the payload of that stage (<key>.html.gz once the fetched
+    page has parsed, so error pages are never checkpointed; <key>.parsed.json.gz after parsing its reviews).
+    Payloads are written before the stage file is atomically replaced, so a crash at any point leaves the URL
+    at its last completed stage.
+    Persisted URLs are recorded in scraped_urls.json, after which their checkpoint files are removed;
+    a crash in between just replays the (idempotent) per-perfume DB transaction from the parsed payload.
+    """
+
+    def __init__(self, folder=CHECKPOINT_DIR):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, url, suffix):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, f"{key}{suffix}")
+
+    def _write_atomic(self, path, data, compress=False):
+        tmp_path = f"{path}.tmp"
+        opener = gzip.open if compress else open
+        with opener(tmp_path, "wt", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _set_stage(self, url, stage):
+        state = {"url": url, "stage": stage, "updated_at": datetime.now().isoformat()}
+        self._write_atomic(self._path(url, ".json"), json.dumps(state))
+
+    def stage(self, url):
+        """Returns the last completed stage for url, or None if nothing was checkpointed."""
+        try:
+            with open(self._path(url, ".json"), "r", encoding="utf-8") as f:
+                return json.load(f).get("stage")
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save_fetched(self, url, html):
+        self._write_atomic(self._path(url, ".html.gz"), html, compress=True)
+        self._set_stage(url, FETCHED)
+
+    def load_html(self, url):
+        try:
+            with gzip.open(self._path(url, ".html.gz"), "rt", encoding="utf-8") as f:
+                return f.read()
+        except (FileNotFoundError, OSError, EOFError):
+            return None
+
+    def save_parsed(self, url, data):
+        self._write_atomic(self._path(url, ".parsed.json.gz"), json.dumps(data, ensure_ascii=False), compress=True)
+        self._set_stage(url, PARSED)
+        self._remove(url, ".html.gz")
+
+    def load_parsed(self, url, factory=None):
+        """
+        Returns the parsed payload of url, passed through factory (e.g. Perfume.from_dict) if given.
+        None if it is missing or unreadable, including payloads the factory rejects (an older checkpoint format),
+        so the caller just re-parses the page.
+        """
+        try:
+            with gzip.open(self._path(url, ".parsed.json.gz"), "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, OSError, EOFError, json.JSONDecodeError):
+            return None
+        if factory is None:
+            return data
+        try:
+            return factory(data)
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return None
+
+    def review_spool(self, url):
+        """Where the reviews of url are streamed while it is being parsed; kept until the URL is persisted."""
+        return ReviewSpool(self._path(url, ".reviews.jsonl.gz"))
+
+    def discard_fetched(self, urls=None):
+        """
+        Drops the fetched page of the given URLs (or of every URL still at the fetched stage), so their next
+        attempt fetches it again instead of replaying it. Parsed checkpoints are kept.
+        """
+        if urls is None:
+            urls = []
+            for name in os.listdir(self.folder):
+                if name.endswith(".json"):  # stage files; payloads end in .gz
+                    try:
+                        with open(os.path.join(self.folder, name), "r", encoding="utf-8") as f:
+                            state = json.load(f)
+                    except (OSError, json.JSONDecodeError):
+                        continue
+                    if state.get("stage") == FETCHED:
+                        urls.append(state["url"])
+        for url in urls:
+            if self.stage(url) == FETCHED:
+                self._remove(url, ".json")
+                self._remove(url, ".html.gz")
+
+    def mark_persisted(self, url):
+        self._remove(url, ".json")
+        self._remove(url, ".html.gz")
+        self._remove(url, ".parsed.json.gz")
+        self._remove(url, ".reviews.jsonl.gz")
+
+    def _remove(self, url, suffix):
+        try:
+            os.remove(self._path(url, suffix))
+        except FileNotFoundError:
+            pass
+
+
+class ReviewSpool:
+    """
+    Reviews written chunk by chunk to a gzipped JSON-lines file (one chunk per line),
+    so the reviews of a huge perfume page never have to be in memory all at once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def write(self, chunk):
+        if self._file is None:
+            # A re-parse after a crash starts the spool over
+            self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        self._file.write(json.dumps(chunk, ensure_ascii=False))
+        self._file.write("\n")
+        self.count += len(chunk)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __iter__(self):
+        """Yields the spooled chunks in order (lists of review dicts)."""
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
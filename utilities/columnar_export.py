@@ -0,0 +1,310 @@
+"""
+Incremental Parquet/Arrow export of the catalogue (see ColumnarExporter and export_main.py).
+
+Which rows are current: a perfume's latest export is the highest export_id of its row in the `perfumes` table,
+and its current child rows (notes, accords, percentages, stats, reviews) are the ones in the child table's
+partition with that same export_id. A child table's latest partition alone is not enough: a perfume
+re-exported after all of its notes were removed has no rows in the new perfume_notes partition, so its older
+notes must not be read. read_current() applies this rule.
+"""
+import os
+import json
+import shutil
+import logging
+from datetime import datetime, date, timedelta
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only the export needs it
+    pa = None
+
+from utilities.metrics import metrics
+from utilities.storage import decompress_review
+
+EXPORT_DIR = "data/export"
+WATERMARK_FILE = "_watermark.json"
+BATCH_SIZE = 5000  # rows fetched from the database and written per row group
+ROWS_PER_FILE = 1_000_000
+WATERMARK_OVERLAP = 5 * 60  # seconds re-read on every incremental run, for perfume transactions that committed late
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+class ExportTable:
+    """One output table: a SELECT over the catalogue (filtered on the perfume's updated_at) and its column types."""
+
+    def __init__(self, name, query, columns):
+        self.name = name
+        self.query = query
+        self.columns = columns  # [(column, kind)], kind is one of the keys of _ARROW_TYPES
+
+    def schema(self):
+        return pa.schema([(column, _ARROW_TYPES[kind]()) for column, kind in self.columns])
+
+
+EXPORT_TABLES = [
+    ExportTable("perfumes", """
+        SELECT p.perfume_id, p.perfume_url, p.perfume_name, b.brand_name, p.perfume_for, p.launch_year,
+               p.perfumer_name, p.perfumer_url, p.image_url, p.description, v.review_count, v.rating_count,
+               v.rating_value, p.updated_at
+        FROM Perfumes p
+        LEFT JOIN Brands b ON b.id = p.brand_id
+        LEFT JOIN PerfumeVotes v ON v.perfume_id = p.perfume_id
+        WHERE {window}
+        ORDER BY p.perfume_id""", [
+        ("perfume_id", "int"), ("perfume_url", "string"), ("perfume_name", "string"), ("brand_name", "dict"),
+        ("perfume_for", "dict"), ("launch_year", "int"), ("perfumer_name", "dict"), ("perfumer_url", "string"),
+        ("image_url", "string"), ("description", "string"), ("review_count", "int"), ("rating_count", "int"),
+        ("rating_value", "float"), ("updated_at", "timestamp"),
+    ]),
+    ExportTable("perfume_notes", """
+        SELECT pn.perfume_id, n.note_name, pn.note_level
+        FROM PerfumeNotes pn
+        JOIN Notes n ON n.note_id = pn.note_id
+        JOIN Perfumes p ON p.perfume_id = pn.perfume_id
+        WHERE {window}
+        ORDER BY pn.perfume_id""", [
+        ("perfume_id", "int"), ("note_name", "dict"), ("note_level", "dict"),
+    ]),
+    ExportTable("perfume_accords", """
+        SELECT pa.perfume_id, a.accord_name, pa.accord_strength
+        FROM PerfumeAccords pa
+        JOIN Accords a ON a.accord_id = pa.accord_id
+        JOIN Perfumes p ON p.perfume_id = pa.perfume_id
+        WHERE {window}
+        ORDER BY pa.perfume_id""", [
+        ("perfume_id", "int"), ("accord_name", "dict"), ("accord_strength", "float"),
+    ]),
+    ExportTable("perfume_percentages", """
+        SELECT pp.perfume_id, pp.category, pp.label, pp.percentage_value
+        FROM PerfumePercentages pp
+        JOIN Perfumes p ON p.perfume_id = pp.perfume_id
+        WHERE {window}
+        ORDER BY pp.perfume_id""", [
+        ("perfume_id", "int"), ("category", "dict"), ("label", "dict"), ("percentage_value", "float"),
+    ]),
+    ExportTable("perfume_stats", """
+        SELECT ps.perfume_id, ps.category, ps.label, ps.vote_count
+        FROM PerfumeStats ps
+        JOIN Perfumes p ON p.perfume_id = ps.perfume_id
+        WHERE {window}
+        ORDER BY ps.perfume_id""", [
+        ("perfume_id", "int"), ("category", "dict"), ("label", "dict"), ("vote_count", "int"),
+    ]),
+    ExportTable("reviews", """
+        SELECT r.perfume_id, r.reviewer_name, r.review_date, b.body
+        FROM Reviews r
+        JOIN Perfumes p ON p.perfume_id = r.perfume_id
+        LEFT JOIN ReviewBodies b ON b.body_hash = r.body_hash
+        WHERE {window}
+        ORDER BY r.perfume_id""", [
+        ("perfume_id", "int"), ("reviewer_name", "string"), ("review_date", "string"),
+        ("review_content", "review_body"),
+    ]),
+]
+
+
+def _parse_timestamp(value):
+    """SQL Server returns datetime objects, SQLite 'YYYY-MM-DD HH:MM:SS.SSS' text."""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def _timestamp_text(value):
+    # Compares correctly against both DATETIME2 parameters and SQLite's text timestamps
+    return value.isoformat(sep=" ", timespec="microseconds")
+
+
+_ARROW_TYPES = {
+    "int": lambda: pa.int64(),
+    "float": lambda: pa.float64(),
+    "string": lambda: pa.string(),
+    "dict": lambda: pa.dictionary(pa.int32(), pa.string()),  # low-cardinality names: notes, accords, brands...
+    "timestamp": lambda: pa.timestamp("ms"),
+    "review_body": lambda: pa.string(),
+}
+
+# Values the drivers return that Arrow will not take as they are
+_CONVERTERS = {
+    "float": lambda value: None if value is None else float(value),  # DECIMAL columns arrive as Decimal
+    "timestamp": _parse_timestamp,
+    "string": lambda value: value.isoformat() if isinstance(value, date) else value,  # DATE review_date
+    "review_body": decompress_review,  # compressed ReviewBodies.body
+}
+
+
+def _record_batch(table, schema, rows):
+    arrays = []
+    for (column, kind), values in zip(table.columns, zip(*rows)):
+        convert = _CONVERTERS.get(kind)
+        if convert is not None:
+            values = [convert(value) for value in values]
+        arrays.append(pa.array(values, type=schema.field(column).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _PartitionWriter:
+    """Writes one table's rows into part-NNNNN files, starting a new file every ROWS_PER_FILE rows."""
+
+    def __init__(self, folder, schema, fmt):
+        self.folder = folder
+        self.schema = schema
+        self.fmt = fmt
+        self.rows = 0
+        self._parts = 0
+        self._file_rows = 0
+        self._writer = None
+
+    def write(self, batch):
+        if self._writer is None or self._file_rows >= ROWS_PER_FILE:
+            self._open_next()
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+        self._file_rows += batch.num_rows
+
+    def _open_next(self):
+        self.close()
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, f"part-{self._parts:05d}{FORMATS[self.fmt]}")
+        if self.fmt == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(path, self.schema)
+        self._parts += 1
+        self._file_rows = 0
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ColumnarExporter:
+    """
+    Copies the catalogue out of the OLTP database into Parquet (or Arrow IPC) files for analytics.
+
+    Every run writes one hive-style partition per table, <out_dir>/<table>/export_id=<time>/part-NNNNN.parquet,
+    holding each perfume changed since the previous run together with all of its child rows.
+    The current catalogue is therefore "for every perfume_id, the child rows from the export_id of its latest
+    perfumes row" (see the module docstring and read_current).
+    Partitions are written under a _tmp_ name (ignored by Arrow/Parquet readers) and renamed once every
+    table is complete, and only then does the watermark advance, so an interrupted run is simply redone.
+    """
+
+    def __init__(self, db_manager, out_dir=EXPORT_DIR, fmt="parquet", batch_size=BATCH_SIZE):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for exports: pip install pyarrow")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}'. Use one of {', '.join(FORMATS)}.")
+        self.db_manager = db_manager
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.batch_size = batch_size
+
+    @property
+    def watermark_path(self):
+        return os.path.join(self.out_dir, WATERMARK_FILE)
+
+    def load_watermark(self):
+        try:
+            with open(self.watermark_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save_watermark(self, state):
+        tmp_path = f"{self.watermark_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.watermark_path)
+
+    def _latest_change(self):
+        for rows in self.db_manager.stream_rows("SELECT MAX(updated_at) FROM Perfumes"):
+            return _parse_timestamp(rows[0][0])
+        return None
+
+    def run(self, full=False):
+        """Exports everything (full=True, or on the first run) or just what changed. Returns the rows per table."""
+        previous = None if full else self.load_watermark()
+        until = self._latest_change()
+        if until is None:
+            logging.info("📦 Nothing to export: the Perfumes table is empty.")
+            return {}
+        if previous and until <= datetime.fromisoformat(previous["updated_at"]):
+            logging.info("📦 No perfume changed since the last export.")
+            return {}
+
+        window, params = "p.updated_at <= ?", [_timestamp_text(until)]
+        if previous:
+            since = datetime.fromisoformat(previous["updated_at"]) - timedelta(seconds=WATERMARK_OVERLAP)
+            window, params = "p.updated_at > ? AND " + window, [_timestamp_text(since)] + params
+            logging.info(f"📦 Incremental export of perfumes changed after {_timestamp_text(since)}.")
+        else:
+            logging.info("📦 Full export of the catalogue.")
+
+        export_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        counts = {}
+        written = []  # (table name, temporary folder), including a table whose export is still running
+        try:
+            for table in EXPORT_TABLES:
+                with metrics.timer(f"export.{table.name}"):
+                    tmp_folder = os.path.join(self.out_dir, table.name, f"_tmp_export_id={export_id}")
+                    written.append((table.name, tmp_folder))
+                    counts[table.name] = self._export_table(table, tmp_folder, window, params)
+                metrics.increment(f"export_rows.{table.name}", counts[table.name])
+                logging.info(f"📦 {table.name}: {counts[table.name]} rows.")
+        except Exception:
+            self._discard(written)
+            raise
+
+        if not counts.get("perfumes"):
+            self._discard(written)
+            logging.info("📦 No perfume changed since the last export.")
+            return counts
+        for name, tmp_folder in written:
+            if os.path.isdir(tmp_folder):
+                os.replace(tmp_folder, os.path.join(self.out_dir, name, f"export_id={export_id}"))
+        self._save_watermark({"updated_at": _timestamp_text(until), "export_id": export_id, "full": not previous,
+                              "format": self.fmt, "rows": counts, "exported_at": datetime.now().isoformat()})
+        logging.info(f"📦 Export {export_id} written to {self.out_dir}.")
+        return counts
+
+    @staticmethod
+    def _discard(written):
+        for _, tmp_folder in written:
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+
+    def _export_table(self, table, folder, window, params):
+        schema = table.schema()
+        writer = _PartitionWriter(folder, schema, self.fmt)
+        try:
+            for rows in self.db_manager.stream_rows(table.query.format(window=window), params, self.batch_size):
+                writer.write(_record_batch(table, schema, rows))
+        finally:
+            writer.close()
+        return writer.rows
+
+
+def read_current(out_dir=EXPORT_DIR, table_name="perfumes", fmt="parquet"):
+    """
+    The current rows of one exported table as a pyarrow Table (with its export_id column): for every perfume,
+    the rows from the export_id of its latest `perfumes` row. A perfume whose last export had no rows in
+    this table has none here, even if an earlier export had some.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required to read exports: pip install pyarrow")
+    import pyarrow.dataset as ds
+
+    def dataset(name):
+        return ds.dataset(os.path.join(out_dir, name), format="parquet" if fmt == "parquet" else "arrow",
+                          partitioning="hive")
+
+    perfumes = dataset("perfumes").to_table(columns=["perfume_id", "export_id"])
+    latest = perfumes.group_by("perfume_id").aggregate([("export_id", "max")]).rename_columns(
+        ["perfume_id", "export_id"])
+    table = next(t for t in EXPORT_TABLES if t.name == table_name)
+    if not os.path.isdir(os.path.join(out_dir, table_name)):  # no export ever had a row in this table
+        return table.schema().empty_table().append_column("export_id", pa.array([], pa.string()))
+    rows = dataset(table_name).to_table().unify_dictionaries()  # each file has its own dictionaries
+    return rows.join(latest, keys=["perfume_id", "export_id"], join_type="inner")
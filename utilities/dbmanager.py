@@ -1,21 +1,28 @@
 import pyodbc
 import logging
+from contextlib import contextmanager
 from config import DB_CONNECTION_STRING
+from utilities.metrics import timed, increment
+from utilities.storage import StorageBackend, url_hash, compress_review, split_review_rows
+from utilities.migrations import apply_migrations
+from utilities.errors import PersistError
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+REVIEW_HASH_BATCH = 500  # hashes per IN (...) lookup, well under SQL Server's 2100 parameter limit
 
 
-class DBManager:
+class DBManager(StorageBackend):
     """Manages all database operations for the perfume scraper with MS SQL Server."""
 
     def __init__(self, connection_string=DB_CONNECTION_STRING):
         self.connection_string = connection_string
         self.conn = None
         self.cursor = None
+        self._in_transaction = False
 
     def _connect(self):
-        """Establishes a connection to the SQL Server database."""
+        """Establishes a connection to the SQL Server database (reused while a transaction is open)."""
+        if self._in_transaction:
+            return
         try:
             self.conn = pyodbc.connect(self.connection_string, autocommit=False)
             self.cursor = self.conn.cursor()
@@ -25,238 +32,214 @@ class DBManager:
 
     def _close(self):
         """Closes the database cursor and connection."""
+        if self._in_transaction:
+            return
         if self.cursor:
             self.cursor.close()
         if self.conn:
             self.conn.close()
 
-    def create_tables(self):
-        """Creates all necessary tables if they don't exist."""
+    def _commit(self):
+        if not self._in_transaction:
+            self.conn.commit()
+
+    def _rollback(self):
+        # Inside transaction() a failed statement must abort the whole perfume, not just this call.
+        if self._in_transaction:
+            raise PersistError("Database statement failed inside a perfume transaction.")
+        self.conn.rollback()
+
+    def _discard_duplicate(self):
+        # A duplicate-key error only terminates the statement, so an open transaction stays usable.
+        if not self._in_transaction:
+            self.conn.rollback()
+
+    @contextmanager
+    def transaction(self):
+        """Runs every call inside the block on one connection and commits them together, or not at all."""
         self._connect()
+        self._in_transaction = True
         try:
-            logging.info("Checking and creating all database tables if they don't exist...")
-
-            # 1. Countries
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.Countries', N'U') IS NULL
-            CREATE TABLE Countries (
-                country_id INT IDENTITY(1,1) PRIMARY KEY, 
-                country_name NVARCHAR(255) UNIQUE NOT NULL,
-                brand_count INT
-            )''')
-
-            # 2. Brands
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.Brands', N'U') IS NULL
-            CREATE TABLE Brands (
-                id INT IDENTITY(1,1) PRIMARY KEY,
-                brand_name NVARCHAR(255) UNIQUE NOT NULL, 
-                country_id INT FOREIGN KEY REFERENCES Countries(country_id), 
-                brand_url NVARCHAR(500),
-                perfume_count INT,
-                brand_website_url NVARCHAR(500), 
-                brand_image_url NVARCHAR(500) 
-            )''')
-
-            # 3. Perfumes
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.Perfumes', N'U') IS NULL
-            CREATE TABLE Perfumes (
-                perfume_id INT IDENTITY(1,1) PRIMARY KEY,
-                perfume_name NVARCHAR(255), 
-                perfume_for NVARCHAR(255), 
-                image_url NVARCHAR(500),
-                launch_year INT,
-                perfumer_name NVARCHAR(255),
-                perfumer_url NVARCHAR(500),
-                perfume_url NVARCHAR(500) UNIQUE NOT NULL, 
-                brand_id INT NULL FOREIGN KEY REFERENCES Brands(id)
-            )''')
-
-            # 4. Notes (No changes here)
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.Notes', N'U') IS NULL
-            CREATE TABLE Notes (
-                note_id INT IDENTITY(1,1) PRIMARY KEY,
-                note_name NVARCHAR(255) UNIQUE NOT NULL
-            )''')
-
-            # 5. Accords (No changes here)
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.Accords', N'U') IS NULL
-            CREATE TABLE Accords (
-                accord_id INT IDENTITY(1,1) PRIMARY KEY,
-                accord_name NVARCHAR(255) UNIQUE NOT NULL
-            )''')
-
-            # 6. PerfumeNotes
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.PerfumeNotes', N'U') IS NULL
-            CREATE TABLE PerfumeNotes (
-                perfume_id INT FOREIGN KEY REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
-                note_id INT FOREIGN KEY REFERENCES Notes(note_id) ON DELETE CASCADE,
-                note_level NVARCHAR(50), 
-                PRIMARY KEY (perfume_id, note_id, note_level) 
-            )''')
-
-            # 7. PerfumeAccords (No changes here)
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.PerfumeAccords', N'U') IS NULL
-            CREATE TABLE PerfumeAccords (
-                perfume_id INT FOREIGN KEY REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
-                accord_id INT FOREIGN KEY REFERENCES Accords(accord_id) ON DELETE CASCADE,
-                accord_strength DECIMAL(5,2) NULL,
-                PRIMARY KEY (perfume_id, accord_id)
-            )''')
-
-            # 8. PerfumeVotes (No changes here)
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.PerfumeVotes', N'U') IS NULL
-            CREATE TABLE PerfumeVotes (
-                vote_id INT IDENTITY(1,1) PRIMARY KEY,
-                perfume_id INT NOT NULL,
-                review_count INT NOT NULL DEFAULT 0,
-                rating_count INT NOT NULL DEFAULT 0,
-                rating_value DECIMAL(3, 2) NOT NULL,
-                FOREIGN KEY (perfume_id) REFERENCES Perfumes(perfume_id) ON DELETE CASCADE
-            )''')
-
-            # 9. PerfumePercentages (No changes here)
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.PerfumePercentages', N'U') IS NULL
-            CREATE TABLE PerfumePercentages (
-                percentage_id INT IDENTITY(1,1) PRIMARY KEY,
-                perfume_id INT NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                label VARCHAR(50) NOT NULL,
-                percentage_value DECIMAL(5, 2) NOT NULL,
-                FOREIGN KEY (perfume_id) REFERENCES Perfumes(perfume_id) ON DELETE CASCADE
-            )''')
-
-            # 10. PerfumeStats (No changes here)
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.PerfumeStats', N'U') IS NULL
-            CREATE TABLE PerfumeStats (
-                stat_id INT IDENTITY(1,1) PRIMARY KEY,
-                perfume_id INT NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                label VARCHAR(50) NOT NULL,
-                vote_count INT NOT NULL DEFAULT 0,
-                FOREIGN KEY (perfume_id) REFERENCES Perfumes(perfume_id) ON DELETE CASCADE
-            )''')
-
-            # 11. Reviews
-            self.cursor.execute('''
-            IF OBJECT_ID(N'dbo.Reviews', N'U') IS NULL
-            CREATE TABLE Reviews (
-                review_id INT IDENTITY(1,1) PRIMARY KEY,
-                perfume_id INT NOT NULL,
-                review_content NVARCHAR(MAX), 
-                reviewer_name NVARCHAR(250), 
-                review_date DATE, 
-                FOREIGN KEY (perfume_id) REFERENCES Perfumes(perfume_id) ON DELETE CASCADE
-            )''')
-
+            yield self
             self.conn.commit()
-            logging.info("All tables checked/created successfully.")
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+            self._close()
 
+    @timed("db.create_tables")
+    def create_tables(self):
+        """
+        Brings the schema up to date by applying any pending migrations (see utilities/migrations.py).
+        Raises PersistError if one fails; the failed migration is rolled back and the earlier ones are kept.
+        """
+        self._connect()
+        try:
+            logging.info("Checking database schema and applying pending migrations...")
+            version = apply_migrations(self.conn, "mssql")
+            logging.info(f"Database schema is at version {version}.")
         except pyodbc.Error as e:
-            logging.error(f"Error creating tables: {e}")
-            self.conn.rollback()
+            # Every later step assumes the full schema: never carry on with a half-migrated database
+            logging.error(f"Schema migration failed: {e}")
+            raise PersistError(f"Schema migration failed: {e}") from e
         finally:
             self._close()
 
+    @timed("db.clear_perfume_details")
     def clear_perfume_details(self, perfume_id):
         self._connect()
         try:
             self.cursor.execute("DELETE FROM PerfumeVotes WHERE perfume_id = ?", perfume_id)
             self.cursor.execute("DELETE FROM PerfumePercentages WHERE perfume_id = ?", perfume_id)
             self.cursor.execute("DELETE FROM PerfumeStats WHERE perfume_id = ?", perfume_id)
+            self.cursor.execute("DELETE FROM PerfumeSummary WHERE perfume_id = ?", perfume_id)
             self.cursor.execute("DELETE FROM Reviews WHERE perfume_id = ?", perfume_id)
-            self.conn.commit()
+            self.cursor.execute("DELETE FROM PerfumeNotes WHERE perfume_id = ?", perfume_id)
+            self.cursor.execute("DELETE FROM PerfumeAccords WHERE perfume_id = ?", perfume_id)
+            self._commit()
         except Exception as e:
             logging.error(f"Error clearing details for PerfumeID {perfume_id}: {e}")
-            self.conn.rollback()
+            self._rollback()
         finally:
             self._close()
 
-    def insert_perfume_vote(self, perfume_id, data):
+    @timed("db.insert_perfume_vote")
+    def insert_perfume_vote(self, perfume_id, row):
         self._connect()
         try:
             self.cursor.execute("""
                                 INSERT INTO PerfumeVotes (perfume_id, review_count, rating_count, rating_value)
                                 VALUES (?, ?, ?, ?)
-                                """, (
-                                    perfume_id,
-                                    int(data.get("review_count", 0)),
-                                    int(data.get("rating_count", 0)),
-                                    float(data.get("rating_value", 0.0))
-                                ))
-            self.conn.commit()
+                                """, row)
+            self._commit()
         except Exception as e:
             logging.error(f"Failed to insert vote data for PerfumeID {perfume_id}: {e}")
-            self.conn.rollback()
+            self._rollback()
         finally:
             self._close()
 
-    def insert_perfume_percentages(self, perfume_id, category, data_dict):
+    @timed("db.insert_perfume_summary")
+    def insert_perfume_summary(self, perfume_id, summary):
         self._connect()
         try:
-            for label, percent_str in data_dict.items():
-                try:
-                    percentage = float(str(percent_str).strip('%'))
-                    self.cursor.execute("""
-                                        INSERT INTO PerfumePercentages (perfume_id, category, label, percentage_value)
-                                        VALUES (?, ?, ?, ?)
-                                        """, (perfume_id, category, label, percentage))
-                except (ValueError, TypeError):
-                    logging.warning(f"Could not parse percentage '{percent_str}' for {category} - {label}. Skipping.")
-            self.conn.commit()
+            self.cursor.execute(f"INSERT INTO PerfumeSummary ({', '.join(summary)}) "
+                                f"VALUES ({', '.join('?' for _ in summary)})", list(summary.values()))
+            self._commit()
         except Exception as e:
-            logging.error(f"Failed to insert percentage data for PerfumeID {perfume_id}, Category {category}: {e}")
-            self.conn.rollback()
+            logging.error(f"Failed to insert summary for PerfumeID {perfume_id}: {e}")
+            self._rollback()
         finally:
             self._close()
 
-    def insert_perfume_stats(self, perfume_id, category, data_dict):
+    @timed("db.get_perfume_summary")
+    def get_perfume_summary(self, perfume_id):
         self._connect()
         try:
-            for label, votes in data_dict.items():
-                try:
-                    self.cursor.execute("""
-                                        INSERT INTO PerfumeStats (perfume_id, category, label, vote_count)
-                                        VALUES (?, ?, ?, ?)
-                                        """, (perfume_id, category, label, int(votes)))
-                except (ValueError, TypeError):
-                    logging.warning(f"Could not parse vote count '{votes}' for {category} - {label}. Skipping.")
-            self.conn.commit()
+            self.cursor.execute("SELECT * FROM PerfumeSummary WHERE perfume_id = ?", perfume_id)
+            row = self.cursor.fetchone()
+            return dict(zip([column[0] for column in self.cursor.description], row)) if row else None
+        finally:
+            self._close()
+
+    @timed("db.insert_perfume_percentages")
+    def insert_perfume_percentages(self, perfume_id, rows):
+        if not rows:
+            return
+        self._connect()
+        try:
+            self.cursor.fast_executemany = True
+            self.cursor.executemany("""
+                                    INSERT INTO PerfumePercentages (perfume_id, category, label, percentage_value)
+                                    VALUES (?, ?, ?, ?)
+                                    """, rows)
+            self._commit()
         except Exception as e:
-            logging.error(f"Failed to insert stats data for PerfumeID {perfume_id}, Category {category}: {e}")
-            self.conn.rollback()
+            logging.error(f"Failed to insert percentage data for PerfumeID {perfume_id}: {e}")
+            self._rollback()
         finally:
             self._close()
 
-    def insert_reviews(self, perfume_id, reviews_list):
+    @timed("db.insert_perfume_stats")
+    def insert_perfume_stats(self, perfume_id, rows):
+        if not rows:
+            return
         self._connect()
         try:
-            for review_data in reviews_list:
-                # CHANGED: expecting new keys from scraper
-                content = review_data.get('review_content')
-                review_date = review_data.get('review_date')
-                reviewer_name = review_data.get('reviewer_name')
-                if content and isinstance(content, str):
-                    # CHANGED: column names
-                    self.cursor.execute(
-                        "INSERT INTO Reviews (perfume_id, review_content, reviewer_name, review_date) VALUES (?, ?, ?, ?)",
-                        (perfume_id, content, reviewer_name, review_date)
-                    )
-            self.conn.commit()
+            self.cursor.fast_executemany = True
+            self.cursor.executemany("""
+                                    INSERT INTO PerfumeStats (perfume_id, category, label, vote_count)
+                                    VALUES (?, ?, ?, ?)
+                                    """, rows)
+            self._commit()
+        except Exception as e:
+            logging.error(f"Failed to insert stats data for PerfumeID {perfume_id}: {e}")
+            self._rollback()
+        finally:
+            self._close()
+
+    @timed("db.insert_reviews")
+    def insert_reviews(self, perfume_id, rows):
+        if not rows:
+            return
+        self._connect()
+        try:
+            bodies, review_rows = split_review_rows(rows)
+            new_hashes = self._new_review_bodies(list(bodies))
+            # One round trip per batch instead of one per review.
+            self.cursor.fast_executemany = True
+            if new_hashes:
+                # UPDLOCK/HOLDLOCK: two hosts saving the same text at once must not both insert it
+                self.cursor.executemany("""
+                                        INSERT INTO ReviewBodies (body_hash, body)
+                                        SELECT ?, ?
+                                        WHERE NOT EXISTS (SELECT 1 FROM ReviewBodies WITH (UPDLOCK, HOLDLOCK)
+                                                          WHERE body_hash = ?)
+                                        """, [(body_hash, compress_review(bodies[body_hash]), body_hash)
+                                              for body_hash in new_hashes])
+            increment("review_bodies.written", len(new_hashes))
+            increment("review_bodies.reused", len(bodies) - len(new_hashes))
+            self.cursor.executemany(
+                "INSERT INTO Reviews (perfume_id, body_hash, reviewer_name, review_date) VALUES (?, ?, ?, ?)",
+                review_rows
+            )
+            self._commit()
         except Exception as e:
             logging.error(f"Failed to insert reviews for PerfumeID {perfume_id}: {e}")
-            self.conn.rollback()
+            self._rollback()
         finally:
             self._close()
 
+    def _new_review_bodies(self, hashes):
+        """The hashes that have no ReviewBodies row yet, so texts already stored are not compressed or sent again."""
+        existing = set()
+        for start in range(0, len(hashes), REVIEW_HASH_BATCH):
+            batch = hashes[start:start + REVIEW_HASH_BATCH]
+            placeholders = ", ".join("?" for _ in batch)
+            self.cursor.execute(f"SELECT body_hash FROM ReviewBodies WHERE body_hash IN ({placeholders})", batch)
+            existing.update(bytes(row[0]) for row in self.cursor.fetchall())
+        return [body_hash for body_hash in hashes if body_hash not in existing]
+
+    @timed("db.prune_review_bodies")
+    def prune_review_bodies(self):
+        self._connect()
+        try:
+            self.cursor.execute("""
+                                DELETE b FROM ReviewBodies b
+                                WHERE NOT EXISTS (SELECT 1 FROM Reviews r WHERE r.body_hash = b.body_hash)
+                                """)
+            deleted = self.cursor.rowcount
+            self._commit()
+            return deleted
+        except Exception as e:
+            logging.error(f"Failed to prune review bodies: {e}")
+            self._rollback()
+            return 0
+        finally:
+            self._close()
+
+    @timed("db.get_or_create_country")
     def get_or_create_country(self, country_name, brand_count):
         self._connect()
         try:
@@ -269,16 +252,17 @@ class DBManager:
             insert_query = "INSERT INTO Countries (country_name, brand_count) OUTPUT INSERTED.country_id VALUES (?, ?)"
             self.cursor.execute(insert_query, country_name, brand_count)
             new_id = self.cursor.fetchone()[0]
-            self.conn.commit()
+            self._commit()
             return new_id
         except Exception as e:
             logging.error(f"Error in get_or_create_country for '{country_name}': {e}")
-            self.conn.rollback()
+            self._rollback()
             return None
         finally:
             self._close()
 
     # CHANGED: method signature and query
+    @timed("db.get_or_create_brand")
     def get_or_create_brand(self, brand_name, country_id, brand_url, perfume_count, brand_website_url, brand_image_url):
         self._connect()
         try:
@@ -295,23 +279,41 @@ class DBManager:
             self.cursor.execute(insert_query, brand_name, country_id, brand_url, perfume_count, brand_website_url,
                                 brand_image_url)
             new_id = self.cursor.fetchone()[0]
-            self.conn.commit()
+            self._commit()
             return new_id
         except Exception as e:
             logging.error(f"Error in get_or_create_brand for '{brand_name}': {e}")
-            self.conn.rollback()
+            self._rollback()
             return None
         finally:
             self._close()
 
+    @timed("db.record_brand_discovery")
+    def record_brand_discovery(self, brand_id, perfume_count, page_hash):
+        self._connect()
+        try:
+            self.cursor.execute("""
+                                UPDATE Brands
+                                SET perfume_count = ?, discovered_count = ?, page_hash = ?,
+                                    discovered_at = SYSUTCDATETIME()
+                                WHERE id = ?
+                                """, (perfume_count, perfume_count, page_hash, brand_id))
+            self._commit()
+        except pyodbc.Error as e:
+            logging.error(f"Failed to record discovery of BrandID {brand_id}: {e}")
+            self._rollback()
+        finally:
+            self._close()
+
     # CHANGED: method signature and queries
+    @timed("db.get_or_create_perfume")
     def get_or_create_perfume(self, perfume_name, perfume_for, image_url, launch_year, perfumer_name, perfumer_url,
-                              perfume_url, brand_id):
+                              perfume_url, brand_id, description=None):
         self._connect()
         try:
-            self.cursor.execute("SELECT perfume_id FROM Perfumes WHERE perfume_url = ?", perfume_url)
+            self.cursor.execute("SELECT perfume_id FROM Perfumes WHERE perfume_url_hash = ? AND perfume_url = ?",
+                                url_hash(perfume_url), perfume_url)
             existing = self.cursor.fetchone()
-            year = int(launch_year) if str(launch_year).isdigit() else None
 
             if existing:
                 perfume_id = existing[0]
@@ -323,35 +325,38 @@ class DBManager:
                                    launch_year   = ?,
                                    perfumer_name = ?, \
                                    perfumer_url  = ?, \
-                                   brand_id      = ?
+                                   brand_id      = ?, \
+                                   description   = ?, \
+                                   updated_at    = SYSUTCDATETIME()
                                WHERE perfume_id = ? \
                                """
                 self.cursor.execute(update_query,
-                                    (perfume_name, perfume_for, image_url, year, perfumer_name, perfumer_url, brand_id,
-                                     perfume_id))
-                self.conn.commit()
+                                    (perfume_name, perfume_for, image_url, launch_year, perfumer_name, perfumer_url,
+                                     brand_id, description, perfume_id))
+                self._commit()
                 return perfume_id
 
             insert_query = """
                            INSERT INTO Perfumes (perfume_name, perfume_for, image_url, launch_year, perfumer_name, \
-                                                 perfumer_url, perfume_url, brand_id)
+                                                 perfumer_url, perfume_url, brand_id, description)
                                OUTPUT INSERTED.perfume_id
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?) \
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) \
                            """
             self.cursor.execute(insert_query,
-                                (perfume_name, perfume_for, image_url, year, perfumer_name, perfumer_url, perfume_url,
-                                 brand_id))
+                                (perfume_name, perfume_for, image_url, launch_year, perfumer_name, perfumer_url,
+                                 perfume_url, brand_id, description))
             new_id = self.cursor.fetchone()[0]
-            self.conn.commit()
+            self._commit()
             return new_id
 
         except Exception as e:
             logging.error(f"Error in get_or_create_perfume for '{perfume_name}': {e}")
-            self.conn.rollback()
+            self._rollback()
             return None
         finally:
             self._close()
 
+    @timed("db.get_or_create_id")
     def get_or_create_id(self, table_name, column_name, value):
         self._connect()
         try:
@@ -362,41 +367,323 @@ class DBManager:
             query = f"INSERT INTO {table_name} ({name_col}) OUTPUT INSERTED.{id_col} VALUES (?)"
             self.cursor.execute(query, value)
             new_id = self.cursor.fetchone()[0]
-            self.conn.commit()
+            self._commit()
             return new_id
         except pyodbc.IntegrityError:
-            self.conn.rollback()
+            # Another writer inserted the same name first.
+            self._discard_duplicate()
             self.cursor.execute(f"SELECT {id_col} FROM {table_name} WHERE {name_col} = ?", value)
             return self.cursor.fetchone()[0]
         except Exception as e:
             logging.error(f"Error in get_or_create_id for {table_name}: {e}")
-            self.conn.rollback()
+            self._rollback()
             return None
         finally:
             self._close()
 
     # CHANGED: method signature and query
+    @timed("db.link_perfume_note")
     def link_perfume_note(self, perfume_id, note_id, note_level):
         self._connect()
         try:
-            self.cursor.execute("INSERT INTO PerfumeNotes (perfume_id, note_id, note_level) VALUES (?, ?, ?)",
-                                perfume_id,
-                                note_id, note_level)
-            self.conn.commit()
+            self.cursor.execute("""
+                                INSERT INTO PerfumeNotes (perfume_id, note_id, note_level)
+                                SELECT ?, ?, ?
+                                WHERE NOT EXISTS (SELECT 1 FROM PerfumeNotes
+                                                  WHERE perfume_id = ? AND note_id = ? AND note_level = ?)
+                                """, (perfume_id, note_id, note_level, perfume_id, note_id, note_level))
+            self._commit()
         except pyodbc.IntegrityError:
-            self.conn.rollback()
+            self._discard_duplicate()
         finally:
             self._close()
 
+    @timed("db.link_perfume_accord")
     def link_perfume_accord(self, perfume_id, accord_id, accord_strength):
         self._connect()
         try:
-            self.cursor.execute(
-                "INSERT INTO PerfumeAccords (perfume_id, accord_id, accord_strength) VALUES (?, ?, ?)",
-                (perfume_id, accord_id, accord_strength)
-            )
-            self.conn.commit()
+            self.cursor.execute("""
+                                INSERT INTO PerfumeAccords (perfume_id, accord_id, accord_strength)
+                                SELECT ?, ?, ?
+                                WHERE NOT EXISTS (SELECT 1 FROM PerfumeAccords WHERE perfume_id = ? AND accord_id = ?)
+                                """, (perfume_id, accord_id, accord_strength, perfume_id, accord_id))
+            self._commit()
         except pyodbc.IntegrityError:
+            self._discard_duplicate()
+        finally:
+            self._close()
+
+    # --- Change-event outbox ---
+    # Cursor calls re-raise after logging, like the queue calls: a lost acknowledgement must not go unnoticed.
+
+    @timed("db.get_review_body_hashes")
+    def get_review_body_hashes(self, perfume_id):
+        self._connect()
+        try:
+            self.cursor.execute("SELECT body_hash FROM Reviews WHERE perfume_id = ?", perfume_id)
+            return [None if row[0] is None else bytes(row[0]) for row in self.cursor.fetchall()]
+        finally:
+            self._close()
+
+    @timed("db.insert_change_events")
+    def insert_change_events(self, rows):
+        if not rows:
+            return
+        self._connect()
+        try:
+            self.cursor.fast_executemany = True
+            self.cursor.executemany("INSERT INTO ChangeEvents (perfume_id, event_type, payload) VALUES (?, ?, ?)",
+                                    rows)
+            self._commit()
+        except pyodbc.Error as e:
+            logging.error(f"Failed to insert {len(rows)} change events: {e}")
+            self._rollback()
+        finally:
+            self._close()
+
+    @timed("db.read_change_events")
+    def read_change_events(self, after_event_id, limit, settle_seconds):
+        self._connect()
+        try:
+            self.cursor.execute("""
+                                SELECT TOP (?) event_id, perfume_id, event_type, payload, created_at
+                                FROM ChangeEvents
+                                WHERE event_id > ? AND created_at <= DATEADD(SECOND, ?, SYSUTCDATETIME())
+                                ORDER BY event_id
+                                """, (limit, after_event_id, -int(settle_seconds)))
+            return [tuple(row) for row in self.cursor.fetchall()]
+        finally:
+            self._close()
+
+    @timed("db.get_consumer_cursor")
+    def get_consumer_cursor(self, consumer):
+        self._connect()
+        try:
+            self.cursor.execute("SELECT last_event_id FROM ConsumerCursors WHERE consumer = ?", consumer)
+            row = self.cursor.fetchone()
+            return row[0] if row else 0
+        finally:
+            self._close()
+
+    @timed("db.save_consumer_cursor")
+    def save_consumer_cursor(self, consumer, event_id):
+        self._connect()
+        try:
+            self.cursor.execute("""
+                                UPDATE ConsumerCursors WITH (UPDLOCK, HOLDLOCK)
+                                SET last_event_id = ?, updated_at = SYSUTCDATETIME()
+                                WHERE consumer = ?
+                                IF @@ROWCOUNT = 0
+                                INSERT INTO ConsumerCursors (consumer, last_event_id) VALUES (?, ?)
+                                """, (event_id, consumer, consumer, event_id))
+            self._commit()
+        except pyodbc.Error as e:
+            logging.error(f"Failed to save the cursor of {consumer}: {e}")
             self.conn.rollback()
+            raise
         finally:
-            self._close()
\ No newline at end of file
+            self._close()
+
+    @timed("db.prune_change_events")
+    def prune_change_events(self):
+        self._connect()
+        try:
+            self.cursor.execute(
+                "DELETE FROM ChangeEvents WHERE event_id <= (SELECT MIN(last_event_id) FROM ConsumerCursors)")
+            deleted = self.cursor.rowcount
+            self._commit()
+            return deleted
+        except pyodbc.Error as e:
+            logging.error(f"Failed to prune change events: {e}")
+            self.conn.rollback()
+            raise
+        finally:
+            self._close()
+
+    # --- Derived metrics ---
+
+    @timed("db.replace_perfume_metrics")
+    def replace_perfume_metrics(self, columns, rows):
+        self._connect()
+        try:
+            # One transaction: readers see the old metrics until the new ones are all in
+            self.cursor.execute("DELETE FROM PerfumeMetrics")
+            self.cursor.fast_executemany = True
+            self.cursor.executemany(f"INSERT INTO PerfumeMetrics ({', '.join(columns)}) "
+                                    f"VALUES ({', '.join('?' for _ in columns)})", rows)
+            self._commit()
+        except pyodbc.Error as e:
+            logging.error(f"Failed to write {len(rows)} perfume metrics rows: {e}")
+            self.conn.rollback()
+            raise
+        finally:
+            self._close()
+
+    # --- Read side ---
+
+    def stream_rows(self, query, params=(), batch_size=5000):
+        # Own autocommit connection: a long export must not hold a transaction open against the scraper's writes
+        conn = pyodbc.connect(self.connection_string, autocommit=True)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [tuple(row) for row in rows]
+        finally:
+            conn.close()
+
+    # --- Shared crawl queue ---
+    # Queue calls re-raise after logging: a lost lease or completion must not go unnoticed by the worker.
+
+    @timed("db.enqueue_urls")
+    def enqueue_urls(self, urls):
+        rows = [(url, url) for url in urls]
+        if not rows:
+            return
+        self._connect()
+        try:
+            self.cursor.fast_executemany = True
+            self.cursor.executemany("""
+                                    INSERT INTO CrawlQueue (url)
+                                    SELECT ?
+                                    WHERE NOT EXISTS (SELECT 1 FROM CrawlQueue WHERE url = ?)
+                                    """, rows)
+            self._commit()
+        except pyodbc.Error as e:
+            logging.error(f"Failed to enqueue {len(rows)} URLs: {e}")
+            self.conn.rollback()
+            raise
+        finally:
+            self._close()
+
+    @timed("db.lease_urls")
+    def lease_urls(self, owner, limit, lease_seconds):
+        self._connect()
+        try:
+            # READPAST skips rows another host is leasing right now, UPDLOCK keeps two hosts from claiming
+            # the same row, and OUTPUT returns the claimed rows from the same statement.
+            self.cursor.execute("""
+                                WITH next_urls AS (
+                                    SELECT TOP (?) *
+                                    FROM CrawlQueue WITH (UPDLOCK, READPAST, ROWLOCK)
+                                    WHERE (status = 'pending' AND available_at <= SYSUTCDATETIME())
+                                       OR (status = 'leased' AND lease_expires_at < SYSUTCDATETIME())
+                                    ORDER BY available_at, queue_id
+                                )
+                                UPDATE next_urls
+                                SET status = 'leased',
+                                    lease_owner = ?,
+                                    lease_expires_at = DATEADD(SECOND, ?, SYSUTCDATETIME()),
+                                    attempts = attempts + 1,
+                                    updated_at = SYSUTCDATETIME()
+                                OUTPUT inserted.url, inserted.attempts
+                                """, (limit, owner, lease_seconds))
+            leased = [(row[0], row[1]) for row in self.cursor.fetchall()]
+            self._commit()
+            return leased
+        except pyodbc.Error as e:
+            logging.error(f"Failed to lease URLs for {owner}: {e}")
+            self.conn.rollback()
+            raise
+        finally:
+            self._close()
+
+    @timed("db.renew_leases")
+    def renew_leases(self, owner, urls, lease_seconds):
+        self._connect()
+        try:
+            renewed = []
+            for url in urls:
+                self.cursor.execute("""
+                                    UPDATE CrawlQueue
+                                    SET lease_expires_at = DATEADD(SECOND, ?, SYSUTCDATETIME()),
+                                        updated_at = SYSUTCDATETIME()
+                                    WHERE url = ? AND status = 'leased' AND lease_owner = ?
+                                    """, (lease_seconds, url, owner))
+                if self.cursor.rowcount:
+                    renewed.append(url)
+            self._commit()
+            return renewed
+        except pyodbc.Error as e:
+            logging.error(f"Failed to renew leases for {owner}: {e}")
+            self.conn.rollback()
+            raise
+        finally:
+            self._close()
+
+    @timed("db.complete_url")
+    def complete_url(self, url):
+        self._connect()
+        try:
+            self.cursor.execute("""
+                                UPDATE CrawlQueue
+                                SET status = 'done', lease_owner = NULL, lease_expires_at = NULL,
+                                    last_error_kind = NULL, last_error = NULL, updated_at = SYSUTCDATETIME()
+                                WHERE url = ? AND status <> 'done'
+                                """, url)
+            self._commit()
+        except pyodbc.Error as e:
+            logging.error(f"Failed to mark {url} as done: {e}")
+            self.conn.rollback()
+            raise
+        finally:
+            self._close()
+
+    @timed("db.release_url")
+    def release_url(self, url, owner, delay_seconds, error_kind=None, error=None, dead=False, started=True):
+        self._connect()
+        try:
+            self.cursor.execute("""
+                                UPDATE CrawlQueue
+                                SET status = ?, lease_owner = NULL, lease_expires_at = NULL,
+                                    attempts = attempts - ?,
+                                    available_at = DATEADD(SECOND, ?, SYSUTCDATETIME()),
+                                    last_error_kind = ?, last_error = ?, updated_at = SYSUTCDATETIME()
+                                WHERE url = ? AND status = 'leased' AND lease_owner = ?
+                                """, ("dead" if dead else "pending", 0 if started else 1, int(delay_seconds),
+                                      error_kind, error[:1000] if error else None, url, owner))
+            self._commit()
+        except pyodbc.Error as e:
+            logging.error(f"Failed to release {url}: {e}")
+            self.conn.rollback()
+            raise
+        finally:
+            self._close()
+
+    @timed("db.requeue_dead_urls")
+    def requeue_dead_urls(self, urls=None):
+        self._connect()
+        try:
+            sql = """
+                  UPDATE CrawlQueue
+                  SET status = 'pending', attempts = 0, available_at = SYSUTCDATETIME(), updated_at = SYSUTCDATETIME()
+                  WHERE status = 'dead'
+                  """
+            if urls is None:
+                self.cursor.execute(sql)
+                count = self.cursor.rowcount
+            else:
+                count = 0
+                for url in urls:
+                    self.cursor.execute(sql + " AND url = ?", url)
+                    count += max(self.cursor.rowcount, 0)
+            self._commit()
+            return count
+        except pyodbc.Error as e:
+            logging.error(f"Failed to requeue dead URLs: {e}")
+            self.conn.rollback()
+            raise
+        finally:
+            self._close()
+
+    @timed("db.queue_counts")
+    def queue_counts(self):
+        self._connect()
+        try:
+            self.cursor.execute("SELECT status, COUNT(*) FROM CrawlQueue GROUP BY status")
+            return {row[0]: row[1] for row in self.cursor.fetchall()}
+        finally:
+            self._close()
@@ -0,0 +1,70 @@
+import re
+import socket
+
+CLOUDFLARE_BLOCK = "cloudflare_block"
+TIMEOUT = "timeout"
+PARSE_FAILURE = "parse_failure"
+DB_FAILURE = "db_failure"
+UNKNOWN = "unknown"
+
+# <title>s of the server error and rate-limit pages a browser shows instead of the perfume page
+ERROR_PAGE_TITLES = ("service unavailable", "too many requests", "bad gateway", "gateway timeout",
+                     "gateway time-out", "internal server error", "rate limited")
+
+
+class ScrapeError(Exception):
+    """Base class for failures the crawl loop knows how to classify."""
+    kind = UNKNOWN
+
+
+class CloudflareBlockedError(ScrapeError):
+    """The 'Just a moment' challenge page was still shown after all bypass attempts."""
+    kind = CLOUDFLARE_BLOCK
+
+
+class FetchTimeoutError(ScrapeError):
+    """The page (or its reviews) could not be loaded in time, came back empty, or came back as an error page."""
+    kind = TIMEOUT
+
+
+class ParseError(ScrapeError):
+    """The HTML was fetched but did not contain a recognisable perfume page."""
+    kind = PARSE_FAILURE
+
+
+class PersistError(ScrapeError):
+    """The extracted data could not be written to the database."""
+    kind = DB_FAILURE
+
+
+def raise_for_error_page(url, html, status=None):
+    """
+    Raises FetchTimeoutError if a fetched page is a 5xx/429 response or shows a server error or rate-limit
+    page (checked by status when the fetcher has one, else by <title>). These are transient: they go to the
+    retry lane with the timeout backoff instead of failing to parse.
+    """
+    if status is not None and (status >= 500 or status == 429):
+        raise FetchTimeoutError(f"HTTP {status} fetching {url}")
+    title = re.search(r"<title[^>]*>(.*?)</title>", html[:4096], re.IGNORECASE | re.DOTALL)
+    if title and any(marker in title.group(1).lower() for marker in ERROR_PAGE_TITLES):
+        raise FetchTimeoutError(f"Error page '{title.group(1).strip()}' fetching {url}")
+
+
+def classify_error(exc):
+    """Maps any exception raised while processing a URL to one of the error kinds above."""
+    if isinstance(exc, ScrapeError):
+        return exc.kind
+    if isinstance(exc, (TimeoutError, socket.timeout)):
+        return TIMEOUT
+
+    # Third-party exceptions are matched by module/name so this module imports nothing heavy.
+    module = type(exc).__module__ or ""
+    name = type(exc).__name__
+    if module.startswith(("pyodbc", "sqlite3")):
+        return DB_FAILURE
+    if "Timeout" in name:
+        # selenium TimeoutException, requests Timeout/ReadTimeout, DrissionPage timeouts
+        return TIMEOUT
+    if "just a moment" in str(exc).lower():
+        return CLOUDFLARE_BLOCK
+    return UNKNOWN
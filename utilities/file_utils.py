@@ -2,6 +2,7 @@ import os
 import csv
 import json
 import re
+import logging
 from config import OUTPUT_FOLDER
 from datetime import datetime
 
@@ -31,7 +32,7 @@ def clean_failed_urls():
     with open(FAILED_FILE, "w", encoding="utf-8") as f:
         json.dump([], f, indent=4, ensure_ascii=False)
 
-    print("Cleanup completed successfully ✅")
+    logging.info("Cleanup completed successfully ✅")
 
 def normalize_key(text):
     return re.sub(r'\W+', '_', text.strip().lower())
@@ -49,7 +50,7 @@ def save_json(data):
     path = os.path.join(OUTPUT_FOLDER, f"{safe_title}.json")
     with open(path, 'w', encoding='utf-8') as jf:
         json.dump(data, jf, ensure_ascii=False, indent=4)
-    print(f"📄 Saved JSON: {path}")
+    logging.info(f"📄 Saved JSON: {path}")
 
 def read_urls_from_csv(csv_path):
     with open(csv_path, newline='', encoding='utf-8') as f:
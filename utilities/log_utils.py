@@ -0,0 +1,110 @@
+import sys
+import json
+import queue
+import uuid
+import atexit
+import logging
+import logging.handlers
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from config import LOG_LEVEL, LOG_FORMAT, LOG_FILE
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_current_url = contextvars.ContextVar("current_url", default=None)
+_correlation_id = contextvars.ContextVar("correlation_id", default=None)
+_listener = None
+
+
+@contextmanager
+def url_context(url, correlation_id=None):
+    """Tags every log record emitted inside the block with the URL and a short correlation id."""
+    url_token = _current_url.set(url)
+    id_token = _correlation_id.set(correlation_id or uuid.uuid4().hex[:12])
+    try:
+        yield _correlation_id.get()
+    finally:
+        _current_url.reset(url_token)
+        _correlation_id.reset(id_token)
+
+
+def current_correlation_id():
+    return _correlation_id.get()
+
+
+class ContextFilter(logging.Filter):
+    """Copies the per-URL context onto the record in the thread that emitted it."""
+
+    def filter(self, record):
+        record.url = _current_url.get()
+        record.correlation_id = _correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the per-URL context fields when present."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            entry["correlation_id"] = record.correlation_id
+            entry["url"] = record.url
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, log_file=LOG_FILE):
+    """
+    Configures the root logger once for the whole process.
+    Records are pushed onto a queue by the calling thread and written by a background listener,
+    so slow consoles or files never block the scraper.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _ContextQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flushes and stops the background listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps exc_info so the JSON formatter can emit it as its own field."""
+
+    def prepare(self, record):
+        # The listener runs in this process, so the record can be queued as-is once its message is merged.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
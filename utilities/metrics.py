@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from config import METRICS_FOLDER
+
+METRIC_PREFIX = "scentsymphony"
+
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile of an already sorted list (q between 0 and 1)."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(int(round(q * len(sorted_samples) + 0.5)) - 1, 0)
+    return sorted_samples[min(rank, len(sorted_samples) - 1)]
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None if the platform does not expose it."""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_working_set()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_peak_working_set():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+class RunMetrics:
+    """Collects per-stage timings, counters and gauges for a single scraper run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.gauges = {}
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now()
+            self.timings.clear()
+            self.errors.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.timings[stage].append(seconds)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, stage):
+        """Times the wrapped block; failures are still timed and counted per stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.errors[stage] += 1
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """Decorator form of timer()."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        with self._lock:
+            timings = {stage: sorted(samples) for stage, samples in self.timings.items()}
+            errors = dict(self.errors)
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+
+        stages = {}
+        for stage, samples in sorted(timings.items()):
+            total = sum(samples)
+            stages[stage] = {
+                "count": len(samples),
+                "errors": errors.get(stage, 0),
+                "total_seconds": round(total, 6),
+                "mean_seconds": round(total / len(samples), 6) if samples else 0.0,
+                "p50_seconds": round(percentile(samples, 0.50), 6),
+                "p95_seconds": round(percentile(samples, 0.95), 6),
+                "max_seconds": round(samples[-1], 6) if samples else 0.0,
+            }
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now().isoformat(),
+            "stages": stages,
+            "counters": counters,
+            "gauges": gauges,
+        }
+
+    def to_prometheus(self, summary=None):
+        summary = summary or self.summary()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds Time spent per scraper stage.",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds summary",
+        ]
+        for stage, stats in summary["stages"].items():
+            label = _escape_label(stage)
+            lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{label}",quantile="0.5"}} {stats["p50_seconds"]}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{label}",quantile="0.95"}} {stats["p95_seconds"]}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{label}"}} {stats["total_seconds"]}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{label}"}} {stats["count"]}')
+
+        lines.append(f"# HELP {METRIC_PREFIX}_stage_errors_total Stage executions that raised.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_errors_total counter")
+        for stage, stats in summary["stages"].items():
+            lines.append(f'{METRIC_PREFIX}_stage_errors_total{{stage="{_escape_label(stage)}"}} {stats["errors"]}')
+
+        lines.append(f"# HELP {METRIC_PREFIX}_events_total Counted scraper events.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_events_total counter")
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f'{METRIC_PREFIX}_events_total{{name="{_escape_label(name)}"}} {value}')
+
+        lines.append(f"# HELP {METRIC_PREFIX}_gauge Last observed value of a scraper gauge.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_gauge gauge")
+        for name, value in sorted(summary["gauges"].items()):
+            lines.append(f'{METRIC_PREFIX}_gauge{{name="{_escape_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, folder=METRICS_FOLDER):
+        """Writes run_<timestamp>.json and run_<timestamp>.prom into folder and returns both paths."""
+        os.makedirs(folder, exist_ok=True)
+        peak_rss = peak_rss_bytes()
+        if peak_rss is not None:
+            # One value per process, so sizing a browser/worker pool is peak_rss x pool size
+            self.set_gauge("peak_rss_bytes", peak_rss)
+            logging.info(f"🧠 Peak RSS of this process: {peak_rss / 2 ** 20:.0f} MiB")
+        summary = self.summary()
+        run_id = self.started_at.strftime("%Y%m%d_%H%M%S")
+        json_path = os.path.join(folder, f"run_{run_id}.json")
+        prom_path = os.path.join(folder, f"run_{run_id}.prom")
+
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        with open(prom_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(summary))
+
+        logging.info(f"📊 Run metrics written to {json_path} and {prom_path}")
+        return json_path, prom_path
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide registry used by the scraper modules.
+metrics = RunMetrics()
+timer = metrics.timer
+timed = metrics.timed
+increment = metrics.increment
+set_gauge = metrics.set_gauge
@@ -0,0 +1,620 @@
+import logging
+
+# Each migration runs once per database and is recorded in SchemaMigrations.
+# Every step is also written to be safe to re-run, so databases created by the old
+# IF OBJECT_ID ... CREATE TABLE code, or a migration interrupted halfway, converge on the same schema.
+
+
+class Migration:
+    def __init__(self, version, description, mssql, sqlite):
+        self.version = version
+        self.description = description
+        self.steps = {"mssql": mssql, "sqlite": sqlite}
+
+
+def _mssql_index(name, table, columns, include=None):
+    include_sql = f" INCLUDE ({include})" if include else ""
+    return (f"IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'{name}' AND object_id = OBJECT_ID(N'dbo.{table}'))\n"
+            f"CREATE NONCLUSTERED INDEX {name} ON dbo.{table} ({columns}){include_sql}")
+
+
+def _sqlite_index(name, table, columns):
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+
+
+def _sqlite_add_column(table, column, definition):
+    def step(cursor):
+        columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+# Labels pivoted into PerfumeSummary by migration 7. Frozen here: new labels need a new migration,
+# not an edit (scraper.models.SUMMARY_COLUMNS lists the same columns for the write path).
+_SUMMARY_STAT_LABELS = {
+    "longevity": ("very_weak", "weak", "moderate", "long_lasting", "eternal"),
+    "sillage": ("intimate", "moderate", "strong", "enormous"),
+    "gender": ("female", "more_female", "unisex", "more_male", "male"),
+    "price_value": ("way_overpriced", "overpriced", "ok", "good_value", "great_value"),
+}
+_SUMMARY_PERCENTAGE_LABELS = {
+    "possession": ("i_have_it", "i_had_it", "i_want_it"),
+    "emotional_attachment": ("love", "like", "ok", "dislike", "hate"),
+    "wearing_season": ("winter", "spring", "summer", "fall", "day", "night"),
+}
+
+
+def _summary_columns(vote_type, rating_type, percentage_type):
+    columns = [("review_count", vote_type), ("rating_count", vote_type), ("rating_value", rating_type)]
+    columns += [(f"{category}_{label}", vote_type)
+                for category, labels in _SUMMARY_STAT_LABELS.items() for label in labels]
+    columns += [(f"{category}_votes", vote_type) for category in _SUMMARY_STAT_LABELS]
+    columns += [(f"{category}_{label}", percentage_type)
+                for category, labels in _SUMMARY_PERCENTAGE_LABELS.items() for label in labels]
+    return columns
+
+
+def _summary_table(create, id_type, foreign_key, columns):
+    body = ",\n".join(f"            {name} {column_type} NULL" for name, column_type in columns)
+    return f"""
+        {create} PerfumeSummary (
+            perfume_id {id_type} PRIMARY KEY {foreign_key},
+{body}
+        )"""
+
+
+def _summary_backfill():
+    """Pivots the EAV rows of every perfume that has no summary yet (plain SQL both dialects accept)."""
+    stats = ",\n".join(
+        [f"MAX(CASE WHEN category = '{c}' AND label = '{l}' THEN vote_count END) AS {c}_{l}"
+         for c, labels in _SUMMARY_STAT_LABELS.items() for l in labels]
+        + [f"SUM(CASE WHEN category = '{c}' THEN vote_count END) AS {c}_votes" for c in _SUMMARY_STAT_LABELS])
+    percentages = ",\n".join(
+        f"MAX(CASE WHEN category = '{c}' AND label = '{l}' THEN percentage_value END) AS {c}_{l}"
+        for c, labels in _SUMMARY_PERCENTAGE_LABELS.items() for l in labels)
+    stat_columns = [f"{c}_{l}" for c, labels in _SUMMARY_STAT_LABELS.items() for l in labels]
+    stat_columns += [f"{c}_votes" for c in _SUMMARY_STAT_LABELS]
+    percentage_columns = [f"{c}_{l}" for c, labels in _SUMMARY_PERCENTAGE_LABELS.items() for l in labels]
+    columns = ["perfume_id", "review_count", "rating_count", "rating_value"] + stat_columns + percentage_columns
+    select = (["p.perfume_id", "v.review_count", "v.rating_count", "v.rating_value"]
+              + [f"s.{c}" for c in stat_columns] + [f"pp.{c}" for c in percentage_columns])
+    return f"""
+        INSERT INTO PerfumeSummary ({", ".join(columns)})
+        SELECT {", ".join(select)}
+        FROM Perfumes p
+        LEFT JOIN (SELECT perfume_id, MAX(review_count) AS review_count, MAX(rating_count) AS rating_count,
+                          MAX(rating_value) AS rating_value
+                   FROM PerfumeVotes GROUP BY perfume_id) v ON v.perfume_id = p.perfume_id
+        LEFT JOIN (SELECT perfume_id,
+{stats}
+                   FROM PerfumeStats GROUP BY perfume_id) s ON s.perfume_id = p.perfume_id
+        LEFT JOIN (SELECT perfume_id,
+{percentages}
+                   FROM PerfumePercentages GROUP BY perfume_id) pp ON pp.perfume_id = p.perfume_id
+        WHERE NOT EXISTS (SELECT 1 FROM PerfumeSummary x WHERE x.perfume_id = p.perfume_id)"""
+
+
+VERSION_TABLE = {
+    "mssql": """
+        IF OBJECT_ID(N'dbo.SchemaMigrations', N'U') IS NULL
+        CREATE TABLE SchemaMigrations (
+            version INT PRIMARY KEY,
+            description NVARCHAR(255) NOT NULL,
+            applied_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        )""",
+    "sqlite": """
+        CREATE TABLE IF NOT EXISTS SchemaMigrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )""",
+}
+
+MSSQL_BASELINE = [
+    # 1. Countries
+    '''
+        IF OBJECT_ID(N'dbo.Countries', N'U') IS NULL
+        CREATE TABLE Countries (
+            country_id INT IDENTITY(1,1) PRIMARY KEY,
+            country_name NVARCHAR(255) UNIQUE NOT NULL,
+            brand_count INT
+        )''',
+
+    # 2. Brands
+    '''
+        IF OBJECT_ID(N'dbo.Brands', N'U') IS NULL
+        CREATE TABLE Brands (
+            id INT IDENTITY(1,1) PRIMARY KEY,
+            brand_name NVARCHAR(255) UNIQUE NOT NULL,
+            country_id INT FOREIGN KEY REFERENCES Countries(country_id),
+            brand_url NVARCHAR(500),
+            perfume_count INT,
+            brand_website_url NVARCHAR(500),
+            brand_image_url NVARCHAR(500)
+        )''',
+
+    # 3. Perfumes
+    '''
+        IF OBJECT_ID(N'dbo.Perfumes', N'U') IS NULL
+        CREATE TABLE Perfumes (
+            perfume_id INT IDENTITY(1,1) PRIMARY KEY,
+            perfume_name NVARCHAR(255),
+            perfume_for NVARCHAR(255),
+            image_url NVARCHAR(500),
+            launch_year INT,
+            perfumer_name NVARCHAR(255),
+            perfumer_url NVARCHAR(500),
+            perfume_url NVARCHAR(500) UNIQUE NOT NULL,
+            brand_id INT NULL FOREIGN KEY REFERENCES Brands(id)
+        )''',
+
+    # 4. Notes
+    '''
+        IF OBJECT_ID(N'dbo.Notes', N'U') IS NULL
+        CREATE TABLE Notes (
+            note_id INT IDENTITY(1,1) PRIMARY KEY,
+            note_name NVARCHAR(255) UNIQUE NOT NULL
+        )''',
+
+    # 5. Accords
+    '''
+        IF OBJECT_ID(N'dbo.Accords', N'U') IS NULL
+        CREATE TABLE Accords (
+            accord_id INT IDENTITY(1,1) PRIMARY KEY,
+            accord_name NVARCHAR(255) UNIQUE NOT NULL
+        )''',
+
+    # 6. PerfumeNotes
+    '''
+        IF OBJECT_ID(N'dbo.PerfumeNotes', N'U') IS NULL
+        CREATE TABLE PerfumeNotes (
+            perfume_id INT FOREIGN KEY REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            note_id INT FOREIGN KEY REFERENCES Notes(note_id) ON DELETE CASCADE,
+            note_level NVARCHAR(50),
+            PRIMARY KEY (perfume_id, note_id, note_level)
+        )''',
+
+    # 7. PerfumeAccords
+    '''
+        IF OBJECT_ID(N'dbo.PerfumeAccords', N'U') IS NULL
+        CREATE TABLE PerfumeAccords (
+            perfume_id INT FOREIGN KEY REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            accord_id INT FOREIGN KEY REFERENCES Accords(accord_id) ON DELETE CASCADE,
+            accord_strength DECIMAL(5,2) NULL,
+            PRIMARY KEY (perfume_id, accord_id)
+        )''',
+
+    # 8. PerfumeVotes
+    '''
+        IF OBJECT_ID(N'dbo.PerfumeVotes', N'U') IS NULL
+        CREATE TABLE PerfumeVotes (
+            vote_id INT IDENTITY(1,1) PRIMARY KEY,
+            perfume_id INT NOT NULL,
+            review_count INT NOT NULL DEFAULT 0,
+            rating_count INT NOT NULL DEFAULT 0,
+            rating_value DECIMAL(3, 2) NOT NULL,
+            FOREIGN KEY (perfume_id) REFERENCES Perfumes(perfume_id) ON DELETE CASCADE
+        )''',
+
+    # 9. PerfumePercentages
+    '''
+        IF OBJECT_ID(N'dbo.PerfumePercentages', N'U') IS NULL
+        CREATE TABLE PerfumePercentages (
+            percentage_id INT IDENTITY(1,1) PRIMARY KEY,
+            perfume_id INT NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            label VARCHAR(50) NOT NULL,
+            percentage_value DECIMAL(5, 2) NOT NULL,
+            FOREIGN KEY (perfume_id) REFERENCES Perfumes(perfume_id) ON DELETE CASCADE
+        )''',
+
+    # 10. PerfumeStats
+    '''
+        IF OBJECT_ID(N'dbo.PerfumeStats', N'U') IS NULL
+        CREATE TABLE PerfumeStats (
+            stat_id INT IDENTITY(1,1) PRIMARY KEY,
+            perfume_id INT NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            label VARCHAR(50) NOT NULL,
+            vote_count INT NOT NULL DEFAULT 0,
+            FOREIGN KEY (perfume_id) REFERENCES Perfumes(perfume_id) ON DELETE CASCADE
+        )''',
+
+    # 11. Reviews
+    '''
+        IF OBJECT_ID(N'dbo.Reviews', N'U') IS NULL
+        CREATE TABLE Reviews (
+            review_id INT IDENTITY(1,1) PRIMARY KEY,
+            perfume_id INT NOT NULL,
+            review_content NVARCHAR(MAX),
+            reviewer_name NVARCHAR(250),
+            review_date DATE,
+            FOREIGN KEY (perfume_id) REFERENCES Perfumes(perfume_id) ON DELETE CASCADE
+        )''',
+]
+
+SQLITE_BASELINE = [
+    '''
+        CREATE TABLE IF NOT EXISTS Countries (
+            country_id INTEGER PRIMARY KEY,
+            country_name TEXT UNIQUE NOT NULL,
+            brand_count INTEGER
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS Brands (
+            id INTEGER PRIMARY KEY,
+            brand_name TEXT UNIQUE NOT NULL,
+            country_id INTEGER REFERENCES Countries(country_id),
+            brand_url TEXT,
+            perfume_count INTEGER,
+            brand_website_url TEXT,
+            brand_image_url TEXT
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS Perfumes (
+            perfume_id INTEGER PRIMARY KEY,
+            perfume_name TEXT,
+            perfume_for TEXT,
+            image_url TEXT,
+            launch_year INTEGER,
+            perfumer_name TEXT,
+            perfumer_url TEXT,
+            perfume_url TEXT UNIQUE NOT NULL,
+            brand_id INTEGER NULL REFERENCES Brands(id)
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS Notes (
+            note_id INTEGER PRIMARY KEY,
+            note_name TEXT UNIQUE NOT NULL
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS Accords (
+            accord_id INTEGER PRIMARY KEY,
+            accord_name TEXT UNIQUE NOT NULL
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS PerfumeNotes (
+            perfume_id INTEGER REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            note_id INTEGER REFERENCES Notes(note_id) ON DELETE CASCADE,
+            note_level TEXT,
+            PRIMARY KEY (perfume_id, note_id, note_level)
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS PerfumeAccords (
+            perfume_id INTEGER REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            accord_id INTEGER REFERENCES Accords(accord_id) ON DELETE CASCADE,
+            accord_strength REAL NULL,
+            PRIMARY KEY (perfume_id, accord_id)
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS PerfumeVotes (
+            vote_id INTEGER PRIMARY KEY,
+            perfume_id INTEGER NOT NULL REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            review_count INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            rating_value REAL NOT NULL
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS PerfumePercentages (
+            percentage_id INTEGER PRIMARY KEY,
+            perfume_id INTEGER NOT NULL REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            category TEXT NOT NULL,
+            label TEXT NOT NULL,
+            percentage_value REAL NOT NULL
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS PerfumeStats (
+            stat_id INTEGER PRIMARY KEY,
+            perfume_id INTEGER NOT NULL REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            category TEXT NOT NULL,
+            label TEXT NOT NULL,
+            vote_count INTEGER NOT NULL DEFAULT 0
+        )''',
+
+    '''
+        CREATE TABLE IF NOT EXISTS Reviews (
+            review_id INTEGER PRIMARY KEY,
+            perfume_id INTEGER NOT NULL REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            review_content TEXT,
+            reviewer_name TEXT,
+            review_date TEXT
+        )''',
+]
+
+MIGRATIONS = [
+    Migration(1, "Baseline tables", mssql=MSSQL_BASELINE, sqlite=SQLITE_BASELINE),
+
+    # SQL Server does not index foreign keys. clear_perfume_details, the ON DELETE CASCADE from Perfumes
+    # and every per-perfume read filter the child tables on perfume_id, so without these they scan.
+    Migration(2, "Indexes for perfume_id child-table access and note/accord/brand lookups", mssql=[
+        _mssql_index("IX_PerfumeVotes_perfume_id", "PerfumeVotes", "perfume_id",
+                     include="review_count, rating_count, rating_value"),
+        _mssql_index("IX_PerfumeStats_perfume_id", "PerfumeStats", "perfume_id",
+                     include="category, label, vote_count"),
+        _mssql_index("IX_PerfumePercentages_perfume_id", "PerfumePercentages", "perfume_id",
+                     include="category, label, percentage_value"),
+        _mssql_index("IX_Reviews_perfume_id", "Reviews", "perfume_id"),
+        _mssql_index("IX_PerfumeNotes_note_id", "PerfumeNotes", "note_id", include="note_level"),
+        _mssql_index("IX_PerfumeAccords_accord_id", "PerfumeAccords", "accord_id", include="accord_strength"),
+        _mssql_index("IX_Perfumes_brand_id", "Perfumes", "brand_id"),
+    ], sqlite=[
+        _sqlite_index("IX_PerfumeVotes_perfume_id", "PerfumeVotes", "perfume_id"),
+        _sqlite_index("IX_PerfumeStats_perfume_id", "PerfumeStats", "perfume_id"),
+        _sqlite_index("IX_PerfumePercentages_perfume_id", "PerfumePercentages", "perfume_id"),
+        _sqlite_index("IX_Reviews_perfume_id", "Reviews", "perfume_id"),
+        _sqlite_index("IX_PerfumeNotes_note_id", "PerfumeNotes", "note_id"),
+        _sqlite_index("IX_PerfumeAccords_accord_id", "PerfumeAccords", "accord_id"),
+        _sqlite_index("IX_Perfumes_brand_id", "Perfumes", "brand_id"),
+    ]),
+
+    # Lookups by URL seek a fixed-width 32-byte key instead of an NVARCHAR(500) one.
+    # The value is SHA-256 over the UTF-16LE URL, see utilities.storage.url_hash.
+    Migration(3, "Hash-keyed perfume_url lookup column", mssql=[
+        """
+        IF COL_LENGTH(N'dbo.Perfumes', N'perfume_url_hash') IS NULL
+        ALTER TABLE dbo.Perfumes
+            ADD perfume_url_hash AS CAST(HASHBYTES('SHA2_256', perfume_url) AS BINARY(32)) PERSISTED""",
+        _mssql_index("IX_Perfumes_perfume_url_hash", "Perfumes", "perfume_url_hash", include="perfume_url"),
+    ], sqlite=[
+        _sqlite_add_column("Perfumes", "perfume_url_hash", "BLOB"),
+        "UPDATE Perfumes SET perfume_url_hash = url_hash(perfume_url) WHERE perfume_url_hash IS NULL",
+        _sqlite_index("IX_Perfumes_perfume_url_hash", "Perfumes", "perfume_url_hash"),
+    ]),
+
+    # Shared work queue for distributed_main.py. Times are always the database's own clock (UTC),
+    # so lease expiry does not depend on the scraper hosts agreeing on the time.
+    Migration(4, "CrawlQueue table for leased multi-host crawling", mssql=[
+        """
+        IF OBJECT_ID(N'dbo.CrawlQueue', N'U') IS NULL
+        CREATE TABLE CrawlQueue (
+            queue_id INT IDENTITY(1,1) PRIMARY KEY,
+            url NVARCHAR(500) UNIQUE NOT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            lease_owner NVARCHAR(100) NULL,
+            lease_expires_at DATETIME2 NULL,
+            available_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+            last_error_kind VARCHAR(20) NULL,
+            last_error NVARCHAR(1000) NULL,
+            updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        )""",
+        _mssql_index("IX_CrawlQueue_status_available_at", "CrawlQueue", "status, available_at"),
+        _mssql_index("IX_CrawlQueue_status_lease_expires_at", "CrawlQueue", "status, lease_expires_at"),
+    ], sqlite=[
+        """
+        CREATE TABLE IF NOT EXISTS CrawlQueue (
+            queue_id INTEGER PRIMARY KEY,
+            url TEXT UNIQUE NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT NULL,
+            lease_expires_at TEXT NULL,
+            available_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            last_error_kind TEXT NULL,
+            last_error TEXT NULL,
+            updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        )""",
+        _sqlite_index("IX_CrawlQueue_status_available_at", "CrawlQueue", "status, available_at"),
+        _sqlite_index("IX_CrawlQueue_status_lease_expires_at", "CrawlQueue", "status, lease_expires_at"),
+    ]),
+
+    # Change watermark for incremental exports (export_main.py). get_or_create_perfume stamps it on every
+    # write, and a perfume's child rows are rewritten in the same transaction, so it covers them too.
+    Migration(5, "Perfumes.updated_at change watermark", mssql=[
+        """
+        IF COL_LENGTH(N'dbo.Perfumes', N'updated_at') IS NULL
+        ALTER TABLE dbo.Perfumes
+            ADD updated_at DATETIME2 NOT NULL CONSTRAINT DF_Perfumes_updated_at DEFAULT SYSUTCDATETIME()""",
+        _mssql_index("IX_Perfumes_updated_at", "Perfumes", "updated_at"),
+    ], sqlite=[
+        # ALTER TABLE cannot add a column with a non-constant default, so inserts set it explicitly
+        _sqlite_add_column("Perfumes", "updated_at", "TEXT"),
+        "UPDATE Perfumes SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE updated_at IS NULL",
+        _sqlite_index("IX_Perfumes_updated_at", "Perfumes", "updated_at"),
+    ]),
+
+    # The page description was extracted but never stored; it is searchable through utilities/search_index.py
+    Migration(6, "Perfumes.description column", mssql=[
+        """
+        IF COL_LENGTH(N'dbo.Perfumes', N'description') IS NULL
+        ALTER TABLE dbo.Perfumes ADD description NVARCHAR(MAX) NULL""",
+    ], sqlite=[
+        _sqlite_add_column("Perfumes", "description", "TEXT"),
+    ]),
+
+    # One typed row per perfume with its votes, stats and percentages pivoted out of the EAV tables,
+    # rewritten in the perfume's own transaction, so charts read one row instead of grouping ~35.
+    Migration(7, "PerfumeSummary pivot of votes, stats and percentages", mssql=[
+        "IF OBJECT_ID(N'dbo.PerfumeSummary', N'U') IS NULL" + _summary_table(
+            "CREATE TABLE", "INT", "FOREIGN KEY REFERENCES Perfumes(perfume_id) ON DELETE CASCADE",
+            _summary_columns("INT", "DECIMAL(3, 2)", "DECIMAL(5, 2)")),
+        _summary_backfill(),
+    ], sqlite=[
+        _summary_table("CREATE TABLE IF NOT EXISTS", "INTEGER", "REFERENCES Perfumes(perfume_id) ON DELETE CASCADE",
+                       _summary_columns("INTEGER", "REAL", "REAL")),
+        _summary_backfill(),
+    ]),
+
+    # Review texts move to ReviewBodies, stored once per distinct text (hash key, gzip body; see
+    # utilities.storage.review_body_hash / compress_review). A recrawl then rewrites only the small Reviews
+    # rows, and copy-pasted reviews share one body. Existing texts are moved over and review_content emptied.
+    Migration(8, "Deduplicated, compressed ReviewBodies referenced from Reviews", mssql=[
+        """
+        IF OBJECT_ID(N'dbo.ReviewBodies', N'U') IS NULL
+        CREATE TABLE ReviewBodies (
+            body_hash BINARY(32) PRIMARY KEY,
+            body VARBINARY(MAX) NOT NULL
+        )""",
+        """
+        IF COL_LENGTH(N'dbo.Reviews', N'body_hash') IS NULL
+        ALTER TABLE dbo.Reviews
+            ADD body_hash BINARY(32) NULL CONSTRAINT FK_Reviews_ReviewBodies REFERENCES ReviewBodies(body_hash)""",
+        """
+        INSERT INTO ReviewBodies (body_hash, body)
+        SELECT src.body_hash, COMPRESS(src.review_content)
+        FROM (
+            SELECT CAST(HASHBYTES('SHA2_256', review_content) AS BINARY(32)) AS body_hash, review_content,
+                   ROW_NUMBER() OVER (PARTITION BY HASHBYTES('SHA2_256', review_content) ORDER BY review_id) AS copy
+            FROM Reviews
+            WHERE review_content IS NOT NULL
+        ) src
+        WHERE src.copy = 1 AND NOT EXISTS (SELECT 1 FROM ReviewBodies b WHERE b.body_hash = src.body_hash)""",
+        """
+        UPDATE Reviews SET body_hash = CAST(HASHBYTES('SHA2_256', review_content) AS BINARY(32)), review_content = NULL
+        WHERE review_content IS NOT NULL""",
+        _mssql_index("IX_Reviews_body_hash", "Reviews", "body_hash"),
+    ], sqlite=[
+        """
+        CREATE TABLE IF NOT EXISTS ReviewBodies (
+            body_hash BLOB PRIMARY KEY,
+            body BLOB NOT NULL
+        ) WITHOUT ROWID""",
+        _sqlite_add_column("Reviews", "body_hash", "BLOB REFERENCES ReviewBodies(body_hash)"),
+        # review_body_hash() and compress_review() are registered on the connection by SQLiteManager
+        """
+        INSERT OR IGNORE INTO ReviewBodies (body_hash, body)
+        SELECT review_body_hash(review_content), compress_review(review_content)
+        FROM Reviews WHERE review_content IS NOT NULL""",
+        """
+        UPDATE Reviews SET body_hash = review_body_hash(review_content), review_content = NULL
+        WHERE review_content IS NOT NULL""",
+        _sqlite_index("IX_Reviews_body_hash", "Reviews", "body_hash"),
+    ]),
+
+    # Transactional outbox (utilities/change_events.py): each perfume save appends its change events in the
+    # same transaction, and consumers read them in event_id order from their own cursor. No foreign key to
+    # Perfumes: the log is append-only and outlives the rows it describes. AUTOINCREMENT keeps SQLite from
+    # reusing ids once pruning has emptied the table, which would hide new events behind existing cursors.
+    Migration(9, "ChangeEvents outbox and ConsumerCursors", mssql=[
+        """
+        IF OBJECT_ID(N'dbo.ChangeEvents', N'U') IS NULL
+        CREATE TABLE ChangeEvents (
+            event_id BIGINT IDENTITY(1,1) PRIMARY KEY,
+            perfume_id INT NOT NULL,
+            event_type VARCHAR(30) NOT NULL,
+            payload NVARCHAR(MAX) NOT NULL,
+            created_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        )""",
+        """
+        IF OBJECT_ID(N'dbo.ConsumerCursors', N'U') IS NULL
+        CREATE TABLE ConsumerCursors (
+            consumer NVARCHAR(100) PRIMARY KEY,
+            last_event_id BIGINT NOT NULL,
+            updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        )""",
+    ], sqlite=[
+        """
+        CREATE TABLE IF NOT EXISTS ChangeEvents (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            perfume_id INTEGER NOT NULL,
+            event_type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        )""",
+        """
+        CREATE TABLE IF NOT EXISTS ConsumerCursors (
+            consumer TEXT PRIMARY KEY,
+            last_event_id INTEGER NOT NULL,
+            updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        )""",
+    ]),
+
+    # Brand-page discovery (scraper/discovery.py): the perfume count and the hash of the perfume links seen when
+    # the brand page was last crawled, so a page is only fetched again once data/brands.json reports a new count.
+    Migration(10, "Brands discovery state", mssql=[
+        """
+        IF COL_LENGTH(N'dbo.Brands', N'discovered_count') IS NULL
+        ALTER TABLE dbo.Brands ADD discovered_count INT NULL, page_hash BINARY(32) NULL, discovered_at DATETIME2 NULL""",
+    ], sqlite=[
+        _sqlite_add_column("Brands", "discovered_count", "INTEGER"),
+        _sqlite_add_column("Brands", "page_hash", "BLOB"),
+        _sqlite_add_column("Brands", "discovered_at", "TEXT"),
+    ]),
+
+    # Derived metrics of every perfume (utilities/perfume_metrics.py): Bayesian-weighted rating, vote-weighted
+    # longevity/sillage scores and the season profile. Rebuilt as a whole by the batch job, never per save.
+    Migration(11, "PerfumeMetrics derived from votes, stats and percentages", mssql=[
+        """
+        IF OBJECT_ID(N'dbo.PerfumeMetrics', N'U') IS NULL
+        CREATE TABLE PerfumeMetrics (
+            perfume_id INT PRIMARY KEY FOREIGN KEY REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            rating_count INT NULL,
+            rating_value DECIMAL(3, 2) NULL,
+            weighted_rating DECIMAL(4, 3) NULL,
+            longevity_votes INT NULL,
+            longevity_score DECIMAL(4, 3) NULL,
+            sillage_votes INT NULL,
+            sillage_score DECIMAL(4, 3) NULL,
+            winter_share DECIMAL(4, 3) NULL,
+            spring_share DECIMAL(4, 3) NULL,
+            summer_share DECIMAL(4, 3) NULL,
+            fall_share DECIMAL(4, 3) NULL,
+            day_share DECIMAL(4, 3) NULL,
+            night_share DECIMAL(4, 3) NULL,
+            dominant_season VARCHAR(10) NULL,
+            computed_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        )""",
+        _mssql_index("IX_PerfumeMetrics_weighted_rating", "PerfumeMetrics", "weighted_rating DESC"),
+    ], sqlite=[
+        """
+        CREATE TABLE IF NOT EXISTS PerfumeMetrics (
+            perfume_id INTEGER PRIMARY KEY REFERENCES Perfumes(perfume_id) ON DELETE CASCADE,
+            rating_count INTEGER,
+            rating_value REAL,
+            weighted_rating REAL,
+            longevity_votes INTEGER,
+            longevity_score REAL,
+            sillage_votes INTEGER,
+            sillage_score REAL,
+            winter_share REAL,
+            spring_share REAL,
+            summer_share REAL,
+            fall_share REAL,
+            day_share REAL,
+            night_share REAL,
+            dominant_season TEXT,
+            computed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        )""",
+        _sqlite_index("IX_PerfumeMetrics_weighted_rating", "PerfumeMetrics", "weighted_rating DESC"),
+    ]),
+]
+
+
+def apply_migrations(conn, dialect):
+    """
+    Applies every migration newer than the database's recorded version, each in its own transaction.
+    Works with pyodbc ('mssql') and sqlite3 ('sqlite') connections and returns the resulting version.
+    """
+    cursor = conn.cursor()
+    cursor.execute(VERSION_TABLE[dialect])
+    conn.commit()
+
+    applied = {row[0] for row in cursor.execute("SELECT version FROM SchemaMigrations").fetchall()}
+    for migration in MIGRATIONS:
+        if migration.version in applied:
+            continue
+        logging.info(f"Applying schema migration {migration.version}: {migration.description}")
+        try:
+            for step in migration.steps[dialect]:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute("INSERT INTO SchemaMigrations (version, description) VALUES (?, ?)",
+                           (migration.version, migration.description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.add(migration.version)
+    return max(applied, default=0)
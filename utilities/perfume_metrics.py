@@ -0,0 +1,226 @@
+"""
+Derived metrics of every perfume, computed for the whole catalogue at once.
+
+    python -m utilities.perfume_metrics build [--prior-votes N]   # recompute the PerfumeMetrics table
+    python -m utilities.perfume_metrics show <perfume_id>
+
+PerfumeVotes, PerfumeStats and PerfumePercentages are streamed into NumPy arrays (a row per perfume, a column
+per known label), each metric is computed with array operations across all perfumes, and the results
+replace the PerfumeMetrics table in one bulk write. Nothing loops per perfume.
+"""
+import sys
+import logging
+import argparse
+
+try:
+    import numpy as np
+except ImportError:  # optional: only this job and the similarity index need it
+    np = None
+
+from scraper.models import STAT_LABELS, PERCENTAGE_LABELS
+from utilities.metrics import metrics
+
+# Points of each label on its chart, lowest first: the weighted score is the vote-weighted mean of these
+LONGEVITY_POINTS = dict(zip(STAT_LABELS["longevity"], range(1, 6)))  # very weak 1 .. eternal 5
+SILLAGE_POINTS = dict(zip(STAT_LABELS["sillage"], range(1, 5)))  # intimate 1 .. enormous 4
+SEASONS = PERCENTAGE_LABELS["wearing_season"][:4]  # winter, spring, summer, fall
+TIMES_OF_DAY = PERCENTAGE_LABELS["wearing_season"][4:]  # day, night
+DECIMALS = 3
+
+METRICS_COLUMNS = [
+    "perfume_id", "rating_count", "rating_value", "weighted_rating",
+    "longevity_votes", "longevity_score", "sillage_votes", "sillage_score",
+    "winter_share", "spring_share", "summer_share", "fall_share", "day_share", "night_share", "dominant_season",
+]
+
+VOTES_QUERY = "SELECT perfume_id, rating_count, rating_value FROM PerfumeVotes"
+STATS_QUERY = ("SELECT perfume_id, category, label, vote_count FROM PerfumeStats "
+               "WHERE category IN ('longevity', 'sillage')")
+PERCENTAGES_QUERY = ("SELECT perfume_id, category, label, percentage_value FROM PerfumePercentages "
+                     "WHERE category = 'wearing_season'")
+
+
+def _load_ids(db_manager):
+    ids = np.fromiter((row[0] for rows in db_manager.stream_rows("SELECT perfume_id FROM Perfumes") for row in rows),
+                      dtype=np.int64)
+    ids.sort()
+    return ids
+
+
+def _rows_of(ids, perfume_ids):
+    """Row numbers of perfume_ids in the sorted ids, -1 for ids that are not there."""
+    rows = np.searchsorted(ids, perfume_ids)
+    rows[rows == len(ids)] = 0
+    return np.where(ids[rows] == perfume_ids, rows, -1) if len(ids) else np.full(len(perfume_ids), -1)
+
+
+def _load_pivot(db_manager, query, ids, columns):
+    """
+    Streams (perfume_id, category, label, value) rows into an (n perfumes x len(columns)) float array;
+    columns: {(category, label): column}. Labels missing from a perfume stay NaN.
+    """
+    matrix = np.full((len(ids), len(columns)), np.nan)
+    for rows in db_manager.stream_rows(query):
+        perfume_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        cols = np.fromiter((columns.get((row[1], row[2]), -1) for row in rows), dtype=np.int64, count=len(rows))
+        values = np.array([row[3] for row in rows], dtype=np.float64)
+        positions = _rows_of(ids, perfume_ids)
+        known = (positions >= 0) & (cols >= 0)
+        matrix[positions[known], cols[known]] = values[known]
+    return matrix
+
+
+def load_catalogue(db_manager):
+    """
+    ids (sorted perfume ids), votes (n x 2: rating_count, rating_value), stats (n x longevity + sillage labels)
+    and seasons (n x SEASONS + TIMES_OF_DAY percentages), NaN where a perfume has no value.
+    """
+    ids = _load_ids(db_manager)
+    votes = np.full((len(ids), 2), np.nan)
+    for rows in db_manager.stream_rows(VOTES_QUERY):
+        perfume_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        values = np.array([(row[1], row[2]) for row in rows], dtype=np.float64)
+        positions = _rows_of(ids, perfume_ids)
+        votes[positions[positions >= 0]] = values[positions >= 0]
+
+    stat_columns = {("longevity", label): i for i, label in enumerate(LONGEVITY_POINTS)}
+    stat_columns.update({("sillage", label): len(LONGEVITY_POINTS) + i for i, label in enumerate(SILLAGE_POINTS)})
+    stats = _load_pivot(db_manager, STATS_QUERY, ids, stat_columns)
+    seasons = _load_pivot(db_manager, PERCENTAGES_QUERY, ids,
+                          {("wearing_season", label): i for i, label in enumerate(SEASONS + TIMES_OF_DAY)})
+    return ids, votes, stats, seasons
+
+
+def bayesian_rating(counts, ratings, prior_votes=None):
+    """
+    (weighted ratings, prior mean C, prior votes m): (v * R + m * C) / (v + m) per perfume, shrinking ratings
+    with few votes towards the catalogue mean C. m defaults to the median vote count of rated perfumes.
+    Perfumes without a votes row get NaN.
+    """
+    missing = np.isnan(counts)
+    v = np.where(missing, 0.0, counts)
+    r = np.nan_to_num(ratings)
+    rated = v > 0
+    if not rated.any():
+        return np.full(len(counts), np.nan), float("nan"), 0.0
+    mean = float((r[rated] * v[rated]).sum() / v[rated].sum())
+    m = float(np.median(v[rated])) if prior_votes is None else float(prior_votes)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weighted = (v * r + m * mean) / (v + m)
+    weighted[missing] = np.nan
+    if m == 0:
+        weighted[~rated & ~missing] = np.nan  # no prior and no votes: nothing to say
+    return weighted, mean, m
+
+
+def weighted_score(votes, points):
+    """(vote totals, vote-weighted mean of points) per row; the score is NaN for rows without votes."""
+    counts = np.nan_to_num(votes)
+    totals = counts.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = counts @ np.asarray(points, dtype=np.float64) / totals
+    scores[totals == 0] = np.nan
+    return totals, scores
+
+
+def shares(percentages):
+    """Each row's bars as shares summing to 1 (the chart bars are independent 0-100 widths), NaN when all 0."""
+    values = np.nan_to_num(percentages)
+    totals = values.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = values / totals
+    result[totals[:, 0] == 0] = np.nan
+    return result
+
+
+def compute_metrics(ids, votes, stats, seasons, prior_votes=None):
+    """Every METRICS_COLUMNS column as an array over the catalogue, plus the Bayesian prior used."""
+    weighted, mean, m = bayesian_rating(votes[:, 0], votes[:, 1], prior_votes)
+    longevity = stats[:, :len(LONGEVITY_POINTS)]
+    sillage = stats[:, len(LONGEVITY_POINTS):]
+    longevity_votes, longevity_score = weighted_score(longevity, list(LONGEVITY_POINTS.values()))
+    sillage_votes, sillage_score = weighted_score(sillage, list(SILLAGE_POINTS.values()))
+    season_shares = shares(seasons[:, :len(SEASONS)])
+    time_shares = shares(seasons[:, len(SEASONS):])
+    dominant = np.where(np.isnan(season_shares[:, 0]), -1, np.argmax(np.nan_to_num(season_shares), axis=1))
+
+    columns = {
+        "perfume_id": ids,
+        "rating_count": votes[:, 0],
+        "rating_value": votes[:, 1],
+        "weighted_rating": weighted,
+        "longevity_votes": np.where(np.isnan(longevity).all(axis=1), np.nan, longevity_votes),
+        "longevity_score": longevity_score,
+        "sillage_votes": np.where(np.isnan(sillage).all(axis=1), np.nan, sillage_votes),
+        "sillage_score": sillage_score,
+    }
+    columns.update({f"{season}_share": season_shares[:, i] for i, season in enumerate(SEASONS)})
+    columns.update({f"{time}_share": time_shares[:, i] for i, time in enumerate(TIMES_OF_DAY)})
+    columns["dominant_season"] = dominant
+    return columns, mean, m
+
+
+def metrics_rows(columns):
+    """The computed arrays as PerfumeMetrics rows (tuples in METRICS_COLUMNS order, None for NaN)."""
+    names = list(SEASONS)
+    as_lists = []
+    for name in METRICS_COLUMNS:
+        values = columns[name]
+        if name == "dominant_season":
+            as_lists.append([names[i] if i >= 0 else None for i in values.tolist()])
+        elif name in ("perfume_id", "rating_count", "longevity_votes", "sillage_votes"):
+            as_lists.append([None if value != value else int(value) for value in values.tolist()])
+        else:
+            as_lists.append([None if value != value else value
+                             for value in np.round(values, DECIMALS).tolist()])
+    return list(zip(*as_lists))
+
+
+def build_metrics(db_manager, prior_votes=None):
+    """Recomputes PerfumeMetrics for the whole catalogue. Returns the number of perfumes written."""
+    if np is None:
+        raise RuntimeError("numpy is required for the perfume metrics job: pip install numpy")
+    with metrics.timer("perfume_metrics.load"):
+        ids, votes, stats, seasons = load_catalogue(db_manager)
+    with metrics.timer("perfume_metrics.compute"):
+        columns, mean, m = compute_metrics(ids, votes, stats, seasons, prior_votes)
+        rows = metrics_rows(columns)
+    with metrics.timer("perfume_metrics.write"):
+        db_manager.replace_perfume_metrics(METRICS_COLUMNS, rows)
+    metrics.set_gauge("perfume_metrics.perfumes", len(rows))
+    metrics.set_gauge("perfume_metrics.prior_mean", round(mean, DECIMALS) if mean == mean else None)
+    metrics.set_gauge("perfume_metrics.prior_votes", m)
+    logging.info(f"📊 Metrics of {len(rows)} perfumes written "
+                 f"(Bayesian prior: mean rating {mean:.3f}, {m:g} votes).")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    from utilities.storage import get_db_manager
+    from utilities.log_utils import setup_logging
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Catalogue-wide derived perfume metrics (PerfumeMetrics).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Recompute the metrics of every perfume.")
+    build_parser.add_argument("--prior-votes", type=float,
+                              help="Votes of the Bayesian prior (default: median vote count of rated perfumes).")
+    show_parser = commands.add_parser("show", help="Print the metrics of one perfume.")
+    show_parser.add_argument("perfume_id", type=int)
+    args = parser.parse_args()
+
+    db_manager = get_db_manager()
+    try:
+        if args.command == "build":
+            db_manager.create_tables()
+            build_metrics(db_manager, args.prior_votes)
+            metrics.export()
+        else:
+            query = f"SELECT {', '.join(METRICS_COLUMNS)}, computed_at FROM PerfumeMetrics WHERE perfume_id = ?"
+            found = [row for rows in db_manager.stream_rows(query, (args.perfume_id,)) for row in rows]
+            if not found:
+                sys.exit(f"No metrics for PerfumeID {args.perfume_id} (run `build` first).")
+            for name, value in zip(METRICS_COLUMNS + ["computed_at"], found[0]):
+                print(f"{name:<18} {value}")
+    finally:
+        db_manager.close()
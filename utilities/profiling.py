@@ -0,0 +1,227 @@
+"""
+On-demand profiling of single URLs.
+
+    python main.py --profile-slower-than 120            # keep the profile of every URL that took over 2 minutes
+    python main.py --profile-every 50 --profile-memory  # profile every 50th URL, allocations too
+    python -m utilities.profiling profiles/              # hottest functions across all saved profiles
+
+Each kept URL leaves <name>.prof (cProfile, also readable by pstats/snakeviz), <name>.json (URL, seconds, peak
+traced memory) and with --profile-memory <name>.tracemalloc (a tracemalloc snapshot) in the profile folder.
+"""
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import argparse
+import itertools
+import threading
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+from collections import defaultdict
+
+from utilities.metrics import increment
+
+PROFILE_DIR = "profiles"
+MEMORY_FRAMES = 10  # stack frames kept per allocation; more frames cost more memory while tracing
+TOP = 15
+
+# Where time goes, by source file. The first component whose pattern is in the path wins.
+COMPONENTS = [
+    ("extractor", ("scraper/extractor.py", "scraper/extraction_plan.py", "scraper/review_parser.py",
+                   "scraper/models.py")),
+    ("storage", ("utilities/dbmanager.py", "utilities/sqlite_manager.py", "utilities/storage.py",
+                 "utilities/migrations.py")),
+    ("scraper", ("scraper/",)),
+    ("parsing", ("bs4/", "soupsieve/", "html/parser.py", "lxml")),
+    ("browser", ("selenium/", "undetected_chromedriver/", "DrissionPage/", "websocket")),
+    ("database driver", ("pyodbc", "sqlite3")),
+    ("network", ("socket", "ssl", "select.", "selectors.py")),
+]
+
+
+def component(filename, function=""):
+    # Built-in functions have no file ('~'); their name says where they come from, e.g. 'sqlite3.Cursor' objects
+    path = (function if filename == "~" else filename).replace("\\", "/")
+    for name, patterns in COMPONENTS:
+        if any(pattern in path for pattern in patterns):
+            return name
+    return "other"
+
+
+class URLProfiler:
+    """
+    Wraps the processing of one URL in cProfile (and tracemalloc with memory=True) when it is sampled:
+    every `every`-th URL (the first one included), or every URL when slower_than is set, of which only the ones
+    that took at least slower_than seconds are saved. Disabled until configure() turns it on.
+    cProfile only sees the thread it runs in, so one URL is profiled at a time; URLs that start while another
+    one is being profiled run unprofiled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self.configure()
+
+    def configure(self, folder=PROFILE_DIR, every=None, slower_than=None, memory=False, frames=MEMORY_FRAMES):
+        self.folder = folder
+        self.every = every
+        self.slower_than = slower_than
+        self.memory = memory
+        self.frames = frames
+        self.enabled = bool(every) or slower_than is not None
+
+    @contextmanager
+    def profile(self, url):
+        if not self.enabled:
+            yield
+            return
+        sampled = bool(self.every) and next(self._counter) % self.every == 0
+        if not (sampled or self.slower_than is not None) or not self._lock.acquire(blocking=False):
+            yield
+            return
+
+        trace_memory = self.memory and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start(self.frames)
+        profile = cProfile.Profile()
+        failed = False
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            profile.disable()
+            seconds = time.perf_counter() - start
+            snapshot = peak = None
+            if trace_memory:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            self._lock.release()
+            slow = self.slower_than is not None and seconds >= self.slower_than
+            if sampled or slow:
+                self._save(url, seconds, failed, "slow" if slow else "sampled", profile, snapshot, peak)
+
+    def _save(self, url, seconds, failed, reason, profile, snapshot, peak):
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            slug = re.sub(r"[^\w.-]+", "_", url.rstrip("/").rsplit("/", 1)[-1])[:80]
+            base = os.path.join(self.folder, f"{datetime.now():%Y%m%dT%H%M%S%f}-{slug}")
+            profile.dump_stats(f"{base}.prof")
+            if snapshot is not None:
+                snapshot.dump(f"{base}.tracemalloc")
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump({"url": url, "seconds": round(seconds, 3), "failed": failed, "reason": reason,
+                           "peak_traced_bytes": peak, "created_at": datetime.now().isoformat()}, f, indent=2)
+            increment("profiles_saved")
+            logging.info(f"🧪 Saved profile of {url} ({seconds:.1f}s, {reason}) to {base}.prof")
+        except OSError as e:
+            logging.warning(f"Could not save the profile of {url}: {e}")
+
+
+profiler = URLProfiler()
+
+
+def add_profiling_arguments(parser):
+    """The --profile-* options of the crawl entry points."""
+    parser.add_argument("--profile-every", type=int, metavar="N", help="Profile every N-th URL (1: all of them).")
+    parser.add_argument("--profile-slower-than", type=float, metavar="SECONDS",
+                        help="Profile every URL, keeping the profiles of the ones that took at least this long.")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Also trace allocations of profiled URLs with tracemalloc (slower).")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR, help="Folder for the saved profiles.")
+
+
+def configure_profiler(args):
+    profiler.configure(folder=args.profile_dir, every=args.profile_every, slower_than=args.profile_slower_than,
+                       memory=args.profile_memory)
+    if profiler.enabled:
+        logging.info(f"🧪 Profiling URLs into {args.profile_dir} (summary: python -m utilities.profiling).")
+
+
+# --- Summary of a profile folder ---
+
+def load_profiles(folder):
+    """[(metadata dict, .prof path, .tracemalloc path or None)] for every profile saved in folder."""
+    profiles = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".json"):
+            continue
+        base = os.path.join(folder, name[:-len(".json")])
+        if not os.path.exists(f"{base}.prof"):
+            continue
+        with open(f"{base}.json", "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        profiles.append((metadata, f"{base}.prof",
+                         f"{base}.tracemalloc" if os.path.exists(f"{base}.tracemalloc") else None))
+    return profiles
+
+
+def hottest_functions(prof_paths, top=TOP):
+    """
+    Merges the profiles and returns ({component: own seconds}, {component: [(cumulative s, own s, calls,
+    'file:line(function)')]}), functions ranked by cumulative time within their component.
+    """
+    stats = pstats.Stats(*prof_paths).stats
+    own_time = defaultdict(float)
+    functions = defaultdict(list)
+    for (filename, line, function), (_, calls, own, cumulative, _) in stats.items():
+        name = component(filename, function)
+        own_time[name] += own
+        functions[name].append((cumulative, own, calls, f"{os.path.basename(filename)}:{line}({function})"))
+    return dict(own_time), {name: sorted(rows, reverse=True)[:top] for name, rows in functions.items()}
+
+
+def top_allocations(snapshot_paths, top=TOP):
+    """Allocation sites by their largest size in any one snapshot: [(max bytes, snapshots, 'file:line')]."""
+    sizes = defaultdict(list)
+    for path in snapshot_paths:
+        for stat in tracemalloc.Snapshot.load(path).statistics("lineno"):
+            frame = stat.traceback[0]
+            sizes[f"{frame.filename}:{frame.lineno}"].append(stat.size)
+    return sorted(((max(values), len(values), site) for site, values in sizes.items()), reverse=True)[:top]
+
+
+def summarize(folder=PROFILE_DIR, top=TOP, out=sys.stdout):
+    profiles = load_profiles(folder)
+    if not profiles:
+        print(f"No profiles in {folder}.", file=out)
+        return
+    print(f"{len(profiles)} profiled URL(s) in {folder}\n\nSlowest URLs:", file=out)
+    for metadata, _, _ in sorted(profiles, key=lambda p: p[0]["seconds"], reverse=True)[:top]:
+        failed = " (failed)" if metadata.get("failed") else ""
+        print(f"  {metadata['seconds']:>9.1f}s  {metadata['url']}{failed}", file=out)
+
+    own_time, functions = hottest_functions([prof for _, prof, _ in profiles], top)
+    total = sum(own_time.values()) or 1
+    print("\nOwn time by component:", file=out)
+    for name, seconds in sorted(own_time.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name:<16}{seconds:>10.2f}s {seconds / total:>6.1%}", file=out)
+    for name, _ in COMPONENTS[:3]:
+        if name not in functions:
+            continue
+        print(f"\nHottest {name} functions (cumulative s, own s, calls):", file=out)
+        for cumulative, own, calls, function in functions[name]:
+            print(f"  {cumulative:>9.2f} {own:>9.2f} {calls:>9}  {function}", file=out)
+
+    snapshots = [snapshot for _, _, snapshot in profiles if snapshot]
+    if snapshots:
+        print(f"\nLargest allocation sites across {len(snapshots)} snapshot(s) (max MiB, snapshots):", file=out)
+        for size, count, site in top_allocations(snapshots, top):
+            print(f"  {size / 2 ** 20:>9.2f} {count:>5}  {site}", file=out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hottest functions and allocation sites across saved profiles.")
+    parser.add_argument("folder", nargs="?", default=PROFILE_DIR)
+    parser.add_argument("--top", type=int, default=TOP, help="Rows per table.")
+    args = parser.parse_args()
+    summarize(args.folder, args.top)
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import logging
+import itertools
+from datetime import datetime
+from utilities.errors import classify_error, CLOUDFLARE_BLOCK, TIMEOUT, PARSE_FAILURE, DB_FAILURE, UNKNOWN
+from utilities.file_utils import failed_url
+from utilities.checkpoint import CheckpointStore
+from utilities.metrics import increment
+
+DEAD_LETTER_FILE = "data/dead_letter.json"
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts, base_delay, max_delay):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, rng=random):
+        """Exponential backoff with jitter: uniformly between half and all of base * 2^(attempt-1), capped."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return ceiling / 2 + rng.uniform(0, ceiling / 2)
+
+
+# Attempts include the first try. Cloudflare blocks back off hardest, DB hiccups retry fastest,
+# and a page that fails to parse twice is almost certainly not a perfume page.
+RETRY_POLICIES = {
+    CLOUDFLARE_BLOCK: RetryPolicy(max_attempts=4, base_delay=120, max_delay=30 * 60),
+    TIMEOUT: RetryPolicy(max_attempts=4, base_delay=30, max_delay=10 * 60),
+    PARSE_FAILURE: RetryPolicy(max_attempts=2, base_delay=60, max_delay=5 * 60),
+    DB_FAILURE: RetryPolicy(max_attempts=5, base_delay=10, max_delay=5 * 60),
+    UNKNOWN: RetryPolicy(max_attempts=3, base_delay=60, max_delay=10 * 60),
+}
+
+
+class RetryItem:
+    __slots__ = ("url", "attempt", "kind", "error")
+
+    def __init__(self, url, attempt, kind, error):
+        self.url = url
+        self.attempt = attempt
+        self.kind = kind
+        self.error = error
+
+
+class RetryQueue:
+    """
+    In-run retry lane. Failed URLs wait here until their backoff expires while the main queue keeps moving;
+    URLs that run out of attempts are parked in the dead-letter store.
+    """
+
+    def __init__(self, dead_letters=None, policies=None, clock=time.monotonic, rng=random):
+        self.dead_letters = dead_letters if dead_letters is not None else DeadLetterStore()
+        self.policies = policies or RETRY_POLICIES
+        self.clock = clock
+        self.rng = rng
+        self._heap = []
+        self._seq = itertools.count()
+        self._attempts = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def record_failure(self, url, exc):
+        """Schedules another attempt for url, or dead-letters it. Returns True if a retry was scheduled."""
+        kind = classify_error(exc)
+        attempt = self._attempts.get(url, 0) + 1
+        self._attempts[url] = attempt
+        policy = self.policies.get(kind, self.policies[UNKNOWN])
+
+        if attempt >= policy.max_attempts:
+            logging.error(f"☠️ Giving up on {url} after {attempt} attempt(s) ({kind}): {exc}")
+            increment(f"retry_dead_lettered.{kind}")
+            self.dead_letters.add(url, kind, attempt, str(exc))
+            self._attempts.pop(url, None)
+            failed_url(url)
+            return False
+
+        delay = policy.delay(attempt, self.rng)
+        heapq.heappush(self._heap, (self.clock() + delay, next(self._seq), RetryItem(url, attempt, kind, str(exc))))
+        increment(f"retry_scheduled.{kind}")
+        logging.warning(f"🔁 Retrying {url} in {delay:.0f}s (attempt {attempt + 1}/{policy.max_attempts}, {kind}).")
+        return True
+
+    def record_success(self, url):
+        if self._attempts.pop(url, None):
+            increment("retry_succeeded")
+
+    def pop_due(self, limit=None):
+        """Removes and returns the retries whose backoff has expired, oldest first."""
+        due = []
+        now = self.clock()
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def seconds_until_next(self):
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self.clock())
+
+
+class DeadLetterStore:
+    """Permanent failures, kept in a JSON file so they are skipped by later runs until requeued."""
+
+    def __init__(self, path=DEAD_LETTER_FILE):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return []
+
+    def _save(self, entries):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def add(self, url, kind, attempts, error):
+        entries = [entry for entry in self.load() if entry["url"] != url]
+        entries.append({"time": datetime.now().isoformat(), "url": url, "kind": kind,
+                        "attempts": attempts, "error": error})
+        self._save(entries)
+
+    def urls(self):
+        return {entry["url"] for entry in self.load()}
+
+    def requeue(self, urls=None):
+        """Removes the given URLs (or all of them) so the next run scrapes them again. Returns the removed URLs."""
+        entries = self.load()
+        removed = [entry["url"] for entry in entries if urls is None or entry["url"] in urls]
+        self._save([entry for entry in entries if entry["url"] not in removed])
+        return removed
+
+
+if __name__ == "__main__":
+    store = DeadLetterStore()
+    if len(sys.argv) >= 2 and sys.argv[1] == "list":
+        for entry in store.load():
+            print(f"{entry['time']}  {entry['kind']:<17} x{entry['attempts']}  {entry['url']}  {entry['error']}")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "requeue":
+        requeued = store.requeue(set(sys.argv[2:]) or None)
+        CheckpointStore().discard_fetched(requeued)  # a requeued URL starts from a fresh fetch
+        print(f"Requeued {len(requeued)} URL(s).")
+    else:
+        sys.exit("usage: python -m utilities.retry list | requeue [url ...]")
@@ -0,0 +1,233 @@
+import os
+import re
+import sys
+import sqlite3
+import logging
+import threading
+
+from utilities.metrics import metrics
+from utilities.storage import decompress_review
+
+SEARCH_DB = "data/search.db"
+BATCH_SIZE = 5000
+
+# External-content FTS5 tables: the *_docs tables hold the text once, the triggers keep the full-text
+# indexes in step, and deleting a perfume's docs (indexed on perfume_id) removes them from the index.
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS perfume_docs (
+        perfume_id INTEGER PRIMARY KEY,
+        perfume_name TEXT,
+        brand_name TEXT,
+        description TEXT
+    )""",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS perfume_fts USING fts5(
+        perfume_name, brand_name, description,
+        content='perfume_docs', content_rowid='perfume_id', tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """
+    CREATE TRIGGER IF NOT EXISTS perfume_docs_ai AFTER INSERT ON perfume_docs BEGIN
+        INSERT INTO perfume_fts (rowid, perfume_name, brand_name, description)
+        VALUES (new.perfume_id, new.perfume_name, new.brand_name, new.description);
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS perfume_docs_ad AFTER DELETE ON perfume_docs BEGIN
+        INSERT INTO perfume_fts (perfume_fts, rowid, perfume_name, brand_name, description)
+        VALUES ('delete', old.perfume_id, old.perfume_name, old.brand_name, old.description);
+    END""",
+    """
+    CREATE TABLE IF NOT EXISTS review_docs (
+        doc_id INTEGER PRIMARY KEY,
+        perfume_id INTEGER NOT NULL,
+        reviewer_name TEXT,
+        review_date TEXT,
+        review_content TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS IX_review_docs_perfume_id ON review_docs (perfume_id)",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS review_fts USING fts5(
+        review_content,
+        content='review_docs', content_rowid='doc_id', tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """
+    CREATE TRIGGER IF NOT EXISTS review_docs_ai AFTER INSERT ON review_docs BEGIN
+        INSERT INTO review_fts (rowid, review_content) VALUES (new.doc_id, new.review_content);
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS review_docs_ad AFTER DELETE ON review_docs BEGIN
+        INSERT INTO review_fts (review_fts, rowid, review_content) VALUES ('delete', old.doc_id, old.review_content);
+    END""",
+]
+
+
+def match_expression(text):
+    """Plain keywords -> an FTS5 query matching documents that contain all of them (punctuation is ignored)."""
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"' for word in words)
+
+
+class SearchIndex:
+    """
+    Keyword search over review texts and perfume names/descriptions, in a local SQLite FTS5 file
+    so searches never touch the production database.
+
+    build() loads it from the database once; afterwards on_save (hooked to Extractor.add_save_listener)
+    replaces a perfume's documents in one transaction whenever the perfume is written.
+    """
+
+    def __init__(self, path=SEARCH_DB):
+        self.path = path
+        self.conn = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def exists(path=SEARCH_DB):
+        return os.path.exists(path)
+
+    def _connect(self):
+        if self.conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            self.conn.commit()
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # --- Write side ---
+
+    def on_save(self, perfume_id, perfume):
+        """Extractor save listener."""
+        self.index_perfume(perfume_id, perfume.name, perfume.brand_name, perfume.description,
+                           ([(r.reviewer_name, r.review_date, r.content) for r in chunk]
+                            for chunk in perfume.review_chunks()))
+
+    def index_perfume(self, perfume_id, perfume_name, brand_name, description, review_chunks):
+        """Replaces the documents of one perfume. review_chunks: lists of (reviewer_name, review_date, content)."""
+        with self._lock, metrics.timer("search_index.update"):
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM review_docs WHERE perfume_id = ?", (perfume_id,))
+                conn.execute("DELETE FROM perfume_docs WHERE perfume_id = ?", (perfume_id,))
+                conn.execute("INSERT INTO perfume_docs (perfume_id, perfume_name, brand_name, description) "
+                             "VALUES (?, ?, ?, ?)", (perfume_id, perfume_name, brand_name, description))
+                for chunk in review_chunks:
+                    conn.executemany("INSERT INTO review_docs (perfume_id, reviewer_name, review_date, review_content) "
+                                     "VALUES (?, ?, ?, ?)", [(perfume_id, *review) for review in chunk])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def build(self, db_manager):
+        """Reloads every perfume and review from the database. Returns (perfumes, reviews) indexed."""
+        with self._lock, metrics.timer("search_index.build"):
+            conn = self._connect()
+            counts = [0, 0]
+            try:
+                conn.execute("DELETE FROM review_docs")
+                conn.execute("DELETE FROM perfume_docs")
+                for rows in db_manager.stream_rows(
+                        "SELECT p.perfume_id, p.perfume_name, b.brand_name, p.description "
+                        "FROM Perfumes p LEFT JOIN Brands b ON b.id = p.brand_id", batch_size=BATCH_SIZE):
+                    conn.executemany("INSERT INTO perfume_docs (perfume_id, perfume_name, brand_name, description) "
+                                     "VALUES (?, ?, ?, ?)", rows)
+                    counts[0] += len(rows)
+                for rows in db_manager.stream_rows(
+                        "SELECT r.perfume_id, r.reviewer_name, r.review_date, b.body "
+                        "FROM Reviews r LEFT JOIN ReviewBodies b ON b.body_hash = r.body_hash", batch_size=BATCH_SIZE):
+                    conn.executemany("INSERT INTO review_docs (perfume_id, reviewer_name, review_date, review_content) "
+                                     "VALUES (?, ?, ?, ?)",
+                                     [(*row[:2], _text(row[2]), decompress_review(row[3])) for row in rows])
+                    counts[1] += len(rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            # Merge the b-tree segments written during the bulk load
+            conn.execute("INSERT INTO perfume_fts (perfume_fts) VALUES ('optimize')")
+            conn.execute("INSERT INTO review_fts (review_fts) VALUES ('optimize')")
+            conn.commit()
+        logging.info(f"🔎 Search index built: {counts[0]} perfumes, {counts[1]} reviews.")
+        return tuple(counts)
+
+    # --- Query side ---
+
+    def search_reviews(self, query, limit=20, perfume_id=None, raw=False):
+        """
+        Best-matching reviews first (BM25). `query` is plain keywords, or FTS5 syntax with raw=True
+        (phrases, OR, NOT, prefix*). Returns dicts with perfume_id, reviewer_name, review_date and a snippet.
+        """
+        sql = ("SELECT d.perfume_id, d.reviewer_name, d.review_date, "
+               "snippet(review_fts, 0, '[', ']', '…', 16), bm25(review_fts) AS rank "
+               "FROM review_fts JOIN review_docs d ON d.doc_id = review_fts.rowid WHERE review_fts MATCH ?")
+        params = [query if raw else match_expression(query)]
+        if perfume_id is not None:
+            sql += " AND d.perfume_id = ?"
+            params.append(perfume_id)
+        rows = self._query(sql + " ORDER BY rank LIMIT ?", params + [limit])
+        return [{"perfume_id": row[0], "reviewer_name": row[1], "review_date": row[2], "snippet": row[3],
+                 "rank": row[4]} for row in rows]
+
+    def search_perfumes(self, query, limit=20, raw=False):
+        """Perfumes whose name, brand or description match, best first."""
+        rows = self._query(
+            "SELECT d.perfume_id, d.perfume_name, d.brand_name, snippet(perfume_fts, 2, '[', ']', '…', 16), "
+            "bm25(perfume_fts, 10.0, 5.0, 1.0) AS rank "
+            "FROM perfume_fts JOIN perfume_docs d ON d.perfume_id = perfume_fts.rowid WHERE perfume_fts MATCH ? "
+            "ORDER BY rank LIMIT ?", [query if raw else match_expression(query), limit])
+        return [{"perfume_id": row[0], "perfume_name": row[1], "brand_name": row[2], "snippet": row[3],
+                 "rank": row[4]} for row in rows]
+
+    def _query(self, sql, params):
+        if not params[0]:
+            return []
+        with self._lock, metrics.timer("search_index.query"):
+            return self._connect().execute(sql, params).fetchall()
+
+
+def _text(value):
+    """SQL Server returns review_date as a date."""
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def attach_search_index(extractor, path=SEARCH_DB):
+    """Keeps an already built search index up to date as the extractor saves perfumes. Returns the index or None."""
+    if not SearchIndex.exists(path):
+        return None
+    index = SearchIndex(path)
+    extractor.add_save_listener(index.on_save)
+    logging.info(f"🔎 Search index at {path} will be updated as perfumes are saved.")
+    return index
+
+
+if __name__ == "__main__":
+    from utilities.log_utils import setup_logging
+
+    setup_logging()
+    command, words = (sys.argv[1], " ".join(sys.argv[2:])) if len(sys.argv) >= 2 else (None, "")
+    index = SearchIndex()
+    if command == "build":
+        from utilities.storage import get_db_manager
+        db_manager = get_db_manager()
+        try:
+            index.build(db_manager)
+        finally:
+            db_manager.close()
+    elif command == "reviews" and words:
+        for hit in index.search_reviews(words):
+            print(f"{hit['perfume_id']:>7}  {hit['review_date'] or '':<10}  {hit['snippet']}")
+    elif command == "perfumes" and words:
+        for hit in index.search_perfumes(words):
+            print(f"{hit['perfume_id']:>7}  {hit['perfume_name']} ({hit['brand_name']})  {hit['snippet']}")
+    else:
+        sys.exit("usage: python -m utilities.search_index build | reviews <words> | perfumes <words>")
+    index.close()
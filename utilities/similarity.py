@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import logging
+import threading
+from datetime import datetime
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:  # optional: only the similarity index needs it
+    np = None
+
+from utilities.metrics import metrics
+
+SIMILARITY_DIR = "data/similarity"
+TOP_K = 20  # neighbours kept per perfume
+BLOCK = 2048  # rows per dense block while building (BLOCK x features float32 matrices)
+NOTE_WEIGHTS = {"top": 0.6, "middle": 0.8, "base": 1.0, "linear": 0.8}  # base notes define a scent the longest
+
+ACCORDS_QUERY = """
+    SELECT pa.perfume_id, a.accord_name, pa.accord_strength
+    FROM PerfumeAccords pa JOIN Accords a ON a.accord_id = pa.accord_id"""
+NOTES_QUERY = """
+    SELECT pn.perfume_id, n.note_name, pn.note_level
+    FROM PerfumeNotes pn JOIN Notes n ON n.note_id = pn.note_id"""
+
+# Files of the on-disk index. The arrays are memory-mapped when the index is opened;
+# neighbours/scores are opened read-write so incremental updates patch them in place.
+ARRAYS = ("ids", "row_indptr", "row_indices", "row_values", "col_indptr", "col_rows", "col_values",
+          "neighbours", "scores")
+META_FILE = "meta.json"
+OVERLAY_FILE = "overlay.json"
+
+
+def feature_weights(accords, notes):
+    """
+    Sparse feature vector of a perfume as {feature: weight}, before normalisation.
+    accords: [(name, strength 0-100)], notes: [(name, level)].
+    """
+    weights = {}
+    for name, strength in accords:
+        weights[f"accord:{name}"] = (100.0 if strength is None else float(strength)) / 100.0
+    for name, level in notes:
+        key = f"note:{name}"
+        weights[key] = max(weights.get(key, 0.0), NOTE_WEIGHTS.get(level, NOTE_WEIGHTS["linear"]))
+    return weights
+
+
+def perfume_features(perfume):
+    """feature_weights of a scraper.models.Perfume record."""
+    return feature_weights([(accord.name, accord.strength) for accord in perfume.accords],
+                           [(note.note, note.level) for note in perfume.notes])
+
+
+def _normalised(weights):
+    norm = sum(w * w for w in weights.values()) ** 0.5
+    return {feature: w / norm for feature, w in weights.items()} if norm else {}
+
+
+def _merge(pairs, perfume_id, score, k):
+    """A neighbour list [(perfume_id, score)] with perfume_id's entry replaced by `score`, best k first."""
+    merged = [(pid, s) for pid, s in pairs if pid != perfume_id and pid != -1]
+    if score > 0:
+        merged.append((perfume_id, score))
+    merged.sort(key=lambda pair: -pair[1])
+    return merged[:k]
+
+
+def _dense_rows(indptr, indices, values, start, stop, width):
+    block = np.zeros((stop - start, width), dtype=np.float32)
+    lo, hi = indptr[start], indptr[stop]
+    rows = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+    block[rows, indices[lo:hi]] = values[lo:hi]
+    return block
+
+
+def _all_top_k(indptr, indices, values, width, k):
+    """Exact top-k cosine neighbours (as row numbers) for every row, in BLOCK x BLOCK dense matrix products."""
+    n = len(indptr) - 1
+    best_rows = np.full((n, k), -1, dtype=np.int64)
+    best_scores = np.full((n, k), -1.0, dtype=np.float32)
+    for start in range(0, n, BLOCK):
+        stop = min(n, start + BLOCK)
+        left = _dense_rows(indptr, indices, values, start, stop, width)
+        rows = np.full((stop - start, k), -1, dtype=np.int64)
+        scores = np.full((stop - start, k), -1.0, dtype=np.float32)
+        for other in range(0, n, BLOCK):
+            other_stop = min(n, other + BLOCK)
+            block = left @ _dense_rows(indptr, indices, values, other, other_stop, width).T
+            if other == start:
+                np.fill_diagonal(block, -1.0)  # a perfume is not its own neighbour
+            all_scores = np.concatenate([scores, block], axis=1)
+            all_rows = np.concatenate([rows, np.broadcast_to(np.arange(other, other_stop), block.shape)], axis=1)
+            top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(all_scores, top, axis=1)
+            rows = np.take_along_axis(all_rows, top, axis=1)
+        order = np.argsort(-scores, axis=1)
+        best_scores[start:stop] = np.take_along_axis(scores, order, axis=1)
+        best_rows[start:stop] = np.take_along_axis(rows, order, axis=1)
+    return best_rows, best_scores
+
+
+def build_index(db_manager, folder=SIMILARITY_DIR, k=TOP_K):
+    """Rebuilds the whole index from PerfumeAccords/PerfumeNotes. Returns the number of perfumes indexed."""
+    if np is None:
+        raise RuntimeError("numpy is required for the similarity index: pip install numpy")
+    with metrics.timer("similarity.build"):
+        accords, notes = defaultdict(list), defaultdict(list)
+        for rows in db_manager.stream_rows(ACCORDS_QUERY):
+            for perfume_id, name, strength in rows:
+                accords[perfume_id].append((name, strength))
+        for rows in db_manager.stream_rows(NOTES_QUERY):
+            for perfume_id, name, level in rows:
+                notes[perfume_id].append((name, level))
+
+        vocab = {}
+        ids = np.array(sorted(set(accords) | set(notes)), dtype=np.int64)
+        row_indptr, row_indices, row_values = [0], [], []
+        for perfume_id in ids.tolist():
+            vector = _normalised(feature_weights(accords.get(perfume_id, []), notes.get(perfume_id, [])))
+            for col, weight in sorted((vocab.setdefault(feature, len(vocab)), w) for feature, w in vector.items()):
+                row_indices.append(col)
+                row_values.append(weight)
+            row_indptr.append(len(row_indices))
+        del accords, notes
+
+        row_indptr = np.array(row_indptr, dtype=np.int64)
+        row_indices = np.array(row_indices, dtype=np.int32)
+        row_values = np.array(row_values, dtype=np.float32)
+        # Column-major copy, so scoring one new perfume only touches the rows that share a feature with it
+        order = np.argsort(row_indices, kind="stable")
+        col_indptr = np.concatenate([[0], np.cumsum(np.bincount(row_indices, minlength=len(vocab)))]).astype(np.int64)
+        col_rows = np.repeat(np.arange(len(ids)), np.diff(row_indptr))[order]
+        col_values = row_values[order]
+
+        neighbour_rows, scores = _all_top_k(row_indptr, row_indices, row_values, len(vocab), k)
+        neighbours = np.where(scores > 0, ids[neighbour_rows], -1)
+        scores = np.where(scores > 0, scores, -1.0).astype(np.float32)
+
+        os.makedirs(folder, exist_ok=True)
+        arrays = {"ids": ids, "row_indptr": row_indptr, "row_indices": row_indices, "row_values": row_values,
+                  "col_indptr": col_indptr, "col_rows": col_rows, "col_values": col_values,
+                  "neighbours": neighbours, "scores": scores}
+        for name, array in arrays.items():
+            tmp_path = os.path.join(folder, f"{name}.tmp.npy")
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(folder, f"{name}.npy"))
+        _write_json(os.path.join(folder, META_FILE), {
+            "k": k, "perfumes": len(ids), "features": len(vocab), "vocab": list(vocab),
+            "built_at": datetime.now().isoformat()})
+        # Every update so far is part of the new base
+        if os.path.exists(os.path.join(folder, OVERLAY_FILE)):
+            os.remove(os.path.join(folder, OVERLAY_FILE))
+    logging.info(f"🧭 Similarity index built: {len(ids)} perfumes, {len(vocab)} features, top {k}.")
+    return len(ids)
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class SimilarityIndex:
+    """
+    "Perfumes like this": top-k cosine neighbours over accord strengths and notes (weighted by pyramid level).
+
+    The base index is built offline by build_index() into .npy files that are memory-mapped here, so opening it
+    costs next to nothing and lookups read only the rows they need. Perfumes saved afterwards are folded in by
+    update() (hooked to Extractor.add_save_listener): the new vector is scored against every indexed perfume
+    through the column-major postings, its own neighbour list is stored in overlay.json, and the neighbour
+    lists it now belongs to are patched in place. A perfume that drops out of another's list is not replaced
+    by the next-best candidate until the next build, so rebuild now and then (python -m utilities.similarity build).
+    Each host keeps its own index; two processes must not update the same folder.
+    """
+
+    def __init__(self, folder=SIMILARITY_DIR):
+        if np is None:
+            raise RuntimeError("numpy is required for the similarity index: pip install numpy")
+        self.folder = folder
+        with open(os.path.join(folder, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.k = meta["k"]
+        self.vocab = {feature: col for col, feature in enumerate(meta["vocab"])}
+        for name in ARRAYS:
+            mode = "r+" if name in ("neighbours", "scores") else "r"
+            setattr(self, name, self._load(name, mode))
+        self.overlay = self._load_overlay()
+        # Base rows superseded by an overlay entry are skipped when scoring
+        self._stale = np.zeros(len(self.ids), dtype=bool)
+        for perfume_id in self.overlay:
+            row = self._row(perfume_id)
+            if row is not None:
+                self._stale[row] = True
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def exists(folder=SIMILARITY_DIR):
+        return os.path.exists(os.path.join(folder, META_FILE))
+
+    def _load(self, name, mode):
+        return np.load(os.path.join(self.folder, f"{name}.npy"), mmap_mode=mode)
+
+    def _load_overlay(self):
+        try:
+            with open(os.path.join(self.folder, OVERLAY_FILE), "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {int(perfume_id): entry for perfume_id, entry in entries.items()}
+
+    def _row(self, perfume_id):
+        row = int(np.searchsorted(self.ids, perfume_id))
+        return row if row < len(self.ids) and self.ids[row] == perfume_id else None
+
+    def similar(self, perfume_id, k=None):
+        """[(perfume_id, score), ...] best first, or [] for a perfume that is not indexed."""
+        k = k or self.k
+        if perfume_id in self.overlay:
+            return [(pid, score) for pid, score in self.overlay[perfume_id]["neighbours"][:k]]
+        row = self._row(perfume_id)
+        if row is None:
+            return []
+        return [(int(pid), float(score)) for pid, score in zip(self.neighbours[row], self.scores[row])
+                if pid != -1][:k]
+
+    def on_save(self, perfume_id, perfume):
+        """Extractor save listener."""
+        self.update(perfume_id, perfume_features(perfume))
+
+    def update(self, perfume_id, weights):
+        """Adds or replaces one perfume (features as returned by feature_weights)."""
+        vector = _normalised(weights)
+        with self._lock, metrics.timer("similarity.update"):
+            row = self._row(perfume_id)
+            if row is not None:
+                self._stale[row] = True
+
+            base_scores = self._score_base(vector)
+            overlay_scores = {pid: sum(w * entry["features"].get(feature, 0.0) for feature, w in vector.items())
+                              for pid, entry in self.overlay.items() if pid != perfume_id}
+
+            candidates = [(pid, score) for pid, score in overlay_scores.items() if score > 0]
+            if len(base_scores) > self.k:
+                top = np.argpartition(-base_scores, self.k - 1)[:self.k]
+            else:
+                top = np.arange(len(base_scores))
+            candidates += [(int(self.ids[r]), float(base_scores[r])) for r in top if base_scores[r] > 0]
+            candidates.sort(key=lambda pair: -pair[1])
+            self.overlay[perfume_id] = {"features": vector, "neighbours": candidates[:self.k]}
+
+            self._patch_base(perfume_id, base_scores)
+            for pid, score in overlay_scores.items():
+                entry = self.overlay[pid]
+                if score > 0 or any(n == perfume_id for n, _ in entry["neighbours"]):
+                    entry["neighbours"] = _merge(entry["neighbours"], perfume_id, score, self.k)
+
+            _write_json(os.path.join(self.folder, OVERLAY_FILE), self.overlay)
+            for array in (self.neighbours, self.scores):
+                if isinstance(array, np.memmap):
+                    array.flush()
+        metrics.increment("similarity.updates")
+
+    def _score_base(self, vector):
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for feature, weight in vector.items():
+            col = self.vocab.get(feature)
+            if col is None:
+                continue  # feature first seen after the build
+            lo, hi = self.col_indptr[col], self.col_indptr[col + 1]
+            scores[self.col_rows[lo:hi]] += weight * self.col_values[lo:hi]
+        scores[self._stale] = -1.0
+        return scores
+
+    def _patch_base(self, perfume_id, base_scores):
+        """Puts perfume_id into (or updates its score in) every base neighbour list it belongs to."""
+        if not len(self.ids):
+            return
+        listed = (self.neighbours == perfume_id).any(axis=1)
+        better = (base_scores > 0) & (base_scores > self.scores[:, -1])
+        rows = np.nonzero((listed | better) & ~self._stale)[0]
+        for row in rows:
+            pairs = _merge(zip(self.neighbours[row].tolist(), self.scores[row].tolist()), perfume_id,
+                           float(base_scores[row]), self.k)
+            pairs += [(-1, -1.0)] * (self.k - len(pairs))
+            self.neighbours[row] = [pid for pid, _ in pairs]
+            self.scores[row] = [score for _, score in pairs]
+
+
+def attach_similarity_index(extractor, folder=SIMILARITY_DIR):
+    """Keeps an already built index up to date as the extractor saves perfumes. Returns the index or None."""
+    if np is None or not SimilarityIndex.exists(folder):
+        return None
+    index = SimilarityIndex(folder)
+    extractor.add_save_listener(index.on_save)
+    logging.info(f"🧭 Similarity index at {folder} will be updated as perfumes are saved.")
+    return index
+
+
+if __name__ == "__main__":
+    from utilities.storage import get_db_manager
+    from utilities.log_utils import setup_logging
+
+    setup_logging()
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        db_manager = get_db_manager()
+        try:
+            build_index(db_manager)
+        finally:
+            db_manager.close()
+    elif len(sys.argv) >= 3 and sys.argv[1] == "similar":
+        perfume_id = int(sys.argv[2])
+        neighbours = SimilarityIndex().similar(perfume_id, int(sys.argv[3]) if len(sys.argv) >= 4 else None)
+        names = {}
+        if neighbours:
+            db_manager = get_db_manager()
+            try:
+                placeholders = ", ".join("?" for _ in neighbours)
+                for rows in db_manager.stream_rows(
+                        f"SELECT perfume_id, perfume_name FROM Perfumes WHERE perfume_id IN ({placeholders})",
+                        [pid for pid, _ in neighbours]):
+                    names.update(dict(rows))
+            finally:
+                db_manager.close()
+        for pid, score in neighbours:
+            print(f"{score:.3f}  {pid:>7}  {names.get(pid, '')}")
+    else:
+        sys.exit("usage: python -m utilities.similarity build | similar <perfume_id> [k]")
@@ -0,0 +1,508 @@
+import os
+import sqlite3
+import logging
+from contextlib import contextmanager
+from config import SQLITE_PATH
+from utilities.metrics import timed, increment
+from utilities.storage import StorageBackend, url_hash, review_body_hash, compress_review, split_review_rows
+from utilities.migrations import apply_migrations
+from utilities.errors import PersistError
+
+REVIEW_HASH_BATCH = 500  # hashes per IN (...) lookup
+
+
+class SQLiteManager(StorageBackend):
+    """
+    SQLite implementation of the storage interface, with the same tables and columns as DBManager.
+    Keeps one connection open in WAL mode and writes child rows with executemany.
+    """
+
+    def __init__(self, db_path=SQLITE_PATH):
+        self.db_path = db_path
+        self.conn = None
+        self._in_transaction = False
+
+    def _connect(self):
+        """Opens the shared connection on first use."""
+        if self.conn is None:
+            if self.db_path != ":memory:" and os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.conn.create_function("url_hash", 1, url_hash, deterministic=True)
+            self.conn.create_function("review_body_hash", 1, review_body_hash, deterministic=True)
+            self.conn.create_function("compress_review", 1, compress_review, deterministic=True)
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _commit(self):
+        if not self._in_transaction:
+            self.conn.commit()
+
+    def _rollback(self):
+        # Inside transaction() a failed statement must abort the whole perfume, not just this call.
+        if self._in_transaction:
+            raise PersistError("Database statement failed inside a perfume transaction.")
+        self.conn.rollback()
+
+    @contextmanager
+    def transaction(self):
+        """Runs every call inside the block in one write transaction and commits them together, or not at all."""
+        conn = self._connect()
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        self._in_transaction = True
+        try:
+            yield self
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+
+    @timed("db.create_tables")
+    def create_tables(self):
+        """
+        Brings the schema up to date by applying any pending migrations (see utilities/migrations.py).
+        Raises PersistError if one fails; the failed migration is rolled back and the earlier ones are kept.
+        """
+        conn = self._connect()
+        try:
+            logging.info("Checking SQLite schema and applying pending migrations...")
+            version = apply_migrations(conn, "sqlite")
+            logging.info(f"Database schema is at version {version}.")
+        except sqlite3.Error as e:
+            # Every later step assumes the full schema: never carry on with a half-migrated database
+            logging.error(f"Schema migration failed: {e}")
+            raise PersistError(f"Schema migration failed: {e}") from e
+
+    @timed("db.clear_perfume_details")
+    def clear_perfume_details(self, perfume_id):
+        conn = self._connect()
+        try:
+            for table in ("PerfumeVotes", "PerfumePercentages", "PerfumeStats", "PerfumeSummary", "Reviews",
+                          "PerfumeNotes", "PerfumeAccords"):
+                conn.execute(f"DELETE FROM {table} WHERE perfume_id = ?", (perfume_id,))
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Error clearing details for PerfumeID {perfume_id}: {e}")
+            self._rollback()
+
+    @timed("db.insert_perfume_vote")
+    def insert_perfume_vote(self, perfume_id, row):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO PerfumeVotes (perfume_id, review_count, rating_count, rating_value) VALUES (?, ?, ?, ?)",
+                row)
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to insert vote data for PerfumeID {perfume_id}: {e}")
+            self._rollback()
+
+    @timed("db.insert_perfume_summary")
+    def insert_perfume_summary(self, perfume_id, summary):
+        conn = self._connect()
+        try:
+            conn.execute(f"INSERT INTO PerfumeSummary ({', '.join(summary)}) "
+                         f"VALUES ({', '.join('?' for _ in summary)})", list(summary.values()))
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to insert summary for PerfumeID {perfume_id}: {e}")
+            self._rollback()
+
+    @timed("db.get_perfume_summary")
+    def get_perfume_summary(self, perfume_id):
+        cursor = self._connect().execute("SELECT * FROM PerfumeSummary WHERE perfume_id = ?", (perfume_id,))
+        row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    @timed("db.insert_perfume_percentages")
+    def insert_perfume_percentages(self, perfume_id, rows):
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT INTO PerfumePercentages (perfume_id, category, label, percentage_value) VALUES (?, ?, ?, ?)",
+                rows)
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to insert percentage data for PerfumeID {perfume_id}: {e}")
+            self._rollback()
+
+    @timed("db.insert_perfume_stats")
+    def insert_perfume_stats(self, perfume_id, rows):
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT INTO PerfumeStats (perfume_id, category, label, vote_count) VALUES (?, ?, ?, ?)", rows)
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to insert stats data for PerfumeID {perfume_id}: {e}")
+            self._rollback()
+
+    @timed("db.insert_reviews")
+    def insert_reviews(self, perfume_id, rows):
+        conn = self._connect()
+        try:
+            bodies, review_rows = split_review_rows(rows)
+            new_hashes = self._new_review_bodies(conn, list(bodies))
+            conn.executemany("INSERT OR IGNORE INTO ReviewBodies (body_hash, body) VALUES (?, ?)",
+                             [(body_hash, compress_review(bodies[body_hash])) for body_hash in new_hashes])
+            increment("review_bodies.written", len(new_hashes))
+            increment("review_bodies.reused", len(bodies) - len(new_hashes))
+            conn.executemany(
+                "INSERT INTO Reviews (perfume_id, body_hash, reviewer_name, review_date) VALUES (?, ?, ?, ?)",
+                review_rows)
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to insert reviews for PerfumeID {perfume_id}: {e}")
+            self._rollback()
+
+    @staticmethod
+    def _new_review_bodies(conn, hashes):
+        """The hashes that have no ReviewBodies row yet, so texts already stored are not compressed again."""
+        existing = set()
+        for start in range(0, len(hashes), REVIEW_HASH_BATCH):
+            batch = hashes[start:start + REVIEW_HASH_BATCH]
+            placeholders = ", ".join("?" for _ in batch)
+            existing.update(row[0] for row in conn.execute(
+                f"SELECT body_hash FROM ReviewBodies WHERE body_hash IN ({placeholders})", batch))
+        return [body_hash for body_hash in hashes if body_hash not in existing]
+
+    @timed("db.prune_review_bodies")
+    def prune_review_bodies(self):
+        conn = self._connect()
+        try:
+            cursor = conn.execute("DELETE FROM ReviewBodies WHERE NOT EXISTS "
+                                  "(SELECT 1 FROM Reviews r WHERE r.body_hash = ReviewBodies.body_hash)")
+            self._commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logging.error(f"Failed to prune review bodies: {e}")
+            self._rollback()
+            return 0
+
+    @timed("db.get_or_create_country")
+    def get_or_create_country(self, country_name, brand_count):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT country_id FROM Countries WHERE country_name = ?", (country_name,)).fetchone()
+            if row:
+                return row[0]
+            cursor = conn.execute("INSERT INTO Countries (country_name, brand_count) VALUES (?, ?)",
+                                  (country_name, brand_count))
+            self._commit()
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            logging.error(f"Error in get_or_create_country for '{country_name}': {e}")
+            self._rollback()
+            return None
+
+    @timed("db.get_or_create_brand")
+    def get_or_create_brand(self, brand_name, country_id, brand_url, perfume_count, brand_website_url, brand_image_url):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT id FROM Brands WHERE brand_name = ?", (brand_name,)).fetchone()
+            if row:
+                return row[0]
+            cursor = conn.execute(
+                "INSERT INTO Brands (brand_name, country_id, brand_url, perfume_count, brand_website_url, "
+                "brand_image_url) VALUES (?, ?, ?, ?, ?, ?)",
+                (brand_name, country_id, brand_url, perfume_count, brand_website_url, brand_image_url))
+            self._commit()
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            logging.error(f"Error in get_or_create_brand for '{brand_name}': {e}")
+            self._rollback()
+            return None
+
+    @timed("db.record_brand_discovery")
+    def record_brand_discovery(self, brand_id, perfume_count, page_hash):
+        conn = self._connect()
+        try:
+            conn.execute(f"UPDATE Brands SET perfume_count = ?, discovered_count = ?, page_hash = ?, "
+                         f"discovered_at = {_NOW} WHERE id = ?", (perfume_count, perfume_count, page_hash, brand_id))
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to record discovery of BrandID {brand_id}: {e}")
+            self._rollback()
+
+    @timed("db.get_or_create_perfume")
+    def get_or_create_perfume(self, perfume_name, perfume_for, image_url, launch_year, perfumer_name, perfumer_url,
+                              perfume_url, brand_id, description=None):
+        conn = self._connect()
+        try:
+            url_key = url_hash(perfume_url)
+            existing = conn.execute("SELECT perfume_id FROM Perfumes WHERE perfume_url_hash = ? AND perfume_url = ?",
+                                    (url_key, perfume_url)).fetchone()
+            if existing:
+                conn.execute(
+                    "UPDATE Perfumes SET perfume_name = ?, perfume_for = ?, image_url = ?, launch_year = ?, "
+                    "perfumer_name = ?, perfumer_url = ?, brand_id = ?, description = ?, "
+                    f"updated_at = {_NOW} WHERE perfume_id = ?",
+                    (perfume_name, perfume_for, image_url, launch_year, perfumer_name, perfumer_url, brand_id,
+                     description, existing[0]))
+                self._commit()
+                return existing[0]
+
+            cursor = conn.execute(
+                "INSERT INTO Perfumes (perfume_name, perfume_for, image_url, launch_year, perfumer_name, "
+                "perfumer_url, perfume_url, perfume_url_hash, brand_id, description, updated_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {_NOW})",
+                (perfume_name, perfume_for, image_url, launch_year, perfumer_name, perfumer_url, perfume_url, url_key,
+                 brand_id, description))
+            self._commit()
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            logging.error(f"Error in get_or_create_perfume for '{perfume_name}': {e}")
+            self._rollback()
+            return None
+
+    @timed("db.get_or_create_id")
+    def get_or_create_id(self, table_name, column_name, value):
+        conn = self._connect()
+        id_col, name_col = f"{column_name}_id", f"{column_name}_name"
+        try:
+            conn.execute(f"INSERT OR IGNORE INTO {table_name} ({name_col}) VALUES (?)", (value,))
+            row = conn.execute(f"SELECT {id_col} FROM {table_name} WHERE {name_col} = ?", (value,)).fetchone()
+            self._commit()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logging.error(f"Error in get_or_create_id for {table_name}: {e}")
+            self._rollback()
+            return None
+
+    @timed("db.link_perfume_note")
+    def link_perfume_note(self, perfume_id, note_id, note_level):
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR IGNORE INTO PerfumeNotes (perfume_id, note_id, note_level) VALUES (?, ?, ?)",
+                         (perfume_id, note_id, note_level))
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Error linking note {note_id} to PerfumeID {perfume_id}: {e}")
+            self._rollback()
+
+    @timed("db.link_perfume_accord")
+    def link_perfume_accord(self, perfume_id, accord_id, accord_strength):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO PerfumeAccords (perfume_id, accord_id, accord_strength) VALUES (?, ?, ?)",
+                (perfume_id, accord_id, accord_strength))
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Error linking accord {accord_id} to PerfumeID {perfume_id}: {e}")
+            self._rollback()
+
+    # --- Change-event outbox ---
+    # Cursor calls re-raise after logging, like the queue calls: a lost acknowledgement must not go unnoticed.
+
+    @timed("db.get_review_body_hashes")
+    def get_review_body_hashes(self, perfume_id):
+        conn = self._connect()
+        return [row[0] for row in conn.execute("SELECT body_hash FROM Reviews WHERE perfume_id = ?", (perfume_id,))]
+
+    @timed("db.insert_change_events")
+    def insert_change_events(self, rows):
+        conn = self._connect()
+        try:
+            conn.executemany("INSERT INTO ChangeEvents (perfume_id, event_type, payload) VALUES (?, ?, ?)", rows)
+            self._commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to insert {len(rows)} change events: {e}")
+            self._rollback()
+
+    @timed("db.read_change_events")
+    def read_change_events(self, after_event_id, limit, settle_seconds):
+        conn = self._connect()
+        return conn.execute(
+            f"SELECT event_id, perfume_id, event_type, payload, created_at FROM ChangeEvents "
+            f"WHERE event_id > ? AND created_at <= {_now_plus('?')} ORDER BY event_id LIMIT ?",
+            (after_event_id, _seconds(-settle_seconds), limit)).fetchall()
+
+    @timed("db.get_consumer_cursor")
+    def get_consumer_cursor(self, consumer):
+        row = self._connect().execute("SELECT last_event_id FROM ConsumerCursors WHERE consumer = ?",
+                                      (consumer,)).fetchone()
+        return row[0] if row else 0
+
+    @timed("db.save_consumer_cursor")
+    def save_consumer_cursor(self, consumer, event_id):
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"INSERT INTO ConsumerCursors (consumer, last_event_id) VALUES (?, ?) "
+                f"ON CONFLICT (consumer) DO UPDATE SET last_event_id = excluded.last_event_id, updated_at = {_NOW}",
+                (consumer, event_id))
+            conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to save the cursor of {consumer}: {e}")
+            conn.rollback()
+            raise
+
+    @timed("db.prune_change_events")
+    def prune_change_events(self):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "DELETE FROM ChangeEvents WHERE event_id <= (SELECT MIN(last_event_id) FROM ConsumerCursors)")
+            conn.commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logging.error(f"Failed to prune change events: {e}")
+            conn.rollback()
+            raise
+
+    # --- Derived metrics ---
+
+    @timed("db.replace_perfume_metrics")
+    def replace_perfume_metrics(self, columns, rows):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM PerfumeMetrics")
+            conn.executemany(f"INSERT INTO PerfumeMetrics ({', '.join(columns)}) "
+                             f"VALUES ({', '.join('?' for _ in columns)})", rows)
+            conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to write {len(rows)} perfume metrics rows: {e}")
+            conn.rollback()
+            raise
+
+    # --- Read side ---
+
+    def stream_rows(self, query, params=(), batch_size=5000):
+        # In WAL mode a second connection reads a consistent snapshot without blocking the writer
+        own_conn = self.db_path != ":memory:"
+        conn = sqlite3.connect(self.db_path) if own_conn else self._connect()
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            if own_conn:
+                conn.close()
+
+    # --- Shared crawl queue ---
+    # BEGIN IMMEDIATE takes SQLite's single write lock, so a lease is claimed by exactly one connection.
+
+    @timed("db.enqueue_urls")
+    def enqueue_urls(self, urls):
+        conn = self._connect()
+        try:
+            conn.executemany("INSERT OR IGNORE INTO CrawlQueue (url) VALUES (?)", [(url,) for url in urls])
+            conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to enqueue URLs: {e}")
+            conn.rollback()
+            raise
+
+    @timed("db.lease_urls")
+    def lease_urls(self, owner, limit, lease_seconds):
+        try:
+            with self.transaction() as db:
+                rows = db.conn.execute(
+                    f"SELECT queue_id, url, attempts FROM CrawlQueue "
+                    f"WHERE (status = 'pending' AND available_at <= {_NOW}) "
+                    f"   OR (status = 'leased' AND lease_expires_at < {_NOW}) "
+                    f"ORDER BY available_at, queue_id LIMIT ?", (limit,)).fetchall()
+                db.conn.executemany(
+                    f"UPDATE CrawlQueue SET status = 'leased', lease_owner = ?, "
+                    f"lease_expires_at = {_now_plus('?')}, attempts = attempts + 1, updated_at = {_NOW} "
+                    f"WHERE queue_id = ?",
+                    [(owner, _seconds(lease_seconds), queue_id) for queue_id, _, _ in rows])
+                return [(url, attempts + 1) for _, url, attempts in rows]
+        except sqlite3.Error as e:
+            logging.error(f"Failed to lease URLs for {owner}: {e}")
+            raise
+
+    @timed("db.renew_leases")
+    def renew_leases(self, owner, urls, lease_seconds):
+        try:
+            with self.transaction() as db:
+                renewed = []
+                for url in urls:
+                    cursor = db.conn.execute(
+                        f"UPDATE CrawlQueue SET lease_expires_at = {_now_plus('?')}, updated_at = {_NOW} "
+                        f"WHERE url = ? AND status = 'leased' AND lease_owner = ?",
+                        (_seconds(lease_seconds), url, owner))
+                    if cursor.rowcount:
+                        renewed.append(url)
+                return renewed
+        except sqlite3.Error as e:
+            logging.error(f"Failed to renew leases for {owner}: {e}")
+            raise
+
+    @timed("db.complete_url")
+    def complete_url(self, url):
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"UPDATE CrawlQueue SET status = 'done', lease_owner = NULL, lease_expires_at = NULL, "
+                f"last_error_kind = NULL, last_error = NULL, updated_at = {_NOW} WHERE url = ? AND status <> 'done'",
+                (url,))
+            conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to mark {url} as done: {e}")
+            conn.rollback()
+            raise
+
+    @timed("db.release_url")
+    def release_url(self, url, owner, delay_seconds, error_kind=None, error=None, dead=False, started=True):
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"UPDATE CrawlQueue SET status = ?, lease_owner = NULL, lease_expires_at = NULL, "
+                f"attempts = attempts - ?, available_at = {_now_plus('?')}, last_error_kind = ?, last_error = ?, "
+                f"updated_at = {_NOW} WHERE url = ? AND status = 'leased' AND lease_owner = ?",
+                ("dead" if dead else "pending", 0 if started else 1, _seconds(delay_seconds), error_kind,
+                 error[:1000] if error else None, url, owner))
+            conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to release {url}: {e}")
+            conn.rollback()
+            raise
+
+    @timed("db.requeue_dead_urls")
+    def requeue_dead_urls(self, urls=None):
+        conn = self._connect()
+        sql = f"UPDATE CrawlQueue SET status = 'pending', attempts = 0, available_at = {_NOW}, updated_at = {_NOW} " \
+              f"WHERE status = 'dead'"
+        try:
+            if urls is None:
+                count = conn.execute(sql).rowcount
+            else:
+                count = sum(conn.execute(sql + " AND url = ?", (url,)).rowcount for url in urls)
+            conn.commit()
+            return count
+        except sqlite3.Error as e:
+            logging.error(f"Failed to requeue dead URLs: {e}")
+            conn.rollback()
+            raise
+
+    @timed("db.queue_counts")
+    def queue_counts(self):
+        conn = self._connect()
+        return dict(conn.execute("SELECT status, COUNT(*) FROM CrawlQueue GROUP BY status").fetchall())
+
+
+_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _now_plus(modifier):
+    return f"strftime('%Y-%m-%d %H:%M:%f', 'now', {modifier})"
+
+
+def _seconds(seconds):
+    return f"{float(seconds):+} seconds"
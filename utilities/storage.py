@@ -0,0 +1,235 @@
+import sys
+import gzip
+import hashlib
+from contextlib import contextmanager
+from config import DB_BACKEND, DB_CONNECTION_STRING, SQLITE_PATH
+
+
+def url_hash(url):
+    """SHA-256 of the URL's UTF-16LE bytes, i.e. HASHBYTES('SHA2_256', perfume_url) on SQL Server."""
+    return hashlib.sha256(url.encode("utf-16-le")).digest()
+
+
+# Review texts are stored once each in ReviewBodies, keyed by their hash and gzip-compressed. Both use the
+# text's UTF-16LE bytes, like SQL Server's HASHBYTES('SHA2_256', ...) and COMPRESS() on NVARCHAR, so on
+# SQL Server `CAST(DECOMPRESS(body) AS NVARCHAR(MAX))` reads a body back.
+
+def review_body_hash(text):
+    """SHA-256 of the review text's UTF-16LE bytes, i.e. HASHBYTES('SHA2_256', review_content) on SQL Server."""
+    return hashlib.sha256(text.encode("utf-16-le")).digest()
+
+
+def compress_review(text):
+    """Review text -> ReviewBodies.body (gzip of the UTF-16LE bytes, the output format of COMPRESS())."""
+    return gzip.compress(text.encode("utf-16-le"), mtime=0)
+
+
+def decompress_review(body):
+    """ReviewBodies.body -> review text (None stays None, e.g. from a LEFT JOIN)."""
+    return None if body is None else gzip.decompress(body).decode("utf-16-le")
+
+
+def split_review_rows(rows):
+    """
+    Review rows as the scraper builds them -> ({body_hash: review_content}, Reviews rows
+    (perfume_id, body_hash, reviewer_name, review_date)). Repeated texts share one body.
+    """
+    bodies = {}
+    review_rows = []
+    for perfume_id, content, reviewer_name, review_date in rows:
+        body_hash = None
+        if content is not None:
+            body_hash = review_body_hash(content)
+            bodies[body_hash] = content
+        review_rows.append((perfume_id, body_hash, reviewer_name, review_date))
+    return bodies, review_rows
+
+
+class StorageBackend:
+    """
+    Interface used by Extractor._save_to_relational_db and import_brands_data.
+    DBManager implements it for SQL Server and SQLiteManager for a local SQLite file.
+    """
+
+    def create_tables(self):
+        """Creates the tables or migrates them to the current schema version."""
+        raise NotImplementedError
+
+    def close(self):
+        """Releases any connection held between calls."""
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups every call made inside the block into one atomic unit (used once per perfume).
+        Backends without transactions simply run the calls as they come.
+        """
+        yield self
+
+    def clear_perfume_details(self, perfume_id):
+        """
+        Deletes the votes, percentages, stats, summary, reviews, notes and accords of a perfume
+        before they are rewritten.
+        """
+        raise NotImplementedError
+
+    # The insert methods take column-ready tuples built by the scraper.models records (see their row() methods),
+    # so backends never re-parse values.
+
+    def insert_perfume_vote(self, perfume_id, row):
+        """row: (perfume_id, review_count, rating_count, rating_value)"""
+        raise NotImplementedError
+
+    def insert_perfume_percentages(self, perfume_id, rows):
+        """rows: [(perfume_id, category, label, percentage_value), ...]"""
+        raise NotImplementedError
+
+    def insert_perfume_stats(self, perfume_id, rows):
+        """rows: [(perfume_id, category, label, vote_count), ...]"""
+        raise NotImplementedError
+
+    def insert_reviews(self, perfume_id, rows):
+        """
+        rows: [(perfume_id, review_content, reviewer_name, review_date), ...]
+        Texts go to ReviewBodies (see split_review_rows); only ones not stored yet are compressed and written.
+        """
+        raise NotImplementedError
+
+    def prune_review_bodies(self):
+        """Deletes the ReviewBodies no review refers to any more. Returns how many were deleted."""
+        raise NotImplementedError
+
+    def insert_perfume_summary(self, perfume_id, summary):
+        """summary: {PerfumeSummary column: value}, see Perfume.summary_row."""
+        raise NotImplementedError
+
+    def get_perfume_summary(self, perfume_id):
+        """The PerfumeSummary row of a perfume as {column: value}, or None. A primary-key lookup."""
+        raise NotImplementedError
+
+    def get_or_create_country(self, country_name, brand_count):
+        raise NotImplementedError
+
+    def get_or_create_brand(self, brand_name, country_id, brand_url, perfume_count, brand_website_url, brand_image_url):
+        raise NotImplementedError
+
+    def get_or_create_perfume(self, perfume_name, perfume_for, image_url, launch_year, perfumer_name, perfumer_url,
+                              perfume_url, brand_id, description=None):
+        raise NotImplementedError
+
+    def record_brand_discovery(self, brand_id, perfume_count, page_hash):
+        """Stores the perfume count and page hash of a brand page that was just crawled (scraper/discovery.py)."""
+        raise NotImplementedError
+
+    def get_or_create_id(self, table_name, column_name, value):
+        """Returns the id of `value` in a Notes/Accords style lookup table, inserting it if needed."""
+        raise NotImplementedError
+
+    def link_perfume_note(self, perfume_id, note_id, note_level):
+        raise NotImplementedError
+
+    def link_perfume_accord(self, perfume_id, accord_id, accord_strength):
+        raise NotImplementedError
+
+    # --- Change-event outbox (utilities/change_events.py) ---
+
+    def get_review_body_hashes(self, perfume_id):
+        """The body_hash of each of the perfume's stored reviews (repeated as often as the review is)."""
+        raise NotImplementedError
+
+    def insert_change_events(self, rows):
+        """rows: [(perfume_id, event_type, payload json), ...], written inside the perfume's transaction."""
+        raise NotImplementedError
+
+    def read_change_events(self, after_event_id, limit, settle_seconds):
+        """
+        Up to `limit` ChangeEvents rows (event_id, perfume_id, event_type, payload, created_at) after
+        after_event_id, oldest first, leaving out events younger than settle_seconds by the database's clock.
+        """
+        raise NotImplementedError
+
+    def get_consumer_cursor(self, consumer):
+        """The last event_id `consumer` acknowledged, or 0."""
+        raise NotImplementedError
+
+    def save_consumer_cursor(self, consumer, event_id):
+        raise NotImplementedError
+
+    def prune_change_events(self):
+        """Deletes the events every consumer in ConsumerCursors has passed. Returns how many were deleted."""
+        raise NotImplementedError
+
+    # --- Derived metrics (utilities/perfume_metrics.py) ---
+
+    def replace_perfume_metrics(self, columns, rows):
+        """Replaces the whole PerfumeMetrics table with rows (tuples in `columns` order) in one transaction."""
+        raise NotImplementedError
+
+    # --- Read side (export_main.py) ---
+
+    def stream_rows(self, query, params=(), batch_size=5000):
+        """
+        Runs a read-only query on its own connection and yields its rows in lists of up to batch_size,
+        so a whole table can be exported without holding it in memory.
+        """
+        raise NotImplementedError
+
+    # --- Shared crawl queue (distributed_main.py) ---
+    # Rows move pending -> leased -> done, or back to pending (after a delay) / dead when a scrape fails.
+    # A lease that is not renewed before lease_expires_at can be taken over by any other host.
+
+    def enqueue_urls(self, urls):
+        """Adds URLs to CrawlQueue as pending. URLs already in the queue are left as they are."""
+        raise NotImplementedError
+
+    def lease_urls(self, owner, limit, lease_seconds):
+        """Atomically claims up to `limit` due or expired URLs for `owner`. Returns [(url, attempts), ...]."""
+        raise NotImplementedError
+
+    def renew_leases(self, owner, urls, lease_seconds):
+        """Extends the leases `owner` still holds on `urls`. Returns the URLs whose lease was renewed."""
+        raise NotImplementedError
+
+    def complete_url(self, url):
+        """Marks a URL done. Safe to call more than once, or after the lease was lost."""
+        raise NotImplementedError
+
+    def release_url(self, url, owner, delay_seconds, error_kind=None, error=None, dead=False, started=True):
+        """
+        Gives a URL back to the queue after `delay_seconds` (or parks it as dead), if `owner` still holds it.
+        started=False hands back a URL that was leased but never tried, so its attempt is not counted.
+        """
+        raise NotImplementedError
+
+    def requeue_dead_urls(self, urls=None):
+        """Moves dead URLs (all, or the given ones) back to pending with a fresh attempt count. Returns the count."""
+        raise NotImplementedError
+
+    def queue_counts(self):
+        """Returns {status: number of URLs}."""
+        raise NotImplementedError
+
+
+def get_db_manager(backend=DB_BACKEND):
+    """Returns the storage backend selected by DB_BACKEND in config.py ('mssql' or 'sqlite')."""
+    if backend == "mssql":
+        from utilities.dbmanager import DBManager
+        return DBManager(DB_CONNECTION_STRING)
+    if backend == "sqlite":
+        from utilities.sqlite_manager import SQLiteManager
+        return SQLiteManager(SQLITE_PATH)
+    raise ValueError(f"Unknown DB_BACKEND '{backend}'. Use 'mssql' or 'sqlite'.")
+
+
+if __name__ == "__main__":
+    from utilities.log_utils import setup_logging
+
+    setup_logging()
+    if len(sys.argv) != 2 or sys.argv[1] != "prune-review-bodies":
+        sys.exit("usage: python -m utilities.storage prune-review-bodies")
+    db_manager = get_db_manager()
+    try:
+        db_manager.create_tables()
+        print(f"Deleted {db_manager.prune_review_bodies()} unreferenced review bodies.")
+    finally:
+        db_manager.close()